@@ -21,97 +21,197 @@
 
 
 import logging
-import random
+import queue
+import threading
 
-from operator import itemgetter
+from typing import Dict, List, Tuple
 
-import utils
 import action
+import forecast
+import planner
+import search
 import state as s
 
 from unit import Team
 
 
 class AI(Team):
-    def __init__(self, name, color, relation, units, boss, music):
+    def __init__(self, name, color, relation, units, boss, music, strategy=None):
+        """
+        :param strategy: 'mcts' to plan the turn with a Monte Carlo tree search, see search, otherwise the whole team is
+            planned greedily at once, see planner
+        """
         super().__init__(name, color, relation, units, boss, music)
         self.logger = logging.getLogger('AI')
+        self.strategy = strategy
+        self.iterations = search.ITERATIONS  #: budgets of each search, when strategy is 'mcts'
+        self.time_budget = search.TIME_BUDGET
 
-    def __iter__(self):
+    @staticmethod
+    def step_actions(units, step: search.Step):
+        """
+        Returns the actions that play a search.Step whose indices refer to units. Nothing is played if the tile of the
+        step has been taken meanwhile: the attack may be out of range from where the unit stands.
+        """
+        unit = units[step.unit]
+        actions = []
+        if step.tile is not None and step.tile != unit.coord:
+            if s.loaded_map.get_unit(step.tile) is not None:
+                return []
+            actions.append(action.Move(unit, step.tile))
+        if step.target is not None:
+            actions.append(action.Attack(unit, units[step.target]))
+        return actions
+
+    def nearest_enemies(self) -> Dict:
+        """
+        Finds the nearest enemy of each unit of the team, by the cost of the path from it, with one search for each
+        movement class. Must be called on the main thread, like the other methods using the pathfinder of the map.
+        :return: a dict from unit to (cost, coord of the enemy), units that can't reach any enemy are left out
+        """
         _map = s.loaded_map
-        _path = _map.path
-        random.shuffle(self.units)
-        for unit in self.units:
-            if s.winner is not None:
-                return
-            self.logger.info("Thinking what to do with %s...", unit.name)
-            attackable_enemies = _map.nearby_enemies(unit)
-            self.logger.info("Nearby attackable enemies: %s", attackable_enemies)
-            if len(attackable_enemies) > 0:
-                target = self.best_target(attackable_enemies)
-                self.logger.debug("%s attacks %s.", unit.name, target.name)
-                yield action.Attack(unit, target)
-            else:
-                enemies = self.enemies_in_walkable_area(unit)
-                self.logger.debug("Units next to %s: %s", unit.name, enemies)
-                if len(enemies) > 0:
-                    target = self.best_target(enemies)
-                    path = _path.shortest_path(unit.coord, target.coord, unit.movement)
-                    if path:
-                        dest = path[-1]
-                        self.logger.debug("%s will reach %s from %s.", unit.name, target.name, dest)
-                        yield action.Move(unit, dest)
-                        yield action.Attack(unit, target)
-                    else:
-                        self.logger.debug("%s can't reach %s. Wait.", unit.name, target.name)
-                        unit.played = True
-                else:
-                    target = self.nearest_enemy(unit)
-                    path = _path.shortest_path(unit.coord, target.coord, unit.movement)
-                    self.logger.debug("Unit %s can't reach any enemy. Target is %s, path is %s." % (unit.name, target.name, path))
-                    if path:
-                        dest = path[-1]
-                        yield action.Move(unit, dest)
-                    unit.played = True
-
-    def nearest_enemy(self, unit):
-        """
-        Finds the nearest enemy.
+        enemies = [unit.coord for unit in s.units_manager.get_enemies(self)]
+        nearest = {}
+        for movement_class in {unit.MOVEMENT_CLASS for unit in self.units}:
+            ours = [unit for unit in self.units if unit.MOVEMENT_CLASS == movement_class]
+            found = _map.path.nearest_sources(enemies, [unit.coord for unit in ours], for_unit=ours[0])
+            nearest.update((unit, found[unit.coord]) for unit in ours if unit.coord in found)
+        return nearest
+
+    def planning_order(self, units, nearest: Dict) -> List[int]:
         """
-        _path = s.loaded_map.path
-        enemy_units = s.units_manager.get_enemies(self)
-        random.shuffle(enemy_units)
-        l = [(len(_path.shortest_path(unit.coord, enemy.coord)), enemy) for enemy in enemy_units]
-        l.sort(key=itemgetter(0))
-        nearest_enemy = l[0][1]
-        return nearest_enemy
+        Returns the indices in units of the units of the team, the nearest to an enemy first.
+        :param nearest: see nearest_enemies
+        """
+        def cost(i):
+            return nearest[units[i]][0] if units[i] in nearest else float('inf')
 
-    def enemies_in_walkable_area(self, unit):
+        return sorted((i for i, unit in enumerate(units) if unit.team is self), key=cost)
+
+    def routes(self, units, nearest: Dict) -> Dict[int, Tuple]:
         """
-        Return the enemies in his area
+        Returns the paths to their nearest enemy of the units of the team that the pathfinder would find with its
+        Hierarchy, see planner.Snapshot. They are the units far from every enemy on large maps: the planner would
+        otherwise search the whole map for each one of them.
+        :param nearest: see nearest_enemies
         """
         _path = s.loaded_map.path
-        move_area = _path.area(unit.coord, unit.movement, False)
-        min_range, max_range = unit.get_weapon_range()
-        enemies = set()
-        for (x, y) in move_area:
-            for i in range(x - max_range, x + max_range + 1):
-                for j in range(y - max_range, y + max_range + 1):
-                    if min_range <= utils.distance((x, y), (i, j)) <= max_range:
-                        try:
-                            enemy = s.loaded_map.get_unit((i, j))
-                            if enemy and s.units_manager.are_enemies(enemy, unit):
-                                enemies.add(enemy)
-                        except KeyError:
-                            pass
-        return enemies
-
-    def best_target(self, enemies):
-        """
-        Choose the best enemy to attack from a list
-        """
-        enemies_values = [ u.value() for u in enemies ]
-        ranking = list(zip(enemies_values, enemies))
-        ranking.sort(key=itemgetter(0))
-        best = ranking[0][1]
-        return best
+        routes = {}
+        for i, unit in enumerate(units):
+            if unit in nearest and not unit.played and _path.is_long(unit.coord, nearest[unit][1]):
+                routes[i] = tuple(_path.shortest_path(unit.coord, nearest[unit][1]))
+        return routes
+
+    def plan_steps(self, state: search.State, order: List[int]) -> List[search.Step]:
+        """
+        What the units that still have to act in state should do, with the strategy of the team. A search only returns
+        the step of the next unit, so that the following one starts from the outcome of its battle; the greedy planner
+        returns the steps of all of them.
+        :param order: indices of the units of the team, see planning_order; the first ones win the ties in
+            planner.resolve
+        :return: an empty list when all the units acted
+        """
+        remaining = [i for i in order if i not in state.acted and state.alive(i)]
+        if not remaining:
+            return []
+        if self.strategy == 'mcts':
+            line, stats = search.search(state, self.relation, self.iterations, self.time_budget)
+            self.logger.info("Searched %d nodes, %.0f nodes/s", stats.nodes, search.nodes_per_second(stats))
+            return line[:1]
+        snap = state.snapshot()
+        orders = planner.resolve(snap, planner.plan(snap, remaining))
+        return [search.Step(i, tile, target) for i, tile, target in orders]
+
+
+class BackgroundPlanner(object):
+    """
+    Plans the turn of an AI team on a thread while the actions already planned are played.
+
+    The thread plans steps with AI.plan_steps, predicts the state after each one assuming the most likely outcome of its
+    battle, publishes both to a queue and goes on planning from the prediction if some units still have to act. poll
+    hands out the actions of the published steps; once those of a step have been played, the units involved are
+    compared with the prediction and the planning starts over from the actual state if they differ.
+    """
+    def __init__(self, team: AI):
+        self.team = team
+        self.logger = team.logger
+        self.queue = queue.Queue()
+        self.generation = 0  #: identifies the current planning, the steps of an older one are discarded
+        self.units = []  #: the units the indices of the current planning refer to
+        self.pending = []  #: actions of the current step not handed out yet
+        self.current = None  #: (step, predicted state) being played
+        self.restart()
+
+    def restart(self) -> None:
+        """
+        Starts planning again from the current state of the game.
+        """
+        self.generation += 1
+        self.units = list(s.units_manager.units)
+        acted = [i for i, unit in enumerate(self.units) if unit.team is not self.team or unit.played]
+        nearest = self.team.nearest_enemies()
+        snap = planner.snapshot(s.loaded_map, self.units, self.team.routes(self.units, nearest))
+        state = search.State.from_snapshot(snap, acted)
+        order = self.team.planning_order(self.units, nearest)
+        threading.Thread(target=self.run, args=(self.generation, state, order), daemon=True).start()
+
+    def stop(self) -> None:
+        self.generation += 1
+
+    def run(self, generation: int, state: search.State, order: List[int]) -> None:
+        try:
+            while generation == self.generation:
+                steps = self.team.plan_steps(state, order)
+                if not steps:
+                    self.queue.put((generation, None, None))
+                    return
+                for step in steps:
+                    state = state.clone()
+                    state.apply(step, None)
+                    self.queue.put((generation, step, state))
+        except Exception as e:
+            self.logger.exception("Planning failed: %s", e)
+            self.queue.put((generation, None, None))
+
+    def mispredicted(self, step: search.Step, predicted: search.State) -> bool:
+        for i in (step.unit, step.target):
+            if i is None:
+                continue
+            unit = self.units[i]
+            alive = unit in s.units_manager.units
+            if alive != predicted.alive(i):
+                return True
+            piece = predicted.pieces[i]
+            if alive and (unit.coord != piece.coord or forecast.side(unit) != piece.side):
+                return True
+        return False
+
+    def poll(self):
+        """
+        Returns the next action to play, None if it's not planned yet.
+        :raise StopIteration: when the turn is over
+        """
+        if s.winner is not None:
+            raise StopIteration
+        if self.pending:
+            return self.pending.pop(0)
+        if self.current is not None:
+            step, predicted = self.current
+            self.current = None
+            if step.target is None:
+                self.units[step.unit].played = True
+            if self.mispredicted(step, predicted):
+                self.logger.debug("The battle didn't go as predicted, planning again")
+                self.restart()
+                return None
+        try:
+            generation, step, predicted = self.queue.get_nowait()
+        except queue.Empty:
+            return None
+        if generation != self.generation:
+            return None
+        if step is None:
+            raise StopIteration
+        self.current = step, predicted
+        self.pending = self.team.step_actions(self.units, step)
+        return self.pending.pop(0) if self.pending else None
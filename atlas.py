@@ -0,0 +1,148 @@
+"""
+Packs unit sprites and UI textures into a few atlas pages, cached on disk with a JSON index.
+
+Sprites are stored already resized to their in-game size, so loading them costs a subsurface instead of decoding and
+scaling a full resolution image. The cache is rebuilt whenever a source image is added, removed or modified.
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pygame
+
+import resources
+import utils
+
+
+VERSION = 1  #: bump when the format of the cache changes
+PAGE_SIZE = (1024, 1024)
+PADDING = 1
+SPRITE_SIZE = (200, 200)  #: unit portraits are resized to fit this size, like Unit does
+SPRITE_SUFFIXES = ('.png', '.jpg')
+UI_TEXTURES = ['cursor.png', 'arrow.png', 'WindowBorder.png']  #: images packed at their original size
+INDEX_PATH = resources.CACHE_PATH / 'atlas.json'
+
+__logger = logging.getLogger(__name__)
+
+
+def sources() -> Dict[str, Tuple[Path, bool]]:
+    """
+    Returns the images to pack.
+    :return: a dict mapping the path of each image, as used by resources, to (path, whether it is a sprite)
+    """
+    images = {}
+    for f in sorted(resources.SPRITES_PATH.iterdir()):
+        if f.suffix in SPRITE_SUFFIXES:
+            images[str(f)] = (f, True)
+    for name in UI_TEXTURES:
+        f = resources.IMAGE_PATH / name
+        if f.is_file():
+            images[str(f)] = (f, False)
+    return images
+
+
+def is_stale(index: dict, images: Dict[str, Tuple[Path, bool]]) -> bool:
+    """
+    Returns True if the cached atlas does not match the source images.
+    """
+    if index.get('version') != VERSION or index.get('sprite_size') != list(SPRITE_SIZE):
+        return True
+    mtimes = index.get('mtimes', {})
+    if mtimes.keys() != images.keys():
+        return True
+    return any(mtimes[key] != path.stat().st_mtime for key, (path, _) in images.items())
+
+
+def pack(sizes: Dict[str, Tuple[int, int]]) -> Dict[str, Tuple[int, pygame.Rect]]:
+    """
+    Shelf packing: images are sorted by height and placed left to right on shelves, opening a new page when a page
+    is full. Images larger than a page are left out.
+    :param sizes: a dict mapping keys to image sizes
+    :return: a dict mapping keys to (page number, rect)
+    """
+    placed = {}
+    page, x, y, shelf_h = 0, 0, 0, 0
+    page_w, page_h = PAGE_SIZE
+    for key in sorted(sizes, key=lambda k: (-sizes[k][1], -sizes[k][0], k)):
+        w, h = sizes[key][0] + PADDING, sizes[key][1] + PADDING
+        if w > page_w or h > page_h:
+            __logger.warning("%s is too big for the atlas", key)
+            continue
+        if x + w > page_w:
+            x, y, shelf_h = 0, y + shelf_h, 0
+        if y + h > page_h:
+            page, x, y, shelf_h = page + 1, 0, 0, 0
+        placed[key] = (page, pygame.Rect((x, y), sizes[key]))
+        x += w
+        shelf_h = max(shelf_h, h)
+    return placed
+
+
+def build(images: Dict[str, Tuple[Path, bool]]) -> Tuple[dict, List[pygame.Surface]]:
+    """
+    Loads and resizes the source images and packs them into pages.
+    :return: the index and the list of pages
+    """
+    loaded = {}
+    for key, (path, sprite) in images.items():
+        image = pygame.image.load(str(path)).convert_alpha()
+        if sprite:
+            image = pygame.transform.smoothscale(image, utils.resize_keep_ratio(image.get_size(), SPRITE_SIZE))
+        loaded[key] = image
+
+    placed = pack({key: image.get_size() for key, image in loaded.items()})
+    pages = [pygame.Surface(PAGE_SIZE, flags=pygame.SRCALPHA) for _ in range(max((p for p, _ in placed.values()),
+                                                                                 default=-1) + 1)]
+    for page in pages:
+        page.fill((0, 0, 0, 0))
+    for key, (page, rect) in placed.items():
+        pages[page].blit(loaded[key], rect)
+
+    index = {
+        'version': VERSION,
+        'sprite_size': list(SPRITE_SIZE),
+        'mtimes': {key: path.stat().st_mtime for key, (path, _) in images.items()},
+        'pages': ['atlas-%d.png' % i for i in range(len(pages))],
+        'entries': {key: [page, list(rect)] for key, (page, rect) in placed.items()},
+    }
+    return index, pages
+
+
+def save(index: dict, pages: List[pygame.Surface]) -> None:
+    resources.CACHE_PATH.mkdir(parents=True, exist_ok=True)
+    for name, page in zip(index['pages'], pages):
+        pygame.image.save(page, str(resources.CACHE_PATH / name))
+    with open(INDEX_PATH, 'w') as f:
+        json.dump(index, f)
+
+
+def load() -> None:
+    """
+    Loads the atlas, building it first if the cache is missing or stale, and makes resources.load_sprite and
+    resources.load_image serve images from it. Must be called after the display mode is set.
+    """
+    images = sources()
+    try:
+        with open(INDEX_PATH) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    pages = None
+    if not is_stale(index, images):
+        try:
+            pages = [pygame.image.load(str(resources.CACHE_PATH / name)).convert_alpha() for name in index['pages']]
+        except (OSError, pygame.error):
+            __logger.warning("Atlas cache is damaged, rebuilding it")
+    if pages is None:
+        __logger.info("Building atlas of %d images", len(images))
+        index, pages = build(images)
+        try:
+            save(index, pages)
+        except (OSError, pygame.error) as e:
+            __logger.warning("Couldn't save the atlas cache: %s", e)
+
+    resources.set_atlas({key: pages[page].subsurface(pygame.Rect(rect))
+                         for key, (page, rect) in index['entries'].items()})
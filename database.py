@@ -0,0 +1,96 @@
+"""
+Unit and weapon database.
+
+The YAML files in resources/data are compiled to JSON the first time they are read after a change, with the C YAML
+loader when available, so loading a map only parses JSON. A Catalog builds the objects on demand, so only the units
+and weapons a map refers to are instantiated.
+"""
+
+import json
+import logging
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, Iterator, List, Tuple
+
+import resources
+
+
+VERSION = 1  #: bump when the format of the compiled files changes
+
+Record = Tuple[str, dict]  #: (class name, constructor arguments)
+
+__logger = logging.getLogger(__name__)
+
+
+def parse(path: Path) -> List[Record]:
+    """
+    Parses a YAML database: a list of single key mappings from class name to constructor arguments.
+    """
+    import yaml  # slow to import, needed only when a database changes
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(path, 'r') as f:
+        data = yaml.load(f, Loader=loader)
+    return [next(iter(entry.items())) for entry in data]
+
+
+def compiled_path(path: Path) -> Path:
+    return resources.CACHE_PATH / (path.stem + '.json')
+
+
+def load(path: Path) -> List[Record]:
+    """
+    Returns the records of a YAML database, compiling it first if the compiled copy is missing or stale.
+    """
+    path = Path(path)
+    mtime = path.stat().st_mtime
+    try:
+        with open(compiled_path(path)) as f:
+            compiled = json.load(f)
+        if compiled['version'] == VERSION and compiled['mtime'] == mtime:
+            return [tuple(record) for record in compiled['records']]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    __logger.info("Compiling %s", path)
+    records = parse(path)
+    try:
+        resources.CACHE_PATH.mkdir(parents=True, exist_ok=True)
+        with open(compiled_path(path), 'w') as f:
+            json.dump({'version': VERSION, 'mtime': mtime, 'records': records}, f)
+    except OSError as e:
+        __logger.warning("Couldn't save compiled %s: %s", path, e)
+    return records
+
+
+class Catalog(object):
+    """
+    Read-only mapping from name to the objects of a database, each one built the first time it's looked up.
+    """
+    def __init__(self, path: Path, module: ModuleType):
+        """
+        :param path: the YAML database
+        :param module: the module containing the classes named in the database
+        """
+        self.module = module
+        self.records: Dict[str, Record] = {kwargs['name']: (cls, kwargs) for cls, kwargs in load(path)}
+        self.objects = {}
+
+    def __getitem__(self, name: str):
+        try:
+            return self.objects[name]
+        except KeyError:
+            cls, kwargs = self.records[name]
+        obj = self.objects[name] = getattr(self.module, cls)(**kwargs)
+        return obj
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.records
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, name: str, default=None):
+        return self[name] if name in self.records else default
@@ -6,13 +6,14 @@ import pygame
 import os
 
 import resources
+import startup
 import utils
 import colors as c
 import fonts
 
 import math
 
-from typing import Tuple
+from typing import List, Tuple
 
 
 window = None
@@ -21,8 +22,13 @@ min_resolution = (800, 600)
 fps = 60
 clock = None
 mode = pygame.RESIZABLE
-spinner_angle = 0
+spinner_frame = 0
 spinner_size = (15, 15)
+spinner_frames = []
+fps_label = (None, None)  # (fps value, rendered label)
+overlay_rect = None  # area covered by the FPS counter and the spinner in the last frame
+dirty_ratio = 1.0  # fraction of the window that has been updated in the last frame
+FULL_UPDATE_RATIO = 0.5  # above this dirty ratio a full flip is cheaper than updating many rects
 FPS_FONT = None
 
 pygame.mixer.pre_init(frequency=44100, size=-16, channels=2)
@@ -32,21 +38,25 @@ def initialize() -> None:
     """
     Must be called first to initialize pygame and this module.
     """
-    global window, clock, FPS_FONT
+    global window, clock
     if pygame.get_init():
         return
 
-    pygame.init()
-    pygame.display.set_icon(resources.load_image('icon.png'))
-    version = utils.get_version()
-
-    window = pygame.display.set_mode(resolution, mode)
-    pygame.display.set_caption("Ice Emblem " + version)
+    # only the display is needed to show the first frame, the other modules are initialized after it
+    with startup.section("display"):
+        pygame.display.init()
+        pygame.display.set_icon(resources.load_image('icon.png'))
+        window = pygame.display.set_mode(resolution, mode)
+        pygame.display.set_caption("Ice Emblem " + utils.get_version())
+        window.fill(c.BLACK)
+        pygame.display.flip()
+    startup.mark("boot frame")
+
+    with startup.section("pygame"):
+        pygame.init()
     pygame.key.set_repeat(200, 50)
     clock = pygame.time.Clock()
 
-    FPS_FONT = pygame.font.SysFont("Liberation Sans", 12)
-
     fonts.load_fonts(os.environ['LANG'])
 
 
@@ -89,25 +99,39 @@ def set_resolution(res: Tuple[int, int]):
     pygame.event.post(pygame.event.Event(pygame.VIDEORESIZE, size=res, w=res[0], h=res[1]))
 
 
-def draw_fps(font=None) -> None:
+def draw_fps(font=None) -> pygame.Rect:
     """
     Draws an FPS counter and a spinner.
+
+    The label is rendered again only when the integer FPS value changes and the spinner frames are drawn only once.
     :param font: the font to use to render the counter. There is a default font if not specified.
+    :return: the area of the window covered by the counter and the spinner.
     """
-    global spinner_angle
+    global spinner_frame, fps_label, overlay_rect, FPS_FONT
     if not font:
+        if FPS_FONT is None:
+            FPS_FONT = pygame.font.SysFont("Liberation Sans", 12)  # slow: looks up the system fonts
         font = FPS_FONT
     screen_w, screen_h = window.get_size()
-    fps = clock.get_fps()
-    fpslabel = font.render('%d FPS' % int(fps), True, c.WHITE, c.BLACK).convert()
+    fps = int(clock.get_fps())
+    if fps_label[0] != fps:
+        fps_label = (fps, font.render('%d FPS' % fps, True, c.WHITE, c.BLACK).convert())
+    fpslabel = fps_label[1]
     rec = fpslabel.get_rect(top=5, right=screen_w - 5 - spinner_size[0])
     window.blit(fpslabel, rec)
 
-    spinner_angle -= math.pi / 4
-    spinner_angle %= math.pi * 2
-    surf = pygame.Surface(spinner_size)
-    pygame.draw.arc(surf, c.WHITE, surf.get_rect(), spinner_angle, spinner_angle + math.pi / 4, 2)
-    window.blit(surf, surf.get_rect(top=5, right=screen_w - 5))
+    if not spinner_frames:
+        for i in range(8):
+            angle = -i * math.pi / 4 % (math.pi * 2)
+            surf = pygame.Surface(spinner_size)
+            pygame.draw.arc(surf, c.WHITE, surf.get_rect(), angle, angle + math.pi / 4, 2)
+            spinner_frames.append(surf)
+    spinner_frame = (spinner_frame + 1) % len(spinner_frames)
+    surf = spinner_frames[spinner_frame]
+    spinner_rect = window.blit(surf, surf.get_rect(top=5, right=screen_w - 5))
+
+    overlay_rect = rec.union(spinner_rect)
+    return overlay_rect
 
 
 def tick(_fps=None) -> int:
@@ -124,9 +148,30 @@ def flip() -> None:
     """
     Equivalent to pygame.display.flip()
     """
+    global dirty_ratio
+    dirty_ratio = 1.0
     pygame.display.flip()
 
 
+def update(rects: List[pygame.Rect]) -> None:
+    """
+    Pushes only the given areas of the window to the screen, like pygame.display.update(rects).
+
+    Falls back to flip() when the areas cover most of the window.
+    :param rects: list of pygame.Rect in window coordinates.
+    """
+    global dirty_ratio
+    screen = window.get_rect()
+    rects = [r.clip(screen) for r in rects]
+    rects = [r for r in rects if r.w and r.h]
+    ratio = sum(r.w * r.h for r in rects) / (screen.w * screen.h)
+    if ratio > FULL_UPDATE_RATIO:
+        flip()
+    else:
+        dirty_ratio = ratio
+        pygame.display.update(rects)
+
+
 def get_rect(**kwargs) -> pygame.Rect:
     """
     Returns window's rect.
@@ -5,46 +5,149 @@ Wrapper of pygame.event with useful functions
 import pygame
 import pygame.locals as p
 import logging
-from typing import List, Iterator
+from typing import Callable, Iterable, Iterator, List, Set, Union
+
+import timers
 
 
 ALWAYS_ALLOWED = [p.QUIT, p.VIDEORESIZE]
 
 EMPTY_EVENT = pygame.event.Event(p.NOEVENT, {})
 
-available_events = set(range(p.USEREVENT, p.NUMEVENTS))
-
 __logger = logging.getLogger('EventHandler')
 
+__allowed: Union[Set[int], None] = None  # mirrors the event types pygame lets on its queue
+
+wheel = timers.TimerWheel()  #: timers of set_timeout and set_interval of the room tree being run by room.run_room
+__suspended: List[timers.TimerWheel] = []  # wheels of the room trees waiting for a nested run_room to return
+__last_update = None  # pygame.time.get_ticks() at the last update_timers
+
+
+def new_timer(time: int, callback: Callable, repeat: bool = False) -> timers.Timer:
+    """
+    Schedules callback to be called after time milliseconds. See timers.TimerWheel.schedule.
+    """
+    timer = wheel.schedule(time, callback, repeat)
+    __logger.debug("New %d ms timer (%s)", time, timer)
+    return timer
+
+
+def stop_timer(timer: timers.Timer) -> None:
+    if timer.wheel is not None:
+        timer.wheel.cancel(timer)  # the timer may belong to a suspended room tree
+    __logger.debug("Timer %s stopped", timer)
+
+
+def suspend_timers() -> None:
+    """
+    Sets the current timers aside and starts over with no timers, so that the ones of a suspended room tree don't fire
+    while a nested one runs. The time spent suspended doesn't count for them.
+    """
+    global wheel
+    __suspended.append(wheel)
+    wheel = timers.TimerWheel()
+
+
+def resume_timers() -> None:
+    """
+    Drops the current timers and brings back the ones set aside by the last suspend_timers.
+    """
+    global wheel
+    wheel = __suspended.pop()
+
+
+def update_timers() -> None:
+    """
+    Advances the timers by the time elapsed since the last call, calling the callbacks of the expired ones.
+    """
+    global __last_update
+    now = pygame.time.get_ticks()
+    if __last_update is not None:
+        wheel.advance(now - __last_update)
+    __last_update = now
+
+
+def wait_event() -> pygame.event.Event:
+    """
+    Like pygame.event.wait, but wakes up in time for the next timer. Returns a NOEVENT event on timeout.
+    """
+    timeout = wheel.next_expiry()
+    if timeout is None:
+        return pygame.event.wait()
+    return pygame.event.wait(max(1, timeout))
+
+
+def _as_list(event_types: Union[int, Iterable[int]]) -> List[int]:
+    return [event_types] if isinstance(event_types, int) else list(event_types)
+
+
+def _allowed_types() -> Set[int]:
+    """
+    Returns the authoritative set of allowed event types. pygame is queried only the first time.
+    """
+    global __allowed
+    if __allowed is None:
+        __allowed = {i for i in range(0, p.NUMEVENTS) if not pygame.event.get_blocked(i)}
+    return __allowed
+
 
-def new_timer(time: int):
-    event_type = available_events.pop()
-    pygame.time.set_timer(event_type, time)
-    __logger.debug("New %d ms timer (%d)", time, event_type)
-    return event_type
+def _allow(event_types: Union[int, Iterable[int], None]) -> None:
+    """
+    Calls pygame.event.set_allowed and keeps the allowed set in sync. None means every event type, like in pygame.
+    """
+    global __allowed
+    if event_types is None:
+        pygame.event.set_allowed(None)
+        __allowed = set(range(0, p.NUMEVENTS))
+    else:
+        event_types = _as_list(event_types)
+        pygame.event.set_allowed(event_types)
+        _allowed_types().update(event_types)
 
 
-def stop_timer(event_type: int) -> None:
-    pygame.time.set_timer(event_type, 0)
-    available_events.add(event_type)
-    __logger.debug("Timer %d stopped", event_type)
+def _block(event_types: Union[int, Iterable[int], None]) -> None:
+    """
+    Calls pygame.event.set_blocked and keeps the allowed set in sync. None means every event type, like in pygame.
+    """
+    global __allowed
+    if event_types is None:
+        pygame.event.set_blocked(None)
+        __allowed = set()
+    else:
+        event_types = _as_list(event_types)
+        pygame.event.set_blocked(event_types)
+        _allowed_types().difference_update(event_types)
 
 
 def get_allowed() -> Iterator[int]:
     """
-    Queries pygame and returns the generator of allowed event types.
+    Returns an iterator over the allowed event types, in ascending order.
     """
-    blocked = map(pygame.event.get_blocked, range(0, p.NUMEVENTS))
-    allowed = map(lambda x: not x, blocked)
-    return (i for i, v in enumerate(allowed) if v)
+    return iter(sorted(_allowed_types()))
 
 
 def get_blocked() -> Iterator[int]:
     """
-    Queries pygame and returns the set of blocked event types.
+    Returns an iterator over the blocked event types, in ascending order.
+    """
+    allowed = _allowed_types()
+    return (i for i in range(0, p.NUMEVENTS) if i not in allowed)
+
+
+def is_allowed(event_type: int) -> bool:
+    """
+    Returns True if event_type is allowed on pygame's queue.
+    """
+    return event_type in _allowed_types()
+
+
+def pending() -> bool:
+    """
+    Returns True if there are events in pygame's queue.
+
+    Blocked event types never reach the queue, so there is no need to filter by the allowed types.
     """
-    blocked = map(pygame.event.get_blocked, range(0, p.NUMEVENTS))
-    return (i for i, v in enumerate(blocked) if v)
+    return pygame.event.peek()
 
 
 def allow_all() -> None:
@@ -53,16 +156,17 @@ def allow_all() -> None:
     is blocked by default and at the moment is not needed anyhow)
     """
     # workaround to re-enable all events except SYSWMEVENT
-    pygame.event.set_allowed(list(range(p.NOEVENT, p.NUMEVENTS)))
-    pygame.event.set_blocked(p.SYSWMEVENT)
+    _allow(range(p.NOEVENT, p.NUMEVENTS))
+    _block(p.SYSWMEVENT)
 
 
 def block_all() -> None:
     """
     All event types are blocked.
     """
-    pygame.event.set_allowed(None)
-    pygame.event.set_allowed(ALWAYS_ALLOWED)
+    # N.B. pygame.event.set_allowed(None) actually allows every event type, the allowed set mirrors that
+    _allow(None)
+    _allow(ALWAYS_ALLOWED)
 
 
 def post(events) -> None:
@@ -86,16 +190,15 @@ def set_allowed(event_types: List[int]) -> None:
     All other event types will be blocked.
     Allowed events that would be discarded by pygame are kept and reposted.
     """
+    event_types = set(event_types).union(ALWAYS_ALLOWED)
 
-    event_types.extend(ALWAYS_ALLOWED)
-
-    if set(event_types) == get_allowed():
+    if event_types == _allowed_types():
         return
 
     discarded_events = pygame.event.get()
 
     block_all()
-    pygame.event.set_allowed(event_types)
+    _allow(event_types)
 
     post([e for e in discarded_events if e.type in event_types])
 
@@ -105,16 +208,16 @@ def set_blocked(event_types: List[int]) -> None:
     This is the opposite of set_allowed.
     Allowed events that would be discarded by pygame are kept and reposted.
     """
-    event_types -= ALWAYS_ALLOWED
+    event_types = set(event_types).difference(ALWAYS_ALLOWED)
 
-    if set(get_allowed()).isdisjoint(set(event_types)):
+    if _allowed_types().isdisjoint(event_types):
         return
 
     discarded_events = pygame.event.get()
 
     allow_all()
     if event_types:
-        pygame.event.set_blocked(event_types)
+        _block(event_types)
 
     post([e for e in discarded_events if e.type not in event_types])
 
@@ -125,8 +228,8 @@ def add_allowed(event_types: List[int]) -> None:
     Allowed events that would be discarded by pygame are kept and reposted.
     """
     discarded = pygame.event.get()
-    pygame.event.set_allowed(event_types)
-    post([e for e in discarded if e.type in event_types])
+    _allow(event_types)
+    post(discarded)
 
 
 def add_blocked(event_types: List[int]) -> None:
@@ -135,20 +238,21 @@ def add_blocked(event_types: List[int]) -> None:
     Allowed events that would be discarded by pygame are kept and reposted.
     """
     discarded = pygame.event.get()
-    pygame.event.set_blocked(event_types)
-    post([e for e in discarded if e.type in event_types])
+    _block(event_types)
+    post([e for e in discarded if e.type not in _as_list(event_types)])
 
 
 def event_loop(callback, wait=True) -> None:
     """
     Call a function passing all events as an argument until it returns True.
-    If wait is True it calls pygame.event.wait if there are no events in
+    If wait is True it calls wait_event if there are no events in
     pygame's queue, otherwise it just calls pygame.event.get.
     """
     done = callback([EMPTY_EVENT])
     while not done:
-        if wait and not pygame.event.peek(list(get_allowed())):
-            events = [pygame.event.wait()]
+        if wait and not pending():
+            events = [wait_event()]
         else:
             events = pygame.event.get()
+        update_timers()
         done = callback(events)
@@ -1,25 +1,66 @@
+from collections import OrderedDict
+
+import pygame
+
 import resources
 
 
-MAIN_MENU = None
-MAIN = None
-SMALL = None
-SMALLER = None
-MONOSPACE = None
+RENDER_CACHE_SIZE = 512  #: number of rendered texts kept by render
+_render_cache = OrderedDict()
+
+# font name -> (file, size) for each language, loaded on first use through __getattr__
+FONTS = {
+    'MAIN_MENU': ('Medieval Sharp/MedievalSharp.ttf', 48),
+    'MAIN': ('Medieval Sharp/MedievalSharp.ttf', 36),
+    'SMALL': ('Medieval Sharp/MedievalSharp.ttf', 24),
+    'SMALLER': ('Medieval Sharp/MedievalSharp.ttf', 18),
+    'MONOSPACE': ("LiberationMono/LiberationMono-Regular.ttf", 18),
+}
+FONTS_JA = {
+    'MAIN_MENU': ('BabelStoneHan.ttf', 48),
+    'MAIN': ('BabelStoneHan.ttf', 36),
+    'SMALL': ('BabelStoneHan.ttf', 24),
+    'SMALLER': ('BabelStoneHan.ttf', 18),
+    'MONOSPACE': ("LiberationMono/LiberationMono-Regular.ttf", 18),
+}
+_fonts = FONTS
 
 
 def load_fonts(lang):
-    global MAIN_MENU, MAIN, SMALL, SMALLER, MONOSPACE
-    if lang != 'ja_JP':
-        MAIN_MENU = resources.load_font('Medieval Sharp/MedievalSharp.ttf', 48)
-        MAIN = resources.load_font('Medieval Sharp/MedievalSharp.ttf', 36)
-        SMALL = resources.load_font('Medieval Sharp/MedievalSharp.ttf', 24)
-        SMALLER = resources.load_font('Medieval Sharp/MedievalSharp.ttf', 18)
-        MONOSPACE = resources.load_font("LiberationMono/LiberationMono-Regular.ttf", 18)
-    else:
-        MAIN_MENU = resources.load_font('BabelStoneHan.ttf', 48)
-        MAIN = resources.load_font('BabelStoneHan.ttf', 36)
-        SMALL = resources.load_font('BabelStoneHan.ttf', 24)
-        SMALLER = resources.load_font('BabelStoneHan.ttf', 18)
-        MONOSPACE = resources.load_font("LiberationMono/LiberationMono-Regular.ttf", 18)
+    """
+    Chooses the fonts for lang. Each font is loaded the first time it's used, e.g. fonts.MAIN.
+    """
+    global _fonts
+    _fonts = FONTS_JA if lang == 'ja_JP' else FONTS
+    for name in FONTS:
+        globals().pop(name, None)
+
+
+def __getattr__(name):
+    try:
+        fname, size = _fonts[name]
+    except KeyError:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name)) from None
+    font = globals()[name] = resources.load_font(fname, size)
+    return font
+
+
+def render(font: pygame.font.Font, text: str, antialias: bool, color, background=None) -> pygame.Surface:
+    """
+    Like font.render, but keeps the RENDER_CACHE_SIZE most recently used results.
 
+    The returned surface is shared with other callers, so it must not be modified.
+    """
+    key = (font, text, antialias, tuple(color), tuple(background) if background is not None else None)
+    try:
+        surface = _render_cache[key]
+        _render_cache.move_to_end(key)
+    except KeyError:
+        if background is None:
+            surface = font.render(text, antialias, color)
+        else:
+            surface = font.render(text, antialias, color, background)
+        _render_cache[key] = surface
+        if len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    return surface
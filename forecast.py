@@ -0,0 +1,224 @@
+"""
+Exact battle forecasts.
+
+Unit.attack samples hit and critical with random.randrange. Here the same rules are followed over the sequence of
+rounds played by BattleAnimation, keeping the probability of every reachable (health, health, uses, uses) state, so
+the result is the exact distribution of the outcome of a battle.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+from math import ceil
+from typing import Dict, Tuple
+
+import utils
+
+
+KILL_VALUE = 50  #: worth of a kill in Forecast.value, in health points
+
+Weapon = namedtuple('Weapon', 'might hit crit uses min_range max_range')
+
+Side = namedtuple('Side', 'health strength skill speed luck defence weapon')
+Side.__doc__ = """The stats of a unit that matter in a battle. weapon is a Weapon or None."""
+
+
+def side(unit) -> Side:
+    """
+    Returns the Side of a unit.
+    """
+    w = unit.weapon
+    weapon = None if w is None else Weapon(w.might, w.hit, w.crit, w.uses, w.min_range, w.max_range)
+    return Side(unit.health, unit.strength, unit.skill, unit.speed, unit.luck, unit.defence, weapon)
+
+
+def weapon_range(s: Side) -> Tuple[int, int]:
+    return (s.weapon.min_range, s.weapon.max_range) if s.weapon is not None else (1, 1)
+
+
+def number_of_attacks(a: Side, d: Side, distance: int) -> Tuple[int, int]:
+    """
+    Same as Unit.number_of_attacks.
+    """
+    a_attacks = d_attacks = 1
+    if a.speed > d.speed:
+        a_attacks += 1
+    elif d.speed > a.speed:
+        d_attacks += 1
+    a_min, a_max = weapon_range(a)
+    d_min, d_max = weapon_range(d)
+    if not a_min <= distance <= a_max:
+        a_attacks = 0
+    if not d_min <= distance <= d_max:
+        d_attacks = 0
+    return a_attacks, d_attacks
+
+
+@lru_cache(maxsize=64)
+def attack_order(a_attacks: int, d_attacks: int) -> Tuple[int, ...]:
+    """
+    Returns who attacks in each round, like BattleAnimation: 0 for the attacker and 1 for the defender.
+    The attacker always attacks in the first round.
+    """
+    order = []
+    left = [a_attacks, d_attacks]
+    turn = 0
+    while True:
+        order.append(turn)
+        left[turn] -= 1
+        if left[1 - turn] > 0:
+            turn = 1 - turn
+        if left[0] <= 0 and left[1] <= 0:
+            return tuple(order)
+
+
+def attack_odds(a: Side, d: Side, armed: bool) -> Tuple[float, float, int]:
+    """
+    Returns the probability of hitting, the probability of a critical and the damage of an attack, like Unit.attack.
+    """
+    if armed:
+        hit = a.skill * 2 + a.weapon.hit + a.luck / 2
+        damage = a.strength + a.weapon.might - d.defence
+        crit = a.skill // 2 + a.weapon.crit - d.luck
+    else:
+        hit = a.skill * 2 + a.luck / 2
+        damage = a.strength - d.defence
+        crit = a.skill // 2 - d.luck
+    # randrange(0, 100) < x is true for ceil(x) of the 100 possible values
+    return min(max(ceil(hit), 0), 100) / 100, min(max(ceil(crit), 0), 100) / 100, damage
+
+
+class Forecast(object):
+    """
+    Outcome distribution of a battle.
+    """
+    def __init__(self, attacker: Side, defender: Side, outcomes: Dict[Tuple[int, int, int, int], float]):
+        self.attacker = attacker
+        self.defender = defender
+        #: (attacker health, defender health, attacker weapon uses, defender weapon uses) -> probability
+        self.outcomes = outcomes
+        self.attacker_health = self.marginal(0)  #: final health -> probability
+        self.defender_health = self.marginal(1)
+
+    def marginal(self, index: int) -> Dict[int, float]:
+        distribution = {}
+        for state, p in self.outcomes.items():
+            distribution[state[index]] = distribution.get(state[index], 0) + p
+        return distribution
+
+    @property
+    def kill_chance(self) -> float:
+        """
+        Probability that the defender dies.
+        """
+        return self.defender_health.get(0, 0.0)
+
+    @property
+    def death_chance(self) -> float:
+        """
+        Probability that the attacker dies.
+        """
+        return self.attacker_health.get(0, 0.0)
+
+    @property
+    def damage_dealt(self) -> float:
+        """
+        Expected damage to the defender.
+        """
+        return self.defender.health - sum(h * p for h, p in self.defender_health.items())
+
+    @property
+    def damage_taken(self) -> float:
+        """
+        Expected damage to the attacker.
+        """
+        return self.attacker.health - sum(h * p for h, p in self.attacker_health.items())
+
+    def uses_consumed(self, index: int) -> Dict[int, float]:
+        """
+        Distribution of the weapon uses consumed by the attacker (index 0) or the defender (index 1).
+        """
+        s = (self.attacker, self.defender)[index]
+        if s.weapon is None:
+            return {0: 1.0}
+        return {s.weapon.uses - uses: p for uses, p in self.marginal(2 + index).items()}
+
+    def value(self) -> float:
+        """
+        How good the battle is for the attacker: expected damage balance, plus KILL_VALUE for a certain kill.
+        """
+        return (self.damage_dealt - self.damage_taken
+                + KILL_VALUE * (self.kill_chance - self.death_chance))
+
+    def __repr__(self) -> str:
+        return "<Forecast kill: %.2f death: %.2f dealt: %.1f taken: %.1f>" % (
+            self.kill_chance, self.death_chance, self.damage_dealt, self.damage_taken)
+
+
+@lru_cache(maxsize=4096)
+def forecast(attacker: Side, defender: Side, distance: int) -> Forecast:
+    """
+    Computes the exact outcome distribution of a battle. Results are memoized on the arguments.
+    :param attacker: the unit starting the battle
+    :param defender: the attacked unit
+    :param distance: the distance between the two units
+    """
+    sides = (attacker, defender)
+    no_uses = -1  # uses of a missing weapon, never consumed
+    states = {(attacker.health, defender.health,
+               attacker.weapon.uses if attacker.weapon else no_uses,
+               defender.weapon.uses if defender.weapon else no_uses): 1.0}
+    odds = {}  # (turn, armed) -> attack_odds
+
+    for turn in attack_order(*number_of_attacks(attacker, defender, distance)):
+        target = 1 - turn
+        new_states = {}
+        for state, p in states.items():
+            if state[0] <= 0 or state[1] <= 0:
+                # somebody died: the battle is over
+                new_states[state] = new_states.get(state, 0) + p
+                continue
+            armed = state[2 + turn] > 0
+            try:
+                hit, crit, damage = odds[turn, armed]
+            except KeyError:
+                hit, crit, damage = odds[turn, armed] = attack_odds(sides[turn], sides[target], armed)
+            branches = [(1 - hit, 0)]
+            if damage <= 0:
+                branches.append((hit, 0))
+            else:
+                branches.append((hit * crit, damage * 3))
+                branches.append((hit * (1 - crit), damage))
+            for q, dmg in branches:
+                if q == 0:
+                    continue
+                new_state = list(state)
+                if dmg > 0:
+                    new_state[target] = max(0, state[target] - dmg)
+                    if armed:
+                        new_state[2 + turn] -= 1
+                new_state = tuple(new_state)
+                new_states[new_state] = new_states.get(new_state, 0) + p * q
+        states = new_states
+
+    return Forecast(attacker, defender, states)
+
+
+def battle_distance(attacker, defender) -> int:
+    """
+    The distance two units would fight at: the current one if the defender is in range, otherwise the minimum range of
+    the attacker, which is where it would move to.
+    """
+    distance = utils.distance(attacker.coord, defender.coord)
+    min_range, max_range = attacker.get_weapon_range()
+    return distance if min_range <= distance <= max_range else min_range
+
+
+def forecast_units(attacker, defender, distance: int = None) -> Forecast:
+    """
+    Forecasts a battle between two units.
+    :param distance: defaults to battle_distance
+    """
+    if distance is None:
+        distance = battle_distance(attacker, defender)
+    return forecast(side(attacker), side(defender), distance)
+
@@ -139,17 +139,22 @@ class AITurn(Turn):
 
     def begin(self):
         super().begin()
-        self.actions = iter(self.team)
+        self.planner = ai.BackgroundPlanner(self.team)
 
     def loop(self, _events, dt):
         super().loop(_events, dt)
         if len(s.loaded_map.children) == 0 and not self.next:
             try:
-                action = next(self.actions)
-                s.loaded_map.do_action(action)
+                action = self.planner.poll()
+                if action is not None:
+                    s.loaded_map.do_action(action)
             except StopIteration:
                 self.team.end_turn()
 
+    def end(self):
+        self.planner.stop()
+        super().end()
+
 
 def main_menu():
     room.run(rooms.SplashScreen())
@@ -169,7 +174,10 @@ def play(map_file):
     if map_file is None:
         main_menu()
     else:
-        s.load_map(map_file)
+        loading = rooms.LoadingScreen(map_file)
+        room.run_room(loading)
+        if loading.error is not None:
+            raise RuntimeError(loading.error)
 
     while True:
         actual_game()
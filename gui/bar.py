@@ -3,13 +3,21 @@
 """
 
 
+from collections import OrderedDict
+
 import pygame
 
 import room
 import colors as c
 
 
+STRIP_CACHE_SIZE = 32  #: number of strips kept by LifeBar.strip
+
+
 class LifeBar(room.Room):
+    # (points, blocks_per_row, block_size, spacing, color) -> surface with every block filled with color
+    _strips = OrderedDict()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._points = kwargs.get('points', 100)
@@ -17,10 +25,8 @@ class LifeBar(room.Room):
         self.block_size = kwargs.get('block_size', (12, 20))
         self.blocks_per_row = kwargs.get('blocks_per_row', 10)
         self.spacing = kwargs.get('spacing', (1, 1))
-        self._life = pygame.Surface(self.block_size)
-        self._damage = self._life.copy()
-        self._life.fill(kwargs.get('life_color', c.GREEN))
-        self._damage.fill(kwargs.get('damage_color', c.RED))
+        self.life_color = kwargs.get('life_color', c.GREEN)
+        self.damage_color = kwargs.get('damage_color', c.RED)
 
     @property
     def value(self):
@@ -41,20 +47,50 @@ class LifeBar(room.Room):
         self.invalidate()
         self.layout_request()
 
-    def measure(self, spec_width, spec_height):
+    def content_size(self):
         w = min(self.points, self.blocks_per_row) * (self.block_size[0] + self.spacing[0])
         h = (((self.points - 1) // self.blocks_per_row) + 1) * (self.block_size[1] + self.spacing[1])
-        self.resolve_measure(spec_width, spec_height, w, h)
+        return w, h
+
+    def measure(self, spec_width, spec_height):
+        self.resolve_measure(spec_width, spec_height, *self.content_size())
+
+    def strip(self, color):
+        """
+        Returns a surface with all the blocks of the bar filled with color. Strips are shared by all bars, the
+        STRIP_CACHE_SIZE most recently used are kept.
+        """
+        key = (self.points, self.blocks_per_row, tuple(self.block_size), tuple(self.spacing), tuple(color))
+        try:
+            strip = LifeBar._strips[key]
+            LifeBar._strips.move_to_end(key)
+            return strip
+        except KeyError:
+            strip = pygame.Surface(self.content_size(), flags=pygame.SRCALPHA)
+            strip.fill((0, 0, 0, 0))
+            for i in range(self.points):
+                x = (i % self.blocks_per_row) * (self.block_size[0] + self.spacing[0])
+                y = (i // self.blocks_per_row) * (self.block_size[1] + self.spacing[1])
+                strip.fill(color, pygame.Rect((x, y), self.block_size))
+            LifeBar._strips[key] = strip
+            if len(LifeBar._strips) > STRIP_CACHE_SIZE:
+                LifeBar._strips.popitem(last=False)
+            return strip
 
     def draw(self):
         self.surface.fill((0, 0, 0, 0))
-        for i in range(self.points):
-            x = (i % self.blocks_per_row) * (self.block_size[0] + self.spacing[0])
-            y = (i // self.blocks_per_row) * (self.block_size[1] + self.spacing[1])
-            if i < self._value % (self.points + 1):
-                self.surface.blit(self._life, (x, y))
-            else:
-                self.surface.blit(self._damage, (x, y))
+        life, damage = self.strip(self.life_color), self.strip(self.damage_color)
+        w, h = life.get_size()
+        block_w = self.block_size[0] + self.spacing[0]
+        row_h = self.block_size[1] + self.spacing[1]
+        full_rows, rest = divmod(self._value % (self.points + 1), self.blocks_per_row)
+        top = full_rows * row_h
+        # full rows of life, then the row split between life and damage, then full rows of damage
+        self.surface.blit(life, (0, 0), pygame.Rect(0, 0, w, top))
+        self.surface.blit(life, (0, top), pygame.Rect(0, top, rest * block_w, row_h))
+        self.surface.blit(damage, (rest * block_w, top), pygame.Rect(rest * block_w, top, w - rest * block_w, row_h))
+        self.surface.blit(damage, (0, top + row_h), pygame.Rect(0, top + row_h, w, max(0, h - top - row_h)))
+        self.valid = True
 
 
 if __name__ == "__main__":
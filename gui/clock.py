@@ -5,7 +5,6 @@ Simple widget that displays elapsed time.
 from datetime import timedelta
 
 import gui
-import events
 
 
 class Clock(gui.Label):
@@ -17,8 +16,8 @@ class Clock(gui.Label):
 
     def begin(self):
         super().begin()
-        if not self.timeout:
-            self.timeout = events.new_timer(100)  # generate an event every 100ms
+        if not self.timeout or not self.timeout.active:
+            self.timeout = self.set_interval(100, lambda _timer: None)  # wake up the main loop every 100ms
 
     def reset(self):
         self.time = 0
@@ -6,6 +6,7 @@
 import pygame
 
 import room
+import fonts
 
 import colors as c
 
@@ -16,27 +17,38 @@ class Label(room.Room):
         self.font = font
         self.leading = kwargs.get('leading', 10)
         self.tabs = kwargs.get('tabs', 100)
-        self.txt_color = kwargs.get('txt_color', c.WHITE)
+        self._txt_color = kwargs.get('txt_color', c.WHITE)
         #self.align = kwargs.get('align', 'center')
         self.text = self.format_string = format_string
         self._render_text()
 
+    @property
+    def txt_color(self):
+        return self._txt_color
+
+    @txt_color.setter
+    def txt_color(self, color):
+        if color != self._txt_color:
+            self._txt_color = color
+            self._render_text()
+            self.invalidate()
+
     def _render_text(self):
         lines = map(lambda x: x.split('\t'), self.text.split('\n'))
-        self.rendered_text = [ [self.font.render(t, True, self.txt_color) for t in r] for r in lines ]
-
-    def draw(self):
-        self.fill()
-        text_surf = pygame.Surface(self.text_area(), flags=pygame.SRCALPHA)
+        self.rendered_text = [[fonts.render(self.font, t, True, self.txt_color) for t in r] for r in lines]
+        self.text_surface = pygame.Surface(self.text_area(), flags=pygame.SRCALPHA)
         y = 0
-        for i, line in enumerate(self.rendered_text):
+        for line in self.rendered_text:
             x = 0
             for tab in line:
-                text_surf.blit(tab, (x, y))
+                self.text_surface.blit(tab, (x, y))
                 x += self.tab_space(tab.get_width())
             y += self.font.get_linesize() + self.leading
-        pos_rect = text_surf.get_rect(centerx=self.rect.w//2, centery=self.rect.h//2)
-        self.surface.blit(text_surf, pos_rect)
+
+    def draw(self):
+        self.fill()
+        pos_rect = self.text_surface.get_rect(centerx=self.rect.w//2, centery=self.rect.h//2)
+        self.surface.blit(self.text_surface, pos_rect)
         self.draw_children()
         self.valid = True
 
@@ -4,6 +4,7 @@
 
 
 import gui
+import forecast
 import fonts as f
 import state as s
 import resources
@@ -24,10 +25,12 @@ class Sidebar(gui.LinearLayout):
         self.turn_label = gui.Label(_("{team} turn"), font)
         self.terrain_label = gui.Label(f'Terrain: {{0}}\n{_("Def")}: {{1}}\n{_("Avoid")}: {{2}}\n{_("Allowed")}: {{3}}', font)
         self.unit_label = gui.Label('Unit: {0}\nHealth: {1}\nCan move on: {2}\nWeapon: {3}\nEntangled:\n{4}', font)
+        self.forecast_label = gui.Label('', font)
         self.coord_label = gui.Label('X: {0} Y: {1}', font, layout=Layout(gravity=Gravity.BOTTOM))
         self.clock = gui.Clock(font, layout=Layout(gravity=Gravity.BOTTOM))
 
-        self.add_children(self.turn_label, self.terrain_label, self.unit_label, self.coord_label, self.clock)
+        self.add_children(self.turn_label, self.terrain_label, self.unit_label, self.forecast_label, self.coord_label,
+                          self.clock)
 
         if isinstance(turn, game.PlayerTurn):
             self.add_child(self.endturn_btn)
@@ -60,4 +63,20 @@ class Sidebar(gui.LinearLayout):
             self.unit_label.set_text("No unit")
 
         self.coord_label.format(*coord)
+        self.preview_battle(unit, coord)
+
+    def preview_battle(self, unit, coord):
+        """
+        Shows the forecast of the battle between the selected unit and the enemy under the cursor, if it can attack it.
+        """
+        _map = s.loaded_map
+        selected = _map.curr_unit
+        if unit is None or selected is None or coord not in _map.attack_area \
+                or not s.units_manager.are_enemies(selected, unit):
+            self.forecast_label.set_text('')
+            return
+        result = forecast.forecast_units(selected, unit)
+        self.forecast_label.set_text(_("Kill: %d%%  Death: %d%%\nDamage: %.1f  Taken: %.1f") % (
+            round(result.kill_chance * 100), round(result.death_chance * 100), result.damage_dealt,
+            result.damage_taken))
 
@@ -21,12 +21,18 @@
 #  MA 02110-1301, USA.
 
 
+import sys
+
+if '--profile-startup' in sys.argv:
+    # enabled before anything else is imported so that every import is timed
+    import startup
+    startup.enable()
+
 import pygame
 import argparse
 import traceback
 import logging
 import os
-import sys
 import gettext
 
 import utils
@@ -57,23 +63,19 @@ parser.add_argument('-l', '--logging', action='store', help=_('Choose logging le
                     required=False)
 parser.add_argument('-d', '--debug', action='store_const', help=_('Debug mode'), const=0, dest='logging')
 parser.add_argument('-f', '--file', action='store', help=_('Log file'), default=None, required=False)
-args = parser.parse_args()
-
-# log to screen
-logging.basicConfig(level=args.logging, filename=args.file, filemode='a')
-logging.info(_('Welcome to %s!') % ('Ice Emblem ' + VERSION))
-logging.info(_('You are using Pygame version %s.') % pygame.version.ver)
-if pygame.version.vernum < (2, 0, 0):
-    logging.warning(_('You are running a version of Pygame that might be outdated.'))
-    logging.warning(_('Ice Emblem is tested only with Pygame 2.0.0+.'))
+parser.add_argument('--profile-startup', action='store_true', help=_('Print import and initialization times'),
+                    required=False)
 
 
 def launch():
     import display
+    import startup
 
     display.initialize()
 
-    import game
+    with startup.section("import game"):
+        import game
+    startup.report()
 
     map_file = None
     if args.map is not None:
@@ -88,49 +90,61 @@ def launch():
     game.play(map_file)
 
 
-if args.logging < 20:
-    # When in debug mode launch without kind error message
-    launch()
-else:
-    try:
+# workers of the AI planning pool import this module too, they must not start a game
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    # log to screen
+    logging.basicConfig(level=args.logging, filename=args.file, filemode='a')
+    logging.info(_('Welcome to %s!') % ('Ice Emblem ' + VERSION))
+    logging.info(_('You are using Pygame version %s.') % pygame.version.ver)
+    if pygame.version.vernum < (2, 0, 0):
+        logging.warning(_('You are running a version of Pygame that might be outdated.'))
+        logging.warning(_('Ice Emblem is tested only with Pygame 2.0.0+.'))
+
+    if args.logging < 20:
+        # When in debug mode launch without kind error message
         launch()
-    except (KeyboardInterrupt, SystemExit):
-        # game was interrupted by the user
-        print(_("Interrupted by user, exiting."))
-
-        # we're not playing anymore, go away
-        utils.return_to_os()
-
-    except:
-        # other error
-        kind_error_message = _("Oops, something went wrong. Dumping brain contents:\n"
-                               "\n"
-                               "%s\n"
-                               "%s\n"
-                               "%s\n"
-                               "\n"
-                               "Please open a report on our issue tracker located at %s\n"
-                               "along with a short description of what you did when this crash happened\n"
-                               "so that the error can be fixed.\n"
-                               "\n"
-                               "Thank you!\n"
-                               "-- the Ice Emblem team\n"
-                               ) % ('-' * 80 + '\n', traceback.format_exc(), '-' * 80,
-                                    "https://gitlab.com/Elinvention/ice-emblem/issues")
-
-        print(kind_error_message)
-
-        fname = args.file if args.file else "traceback.log"
-        with open(fname, 'a') as f:
-            traceback.print_exc(file=f)
-            f.write('\n' + '-' * 80 + '\n\n')
-
-        # we're not playing anymore, go away
-        utils.return_to_os()
-
-# we got here, so everything was normal
-print()
-print("-" * 80)
-print(_("Game terminated normally."))
-
-utils.return_to_os()
+    else:
+        try:
+            launch()
+        except (KeyboardInterrupt, SystemExit):
+            # game was interrupted by the user
+            print(_("Interrupted by user, exiting."))
+
+            # we're not playing anymore, go away
+            utils.return_to_os()
+
+        except:
+            # other error
+            kind_error_message = _("Oops, something went wrong. Dumping brain contents:\n"
+                                   "\n"
+                                   "%s\n"
+                                   "%s\n"
+                                   "%s\n"
+                                   "\n"
+                                   "Please open a report on our issue tracker located at %s\n"
+                                   "along with a short description of what you did when this crash happened\n"
+                                   "so that the error can be fixed.\n"
+                                   "\n"
+                                   "Thank you!\n"
+                                   "-- the Ice Emblem team\n"
+                                   ) % ('-' * 80 + '\n', traceback.format_exc(), '-' * 80,
+                                        "https://gitlab.com/Elinvention/ice-emblem/issues")
+
+            print(kind_error_message)
+
+            fname = args.file if args.file else "traceback.log"
+            with open(fname, 'a') as f:
+                traceback.print_exc(file=f)
+                f.write('\n' + '-' * 80 + '\n\n')
+
+            # we're not playing anymore, go away
+            utils.return_to_os()
+
+    # we got here, so everything was normal
+    print()
+    print("-" * 80)
+    print(_("Game terminated normally."))
+
+    utils.return_to_os()
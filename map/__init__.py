@@ -1 +1 @@
-from .map import TileMap as Map
+from .map import TileMap as Map, PreparedMap, prepare
@@ -7,40 +7,71 @@ import pygame
 
 from basictypes import Point
 
-from typing import Tuple, List
+from typing import Callable, List, Set, Tuple
 
 
-class Arrow(pygame.sprite.Sprite):
+class ArrowPart(pygame.sprite.Sprite):
+    """
+    The part of an Arrow drawn over one cell.
+    """
+    def __init__(self, image: pygame.Surface, rect: pygame.Rect, *groups):
+        super().__init__(*groups)
+        self.image = image
+        self.rect = rect
+
+
+class Arrow(object):
     """
     Class used to display an arrow over the path the unit will animate over while it's moving.
+
+    Every cell of the path is an ArrowPart of its own, so when the path changes only the parts from the first changed
+    cell on are replaced, which is usually just the tail. The cells whose part changed are collected in changed.
     """
-    def __init__(self, tilemap, image, *groups):
+    def __init__(self, tilemap, image, *groups, cost: Callable[[Tuple[int, int]], float] = None):
         """
         To make an Arrow you need to pass a :class:`map.TileMap` and a texture.
         :param tilemap: :class:`map.TileMap`
         :param image: pygame.Surface
-        :param groups: pygame.sprite.Group
+        :param groups: pygame.sprite.Group the parts of the arrow are added to
+        :param cost: returns the cost of moving on a cell, to keep the cost of the path
         """
-        super().__init__(*groups)
         self.tilemap = tilemap
+        self.groups = groups
         self.zoom = -1
         self.source_image = image
+        self.cost_of = cost or (lambda coord: 1)
 
         self.arrow = {}
 
         self.path = []
         self.source = None
-        self.valid = False
+
+        self.parts: List[ArrowPart] = []  # one for each cell of the path, as drawn
+        self.drawn: List[Tuple[int, int]] = []  # the cells of the parts
+        self.drawn_source = None
+        self.costs: List[float] = []  # running cost of the path up to each cell
+        self.changed: Set[Tuple[int, int]] = set()  # cells whose part changed since take_changed
 
         self.update()
 
+    @property
+    def cost(self) -> float:
+        """
+        Cost of the whole path.
+        """
+        return self.costs[-1] if self.costs else 0
+
+    def take_changed(self) -> Set[Tuple[int, int]]:
+        """
+        Returns the cells that have to be drawn again since the previous call.
+        """
+        changed, self.changed = self.changed, set()
+        return changed
+
     def zoom_changed(self) -> None:
         """
         Call this when the zoom was changed by the user.
         """
-        self.rect = pygame.Rect((0, 0), self.tilemap.zoom_px_size)
-        self.image = pygame.Surface(self.rect.size, flags=pygame.SRCALPHA)
-
         w, h = self.source_image.get_size()
         rw, rh = rectsize = (w // 4, h // 4)
 
@@ -67,27 +98,50 @@ class Arrow(pygame.sprite.Sprite):
             }
 
         self.zoom = self.tilemap.zoom
-        self.valid = False
+        self.remove_parts(0)
+
+    def remove_parts(self, start: int) -> None:
+        """
+        Removes the parts of the cells from index start on.
+        """
+        for part in self.parts[start:]:
+            part.kill()
+        self.changed.update(self.drawn[start:])
+        del self.parts[start:]
+        del self.drawn[start:]
+        del self.costs[start:]
 
     def update(self) -> None:
         """
-        Update self.image.
+        Replaces the parts that don't match the path any more.
         """
         if self.zoom != self.tilemap.zoom:
             self.zoom_changed()
-        if not self.valid:
-            self.image.fill((0, 0, 0, 0))
-            for coord in self.path:
-                img = self.get_arrow_part(coord)
-                pos = self.tilemap.pixel_at(*coord, False)
-                self.image.blit(img, pos)
-            self.valid = True
+        common = 0
+        if self.source == self.drawn_source:
+            n = min(len(self.drawn), len(self.path))
+            while common < n and self.drawn[common] == self.path[common]:
+                common += 1
+            if common == len(self.drawn) == len(self.path):
+                return
+        self.drawn_source = self.source
+        start = max(common - 1, 0)  # the last common cell may turn from the head to a body part
+        self.remove_parts(start)
+        cost = self.costs[-1] if self.costs else 0
+        for index in range(start, len(self.path)):
+            coord = self.path[index]
+            rect = pygame.Rect(self.tilemap.pixel_at(*coord, False), self.tilemap.zoom_tile_size)
+            self.parts.append(ArrowPart(self.part_at(index), rect, *self.groups))
+            self.drawn.append(coord)
+            cost += self.cost_of(coord)
+            self.costs.append(cost)
+            self.changed.add(coord)
 
     def set_path(self, path: List[Tuple[int, int]], source: Tuple[int, int] = None) -> None:
         """
         Sets a new path and optionally a new source.
 
-        If the path or the source are actually new, invalidate.
+        Only the parts of the cells that actually changed are replaced.
         :param path: path the arrow has to follow.
         :param source: the source node where the arrow begins.
         """
@@ -95,10 +149,7 @@ class Arrow(pygame.sprite.Sprite):
             path.remove(source)
         if source is not None:
             self.source = source
-            self.valid = False
-        if self.path != path:
-            self.path = path
-            self.valid = False
+        self.path = path
         self.update()
 
     def add_or_remove_coord(self, coord: Tuple[int, int]) -> None:
@@ -120,16 +171,12 @@ class Arrow(pygame.sprite.Sprite):
             # The new one is a cell we already passed on.
             while self.path[-1] != coord:
                 self.path.pop()
-        self.valid = False
         self.update()
 
-    def get_arrow_part(self, coord: Tuple[int, int]) -> pygame.Surface:
+    def part_at(self, index: int) -> pygame.Surface:
         """
-        Returns the image, part of the arrow, to blit on the cell at coord.
-        :param coord: map coordinates.
-        :return: a pygame.Surface containing the part of the arrow to render at coord.
+        Returns the image, part of the arrow, to blit on the cell at index in the path.
         """
-        index = self.path.index(coord)
         a = self.path[index - 1] if index - 1 >= 0 else self.source
         b = self.path[index]
         c = self.path[index + 1] if (index + 1) < len(self.path) else None
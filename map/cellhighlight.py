@@ -1,5 +1,5 @@
 """
-
+Overlay that highlights map cells (selection, move and attack areas, etc).
 """
 
 
@@ -10,51 +10,108 @@ import tmx
 import colors as c
 
 
-class CellHighlight(pygame.sprite.Sprite):
-    def __init__(self, image, rect):
-        super().__init__()
-        self.image = image
-        self.rect = rect
+CHUNK_SIZE = 16  #: side, in cells, of the square chunks the overlay is split into
+TRANSPARENT = (0, 0, 0, 0)
+
+
+def compose(colors):
+    """
+    Composes RGBA colors one over the other, like blitting them in order.
+    :param colors: list of pygame.Color, the last one is on top.
+    :return: the resulting RGBA tuple.
+    """
+    r = g = b = a = 0.0
+    for color in colors:
+        src_a = color.a / 255
+        out_a = src_a + a * (1 - src_a)
+        if out_a > 0:
+            r = (color.r * src_a + r * a * (1 - src_a)) / out_a
+            g = (color.g * src_a + g * a * (1 - src_a)) / out_a
+            b = (color.b * src_a + b * a * (1 - src_a)) / out_a
+        a = out_a
+    return int(r), int(g), int(b), int(a * 255)
 
 
 class CellHighlightLayer(tmx.SpriteLayer):
+    """
+    Draws every highlighted cell from a few map-space overlay surfaces split in chunks.
+
+    The overlay is kept between updates: only cells whose highlight changed are repainted, unless the zoom changed.
+    """
     def __init__(self, tilemap: tmx.TileMap):
         super().__init__()
         self.tilemap = tilemap
+        self.painted_zoom = None  # zoom the chunks have been painted at
+        self.mask = {}  # coord -> tuple of highlight names, in drawing order
+        self.chunks = {}  # chunk index -> pygame.Surface
+        self.colors = {}  # tuple of highlight names -> composed RGBA color
         self.update()
 
     def cell_rect_at(self, coord):
         return pygame.Rect(self.tilemap.pixel_at(*coord, False), self.tilemap.zoom_tile_size)
 
-    def update(self, selected=None, move=None, attack=None, entangle=None, played=None):
-        if move is None:
-            move = []
-        if attack is None:
-            attack = []
-        if played is None:
-            played = []
-        if entangle is None:
-            entangle = []
-
-        self.empty()
-
-        highlight_surfaces = {}
-        for highlight, color in c.highlight.items():
-            highlight_surfaces[highlight] = pygame.Surface(self.tilemap.zoom_tile_size)
-            highlight_surfaces[highlight].fill(color[:3])
-            highlight_surfaces[highlight].set_alpha(color[3])
-
+    def chunk_at(self, coord):
+        """
+        Returns the chunk containing coord and the cell rect relative to it. The chunk is allocated if needed.
+        """
+        x, y = coord
+        index = x // CHUNK_SIZE, y // CHUNK_SIZE
+        tw, th = self.tilemap.zoom_tile_size
+        chunk = self.chunks.get(index)
+        if chunk is None:
+            chunk = pygame.Surface((tw * CHUNK_SIZE, th * CHUNK_SIZE), flags=pygame.SRCALPHA)
+            chunk.fill(TRANSPARENT)
+            self.chunks[index] = chunk
+        rect = pygame.Rect((x % CHUNK_SIZE) * tw, (y % CHUNK_SIZE) * th, tw, th)
+        return chunk, rect
+
+    def color_of(self, highlights):
+        try:
+            return self.colors[highlights]
+        except KeyError:
+            color = self.colors[highlights] = compose([c.highlight[h] for h in highlights])
+            return color
+
+    @staticmethod
+    def make_mask(selected, move, attack, entangle, played):
+        mask = {}
+        for highlight, coords in (('move', move), ('attack', attack), ('entangle', entangle), ('played', played)):
+            for coord in coords:
+                mask[tuple(coord)] = mask.get(tuple(coord), ()) + (highlight,)
         if selected is not None:
-            self.add(CellHighlight(highlight_surfaces['selected'], self.cell_rect_at(selected)))
-
-        for coord in move:
-            self.add(CellHighlight(highlight_surfaces['move'], self.cell_rect_at(coord)))
+            # selection is drawn below everything else
+            mask[tuple(selected)] = ('selected',) + mask.get(tuple(selected), ())
+        return mask
 
-        for coord in attack:
-            self.add(CellHighlight(highlight_surfaces['attack'], self.cell_rect_at(coord)))
+    def paint(self, coord, highlights):
+        chunk, rect = self.chunk_at(coord)
+        chunk.fill(self.color_of(highlights) if highlights else TRANSPARENT, rect)
 
-        for coord in entangle:
-            self.add(CellHighlight(highlight_surfaces['entangle'], self.cell_rect_at(coord)))
-
-        for coord in played:
-            self.add(CellHighlight(highlight_surfaces['played'], self.cell_rect_at(coord)))
+    def update(self, selected=None, move=None, attack=None, entangle=None, played=None):
+        mask = self.make_mask(selected, move or [], attack or [], entangle or [], played or [])
+
+        if self.painted_zoom != self.tilemap.zoom:
+            # tile size changed: throw away every chunk and repaint from scratch
+            self.painted_zoom = self.tilemap.zoom
+            self.chunks = {}
+            changed = mask.keys()
+        else:
+            changed = [coord for coord in self.mask.keys() | mask.keys() if self.mask.get(coord) != mask.get(coord)]
+            if len(changed) > len(mask):
+                # most of the overlay changed: clearing every chunk is cheaper than clearing cell by cell
+                for chunk in self.chunks.values():
+                    chunk.fill(TRANSPARENT)
+                changed = mask.keys()
+
+        for coord in changed:
+            self.paint(coord, mask.get(coord))
+        self.mask = mask
+
+    def draw(self, screen):
+        ox, oy = self.position
+        view = pygame.Rect(ox, oy, self.view_w, self.view_h)
+        tw, th = self.tilemap.zoom_tile_size
+        for (i, j), chunk in self.chunks.items():
+            pos = i * CHUNK_SIZE * tw, j * CHUNK_SIZE * th
+            if view.colliderect(pygame.Rect(pos, chunk.get_size())):
+                screen.blit(chunk, (pos[0] - ox, pos[1] - oy))
@@ -0,0 +1,258 @@
+"""
+Hierarchical pathfinding (HPA*) for large maps.
+
+The map is split in square clusters. Where two neighbouring clusters can be crossed, each run of passable tiles along
+their border gets one entrance: a pair of tiles, one on each side, that become nodes of an abstract graph. Nodes of the
+same cluster are linked by the cost of the shortest path between them inside the cluster. A long query is answered by
+A* on the abstract graph, after linking the source and the target to the nodes of their clusters, then every abstract
+edge is refined into the tiles it stands for and the path is straightened by a search restricted to the clusters it
+crosses. On random grids the paths found are at most about 10% longer than the shortest ones, see the tests.
+
+A Hierarchy is built for a movement class, that is the terrains a unit can walk on and the team deciding which units
+block the way. When a tile changes, only its cluster and the neighbouring ones are built again, the next time a query
+needs them.
+"""
+
+import heapq
+
+from typing import Dict, List, Optional, Set, Tuple
+
+import utils
+
+Coord = Tuple[int, int]
+
+CLUSTER_SIZE = 16  #: side of a cluster, in tiles
+
+
+class Hierarchy(object):
+    def __init__(self, _map, for_unit, cluster_size: int = CLUSTER_SIZE):
+        """
+        :param _map: the map.Map
+        :param for_unit: a unit of the movement class, its obstacles are the ones of the graph
+        :param cluster_size: side of a cluster, in tiles
+        """
+        self.map = _map
+        self.unit = for_unit
+        self.size = cluster_size
+        self.cw = (_map.w + cluster_size - 1) // cluster_size  # clusters per row
+        self.ch = (_map.h + cluster_size - 1) // cluster_size
+        self.min_moves = min(t.moves for t in _map.terrains.values())  # keeps the A* heuristic admissible
+        self.entrances: Dict[Tuple[Coord, Coord], List[Tuple[Coord, Coord]]] = {}  # border -> tile pairs
+        self.nodes: Dict[Coord, Set[Coord]] = {}  # cluster -> its nodes
+        self.edges: Dict[Coord, Dict[Coord, Tuple[float, Optional[List[Coord]]]]] = {}  # node -> node -> cost, path
+        self.dirty: Set[Coord] = {(cx, cy) for cy in range(self.ch) for cx in range(self.cw)}
+
+    def cluster(self, coord: Coord) -> Coord:
+        return coord[0] // self.size, coord[1] // self.size
+
+    def bounds(self, cluster: Coord) -> Tuple[int, int, int, int]:
+        cx, cy = cluster
+        return (cx * self.size, cy * self.size,
+                min((cx + 1) * self.size, self.map.w), min((cy + 1) * self.size, self.map.h))
+
+    def passable(self, coord: Coord) -> bool:
+        return not self.map.is_obstacle(coord, self.unit)
+
+    def invalidate(self, coord: Coord) -> None:
+        """
+        To be called when the tile at coord changes, e.g. a unit moves there.
+        """
+        self.dirty.add(self.cluster(coord))
+
+    def border_entrances(self, a: Coord, b: Coord) -> List[Tuple[Coord, Coord]]:
+        """
+        Finds the entrances between cluster a and cluster b, its right or bottom neighbour.
+        """
+        x0, y0, x1, y1 = self.bounds(a)
+        if b[0] > a[0]:
+            pairs = [((x1 - 1, y), (x1, y)) for y in range(y0, y1)]
+        else:
+            pairs = [((x, y1 - 1), (x, y1)) for x in range(x0, x1)]
+        entrances = []
+        run = []
+        for pair in pairs + [None]:
+            if pair is not None and self.passable(pair[0]) and self.passable(pair[1]):
+                run.append(pair)
+            elif run:
+                entrances.append(run[len(run) // 2])
+                run = []
+        return entrances
+
+    def local_search(self, source: Coord, cluster: Coord, reverse: bool = False):
+        """
+        Dijkstra's algorithm restricted to a cluster.
+        :param reverse: compute the cost of reaching source from every tile instead
+        :return: distances and previous tiles
+        """
+        x0, y0, x1, y1 = self.bounds(cluster)
+        dist = {source: 0}
+        prev = {}
+        queue = [(0, source)]
+        while queue:
+            d, u = heapq.heappop(queue)
+            if d > dist[u]:
+                continue
+            for v in self.map.neighbors(u):
+                if not (x0 <= v[0] < x1 and y0 <= v[1] < y1) or not self.passable(v):
+                    continue
+                alt = d + self.map[u if reverse else v].moves
+                if alt < dist.get(v, float('inf')):
+                    dist[v] = alt
+                    prev[v] = u
+                    heapq.heappush(queue, (alt, v))
+        return dist, prev
+
+    @staticmethod
+    def walk(prev: Dict[Coord, Coord], source: Coord, target: Coord) -> List[Coord]:
+        """
+        The path from source to target, source excluded, out of the previous tiles of a search from source.
+        """
+        path = []
+        while target != source:
+            path.append(target)
+            target = prev[target]
+        path.reverse()
+        return path
+
+    def rebuild(self) -> None:
+        """
+        Builds again the entrances and the edges of the dirty clusters.
+        """
+        if not self.dirty:
+            return
+        touched = set()
+        for cx, cy in self.dirty:
+            for a, b in (((cx - 1, cy), (cx, cy)), ((cx, cy), (cx + 1, cy)),
+                         ((cx, cy - 1), (cx, cy)), ((cx, cy), (cx, cy + 1))):
+                if 0 <= b[0] < self.cw and 0 <= b[1] < self.ch and a[0] >= 0 and a[1] >= 0:
+                    self.entrances[a, b] = self.border_entrances(a, b)
+                    touched.update((a, b))
+        self.dirty.clear()
+
+        for cluster in touched:
+            for node in self.nodes.get(cluster, ()):
+                self.edges.pop(node, None)
+            self.nodes[cluster] = set()
+        for (a, b), entrances in self.entrances.items():
+            if a in touched or b in touched:
+                for node in (node for pair in entrances for node in pair):
+                    if self.cluster(node) in touched:
+                        self.nodes[self.cluster(node)].add(node)
+        for cluster in touched:
+            for node in self.nodes[cluster]:
+                dist, prev = self.local_search(node, cluster)
+                self.edges[node] = {other: (dist[other], None) for other in self.nodes[cluster]
+                                    if other != node and other in dist}
+        for (a, b), entrances in self.entrances.items():
+            for u, v in entrances:
+                if u in self.edges and v in self.edges:
+                    self.edges[u][v] = (self.map[v].moves, [v])
+                    self.edges[v][u] = (self.map[u].moves, [u])
+
+    def refine(self, u: Coord, v: Coord) -> List[Coord]:
+        cost, path = self.edges[u][v]
+        if path is None:
+            cluster = self.cluster(u)
+            dist, prev = self.local_search(u, cluster)
+            path = self.walk(prev, u, v)
+            self.edges[u][v] = (cost, path)
+        return path
+
+    def shortest_path(self, source: Coord, target: Coord) -> List[Coord]:
+        """
+        An almost shortest path from source to target: source excluded, target included. Like
+        Pathfinder.distances_to the target can be an obstacle, it's reached stepping on it.
+        Returns an empty list if there is no path.
+        """
+        self.rebuild()
+        s_cluster, t_cluster = self.cluster(source), self.cluster(target)
+        s_dist, s_prev = self.local_search(source, s_cluster)
+        # reach the target from its neighbours: it may be an obstacle
+        t_dist, t_prev = {}, {}
+        for n in self.map.neighbors(target):
+            if self.cluster(n) == t_cluster and (self.passable(n) or n == source):
+                dist, prev = self.local_search(n, t_cluster, reverse=True)
+                for tile, d in dist.items():
+                    d += self.map[target].moves
+                    if d < t_dist.get(tile, float('inf')):
+                        t_dist[tile], t_prev[tile] = d, (n, prev)
+
+        best = (float('inf'), None)
+        if s_cluster == t_cluster and source in t_dist:
+            best = (t_dist[source], None)
+
+        # A* on the abstract graph, from the source to the nodes that reach the target
+        goals = {node: t_dist[node] for node in self.nodes.get(t_cluster, ()) if node in t_dist}
+        g = {node: s_dist[node] for node in self.nodes.get(s_cluster, ()) if node in s_dist}
+        came = {}
+        queue = [(d + self.heuristic(node, target), node) for node, d in g.items()]
+        heapq.heapify(queue)
+        while queue:
+            f, u = heapq.heappop(queue)
+            if f >= best[0]:
+                break
+            if f > g[u] + self.heuristic(u, target):
+                continue
+            if u in goals and g[u] + goals[u] < best[0]:
+                best = (g[u] + goals[u], u)
+            for v, (cost, _) in self.edges.get(u, {}).items():
+                alt = g[u] + cost
+                if alt < g.get(v, float('inf')):
+                    g[v] = alt
+                    came[v] = u
+                    heapq.heappush(queue, (alt + self.heuristic(v, target), v))
+
+        cost, exit_node = best
+        if cost == float('inf'):
+            return []
+        if exit_node is None:
+            return self.walk(s_prev, source, source) + self.finish(source, t_prev, target)
+        nodes = [exit_node]
+        while nodes[-1] in came:
+            nodes.append(came[nodes[-1]])
+        nodes.reverse()
+        path = self.walk(s_prev, source, nodes[0])
+        for u, v in zip(nodes, nodes[1:]):
+            path += self.refine(u, v)
+        path += self.finish(nodes[-1], t_prev, target)
+        return self.straighten(source, target, {self.cluster(coord) for coord in path} | {s_cluster})
+
+    def straighten(self, source: Coord, target: Coord, clusters: Set[Coord]) -> List[Coord]:
+        """
+        A* from source to target through the tiles of clusters. The refined path of the abstract graph crosses the
+        borders only at the entrances and follows the shortest paths inside each cluster: searching again the
+        clusters it crosses removes most of the detours that causes.
+        """
+        dist = {source: 0}
+        prev = {}
+        queue = [(self.heuristic(source, target), source)]
+        while queue:
+            f, u = heapq.heappop(queue)
+            if u == target:
+                return self.walk(prev, source, target)
+            if f > dist[u] + self.heuristic(u, target):
+                continue
+            for v in self.map.neighbors(u):
+                if self.cluster(v) not in clusters or not (v == target or self.passable(v)):
+                    continue
+                alt = dist[u] + self.map[v].moves
+                if alt < dist.get(v, float('inf')):
+                    dist[v] = alt
+                    prev[v] = u
+                    heapq.heappush(queue, (alt + self.heuristic(v, target), v))
+        return []
+
+    @staticmethod
+    def finish(tile: Coord, t_prev: Dict, target: Coord) -> List[Coord]:
+        """
+        The path from tile to target, tile excluded, out of the reverse searches from the neighbours of target.
+        """
+        n, prev = t_prev[tile]
+        path = []
+        while tile != n:
+            tile = prev[tile]
+            path.append(tile)
+        return path + [target]
+
+    def heuristic(self, coord: Coord, target: Coord) -> float:
+        return utils.distance(coord, target) * self.min_moves
@@ -4,12 +4,13 @@
 
 import pygame
 import logging
-from typing import List, Tuple, Optional, Union
+from typing import Callable, Dict, List, Tuple, Optional, Union
 
 import state as s
 
 import action
 import ai
+import database
 import display
 import game
 import item
@@ -23,40 +24,88 @@ from basictypes import Point
 from map.arrow import Arrow
 from map.cellhighlight import CellHighlightLayer
 from map.cursor import Cursor
-from map.pathfinder import Pathfinder, Terrain, manhattan_path
+from map.pathfinder import Pathfinder, Terrain, can_walk, manhattan_path
 from map.unit import UnitSprite
 from room import Layout, LayoutParams, Background, BackgroundSize
 
-#NEW
-import quantum
-
 Coord = Tuple[int, int]
 
 
+class PreparedMap(object):
+    """
+    What prepare reads from disk to build a TileMap.
+    """
+    def __init__(self, map_path, tilemap: tmx.TileMap, yaml_units, yaml_weapons):
+        self.map_path = map_path
+        self.tilemap = tilemap  #: loaded with convert=False
+        self.yaml_units = yaml_units
+        self.yaml_weapons = yaml_weapons
+
+
+def prepare(map_path, viewport, progress: Optional[Callable[[float, str], None]] = None) -> PreparedMap:
+    """
+    Parses a map, builds the units and weapons it refers to and decodes the sprites of its units.
+
+    No surface is converted, so it can run on a worker thread: TileMap does the rest on the main thread.
+    :param map_path: path of the TMX file
+    :param viewport: size of the TileMap room
+    :param progress: called with the completed fraction, between 0 and 1, and a description of the next step
+    :return: the PreparedMap to pass to TileMap
+    """
+    def report(fraction, step):
+        if progress is not None:
+            progress(fraction, step)
+
+    report(0, _("Reading map"))
+    tilemap = tmx.load(map_path, viewport, convert=False)
+    report(0.3, _("Reading units"))
+    yaml_units = database.Catalog(resources.DATA_PATH / 'units.yml', unit)
+    yaml_weapons = database.Catalog(resources.DATA_PATH / 'weapons.yml', item)
+
+    names = [obj.name for layer in tilemap.layers if isinstance(layer, tmx.ObjectLayer)
+             for obj in layer.objects if obj.type == 'unit']
+    for i, name in enumerate(names):
+        report(0.5 + 0.5 * i / len(names), _("Loading %s") % name)
+        yaml_units[name]  # build the unit here rather than on the main thread
+        path = resources.sprite_path(name)
+        if not resources.in_atlas(path):
+            try:
+                resources.manager.image(path)
+            except (OSError, pygame.error):
+                pass  # Unit falls back to a default image
+    report(1, _("Drawing map"))
+    return PreparedMap(map_path, tilemap, yaml_units, yaml_weapons)
+
+
 class TileMap(room.Room):
     """
     TileMap rendering.
     """
 
-    def __init__(self, map_path, **kwargs):
+    def __init__(self, map_path, prepared: Optional[PreparedMap] = None, **kwargs):
         """
-        
+        :param map_path: path of the TMX file
+        :param prepared: the result of prepare for this map, if it was run already
         """
         super().__init__(wait=False,
                          background=Background(image=resources.load_image("old-paper.jpg"), size=BackgroundSize.COVER),
                          layout=Layout(width=LayoutParams.FILL_PARENT, height=LayoutParams.FILL_PARENT), **kwargs)
 
-        self.tilemap = tmx.load(map_path, self.rect.size, self.rect.topleft)
+        if prepared is None:
+            prepared = prepare(map_path, self.rect.size)
+        self.tilemap = prepared.tilemap
+        self.tilemap.convert()
 
         self.zoom = self.tilemap.zoom = 2
         self.tw, self.th = (self.tilemap.tile_width, self.tilemap.tile_height)
         self.w, self.h = self.tilemap.width, self.tilemap.height
 
         self.terrains = {}
+        self.costs = {}  # movement class -> movement_costs
         self.sprites_layer = tmx.SpriteLayer()
 
-        yaml_units = utils.parse_yaml(resources.DATA_PATH / 'units.yml', unit)
-        yaml_weapons = utils.parse_yaml(resources.DATA_PATH / 'weapons.yml', item)
+        yaml_units = prepared.yaml_units
+        yaml_weapons = prepared.yaml_weapons
 
         teams = {}
 
@@ -84,10 +133,12 @@ class TileMap(room.Room):
                     v = layer.properties.get(key, None)
                     return str(resources.MUSIC_PATH / v) if v else None
                 music = {'map': get('map_music'), 'battle': get('battle_music')}
-                if layer.properties.get('AI', None) is None:
+                strategy = layer.properties.get('AI', None)
+                if strategy is None:
                     teams[color] = unit.Team(layer.name, color, relation, list(units.values()), boss, music)
                 else:
-                    teams[color] = ai.AI(layer.name, color, relation, list(units.values()), boss, music)
+                    teams[color] = ai.AI(layer.name, color, relation, list(units.values()), boss, music,
+                                         strategy or None)
 
         for layer in self.tilemap.layers:
             if isinstance(layer, tmx.ObjectLayer):
@@ -111,7 +162,8 @@ class TileMap(room.Room):
         self.cursor = Cursor(self.tilemap, resources.load_image('cursor.png'), cursor_layer)
 
         arrow_layer = tmx.SpriteLayer()
-        self.arrow = Arrow(self.tilemap, resources.load_image('arrow.png'), arrow_layer)
+        self.arrow = Arrow(self.tilemap, resources.load_image('arrow.png'), arrow_layer,
+                           cost=lambda coord: self.terrains[coord].moves)
 
         self.highlight_layer = CellHighlightLayer(self.tilemap)
 
@@ -166,14 +218,21 @@ class TileMap(room.Room):
         except AttributeError:
             if for_unit is None:
                 return False
-            for allowed in terrain.allowed:
-                if allowed == 'any':
-                    return False
-                if allowed == 'none':
-                    return True
-                if allowed in for_unit.ALLOWED_TERRAINS:
-                    return False
-            return True
+            return self.movement_costs(for_unit)[coord] == float('inf')
+
+    def movement_costs(self, for_unit) -> Dict[Coord, float]:
+        """
+        Returns the cost of entering each tile for the movement class of for_unit, inf where it can't go. The grid is
+        derived from Terrain.allowed and Terrain.moves the first time a unit of the class asks for it.
+        """
+        try:
+            return self.costs[for_unit.MOVEMENT_CLASS]
+        except KeyError:
+            pass
+        costs = self.costs[for_unit.MOVEMENT_CLASS] = {
+            coord: terrain.moves if can_walk(terrain.allowed, for_unit.ALLOWED_TERRAINS) else float('inf')
+            for coord, terrain in self.terrains.items()}
+        return costs
 
     def check_coord(self, coord):
         x, y = coord
@@ -243,6 +302,7 @@ class TileMap(room.Room):
                 raise ValueError("Destination %s is already occupied by another unit" % str(where))
             self.terrains[who.coord].unit = None
             self.terrains[where].unit = who
+            self.path.invalidate((who.coord, where))
             print(_('Unit %s moved from %s to %s') % (who.name, who.coord, where))
             who.move(where)
 
@@ -255,12 +315,14 @@ class TileMap(room.Room):
                 self.return_path = None
             self.terrains[self.prev_sel].unit = _unit
             self.terrains[self.curr_sel].unit = None
+            self.path.invalidate((self.prev_sel, self.curr_sel))
             _unit.move(self.prev_sel)
         self.reset_selection()
 
     def kill_unit(self, _unit):
         self.units_manager.kill_unit(_unit)
         self.terrains[_unit.coord].unit = None
+        self.path.invalidate((_unit.coord,))
         sprite = self.find_sprite(unit=_unit)
         self.sprites_layer.remove(sprite)
 
@@ -281,13 +343,17 @@ class TileMap(room.Room):
         return cost
 
     def update_arrow(self, target=None):
+        self._update_arrow(target)
+        self.invalidate_cells(self.arrow.take_changed())
+
+    def _update_arrow(self, target):
         if self.curr_unit and not self.curr_unit.played \
                 and self.units_manager.active_team.is_mine(self.curr_unit) and target:
             target_unit = self.get_unit(target)
             if target in self.move_area:
                 self.arrow.source = self.curr_sel
                 self.arrow.add_or_remove_coord(target)
-                if self.path_cost(self.arrow.path) > self.curr_unit.movement or target not in self.arrow.path:
+                if self.arrow.cost > self.curr_unit.movement or target not in self.arrow.path:
                     path = self.path.shortest_path(self.curr_sel, target, self.curr_unit.movement)
                     self.arrow.set_path(path, self.curr_sel)
             elif target in self.attack_area and target_unit:
@@ -302,6 +368,25 @@ class TileMap(room.Room):
         else:
             self.arrow.set_path([])
 
+    def invalidate_cells(self, coords) -> None:
+        """
+        Invalidates only the cells at coords, so that just those are drawn again.
+        :param coords: iterable of map coordinates.
+        """
+        vx, vy = self.tilemap.viewport.topleft
+        for coord in coords:
+            self.invalidate_area(pygame.Rect(self.tilemap.pixel_at(*coord, False) - (vx, vy),
+                                             self.tilemap.zoom_tile_size))
+
+    def point_cursor(self, coord: Coord) -> None:
+        """
+        Points the cursor at coord and invalidates the cells it left and reached.
+        :param coord: map coordinates.
+        """
+        prev = self.cursor.coord
+        self.cursor.point(*coord)
+        self.invalidate_cells([prev, self.cursor.coord])
+
     def update_highlight(self):
         played = [u.coord for u in self.units_manager.active_team.list_played()]
         self.highlight_layer.update(self.curr_sel, self.move_area, self.attack_area, self.entangle_area, played)
@@ -366,8 +451,7 @@ class TileMap(room.Room):
         if self.rect.collidepoint(event.pos):
             coord = self.tilemap.index_at(x, y)
             if coord and coord != self.cursor.coord:
-                self.cursor.point(*coord)
-                self.invalidate()
+                self.point_cursor(coord)
                 if self.children_done():
                     self.update_arrow(coord)
 
@@ -392,13 +476,18 @@ class TileMap(room.Room):
     def handle_keydown(self, event):
         if isinstance(self.parent, game.AITurn):
             return
+        prev_cursor = self.cursor.coord
+        prev_view = self.tilemap.viewport.topleft
         self.cursor.update(event)
         self.update_arrow(self.cursor.coord)
         self.tilemap.set_focus(*self.cursor.rect.topleft)
 
         if event.key == pygame.K_SPACE:
             self.select(self.cursor.coord)
-        self.invalidate()
+        if self.tilemap.viewport.topleft == prev_view:
+            self.invalidate_cells([prev_cursor, self.cursor.coord])
+        else:
+            self.invalidate()
 
     def layout_children(self, rect):
         if self.tilemap.viewport.size != rect.size:
@@ -424,11 +513,27 @@ class TileMap(room.Room):
             self.update_highlight()
             self.fill()
 
+    @property
+    def tracks_damage(self) -> bool:
+        return True
+
     def draw(self):
-        self.tilemap.draw(self.surface)
+        for child in self.children:
+            # the map under children that are going to change must be drawn again
+            if child.visible and (not child.valid or child.blit_rect != child.rect):
+                self.damaged.append(child.rect.copy())
+                if child.blit_rect is not None:
+                    self.damaged.append(child.blit_rect)
+        if self.damaged_all or not self.damaged:
+            # invalidated without telling what changed
+            self.damaged_all = True
+            self.tilemap.draw(self.surface)
+            self.surface = self.surface.convert()
+        else:
+            for area in self.damaged:
+                self.tilemap.draw_area(self.surface, area)
         self.draw_children()
         self.valid = True
-        self.surface = self.surface.convert()
 
     def __set_attack_area(self, coord: Tuple[int, int], min_range: int, max_range: int):
         # Auxiliary method for update_move_attack_area and update_still_attack_area
@@ -627,6 +732,7 @@ class TileMap(room.Room):
 
         # let the ~~battle~~ entanglement begin!
         # change to arbitrary attribute select later
+        import quantum  # imports qiskit, which is slow: only when the first units get entangled
         event = quantum.Quantum(parent, child, quantum.Attributes.position)
         parent.entangle(event)
         child.entangle(event)
@@ -721,7 +827,7 @@ class MoveUnitAnimation(room.Room):
         if self.next_path is None:
             return
         reached = self.sprite.move_animation(dt, self.next_path)
-        self.invalidate()
+        self.parent.invalidate()
         if reached:
             try:
                 self.next_path = self.path.pop(0)
@@ -743,13 +849,15 @@ class MoveCursorAnimation(room.Room):
     def __init__(self, source: Coord, target: Coord):
         super().__init__()
         self.path = manhattan_path(source, target)
+
+    def begin(self) -> None:
+        super().begin()
         self.set_interval(100, self.step)
 
     def step(self, *_) -> None:
         self.parent: TileMap
         try:
-            self.parent.cursor.point(*next(self.path))
-            self.parent.invalidate()
+            self.parent.point_cursor(next(self.path))
         except StopIteration:
             self.done = True
 
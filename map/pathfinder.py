@@ -5,6 +5,14 @@
 
 import heapq
 
+import utils
+
+from map.hierarchy import CLUSTER_SIZE, Hierarchy
+
+
+HIERARCHY_MIN_TILES = 128 * 128  #: maps this large answer long shortest_path queries with a Hierarchy
+HIERARCHY_MIN_DISTANCE = 2 * CLUSTER_SIZE  #: a query is long if source and target are at least this far apart
+
 
 class Terrain(object):
     def __init__(self, tile, unit):
@@ -17,11 +25,26 @@ class Terrain(object):
         self.unit = unit
 
 
+def can_walk(allowed, terrains):
+    """
+    Whether a unit that can walk on terrains may enter a tile whose Terrain.allowed is allowed.
+    """
+    for a in allowed:
+        if a == 'any':
+            return True
+        if a == 'none':
+            return False
+        if a in terrains:
+            return True
+    return False
+
+
 class Pathfinder(object):
     """Cached pathfinder"""
     def __init__(self, _map):
         self.map = _map
         self.w, self.h = self.map.w, self.map.h
+        self.hierarchies = {}  # movement class -> Hierarchy
         self.reset()
 
     def reset(self):
@@ -117,7 +140,51 @@ class Pathfinder(object):
         self.shortest = S
         return S
 
+    def invalidate(self, coords):
+        """
+        To be called when the units on coords change: drops the cached results.
+        """
+        self.reset()
+        for hierarchy in self.hierarchies.values():
+            for coord in coords:
+                hierarchy.invalidate(coord)
+
+    def hierarchy(self, unit):
+        """
+        Returns the Hierarchy of the movement class and the team of unit.
+        """
+        key = unit.MOVEMENT_CLASS, unit.team.relation
+        if key not in self.hierarchies:
+            self.hierarchies[key] = Hierarchy(self.map, unit)
+        return self.hierarchies[key]
+
+    def hierarchical_path(self, source, target, max_distance=float('inf')):
+        """
+        Like shortest_path, with a Hierarchy: the path is found much faster on large maps, but may be a bit longer
+        than the shortest one.
+        """
+        source_unit = self.map[source].unit
+        path = []
+        cost = 0
+        for coord in self.hierarchy(source_unit).shortest_path(source, target):
+            cost += self.map[coord].moves
+            if cost > max_distance:
+                break
+            path.append(coord)
+        while path and (self.map[path[-1]].unit or self.map.is_obstacle(path[-1], source_unit)):
+            del path[-1]
+        return path
+
+    def is_long(self, source, target):
+        """
+        Whether shortest_path answers with a Hierarchy: on large maps, for a unit at source far from target.
+        """
+        return (self.w * self.h >= HIERARCHY_MIN_TILES and self.map[source].unit is not None
+                and utils.distance(source, target) >= HIERARCHY_MIN_DISTANCE)
+
     def shortest_path(self, source, target, max_distance=float('inf'), enemies=True):
+        if enemies and self.is_long(source, target):
+            return self.hierarchical_path(source, target, max_distance)
         if self.source != source or self.enemies != enemies:
             self.__set_source(source, enemies)
             self.__set_target(target, max_distance, enemies)
@@ -136,6 +203,64 @@ class Pathfinder(object):
         h, w = range(self.h), range(self.w)
         return [(i, j) for j in h for i in w if self.dist[(i, j)] <= max_distance]
 
+    def distances_to(self, source, targets, enemies=True):
+        """
+        Computes the cost of the shortest path from source to each target with one Dijkstra search, that stops as
+        soon as all the targets are settled. A target is reached by stepping on it, even if it's an obstacle, so that
+        the distance to an enemy unit can be measured.
+        Returns a list of (cost, target) sorted by cost, unreachable targets are left out.
+        """
+        targets = set(targets)
+        source_unit = self.map[source].unit if enemies else None
+        dist = {source: 0}
+        found = []
+        queue = [(0, source)]
+        while queue and len(found) < len(targets):
+            d, u = heapq.heappop(queue)
+            if d > dist[u]:
+                continue
+            if u in targets:
+                found.append((d, u))
+                if u != source:
+                    continue  # don't walk through the target
+            for v in self.map.neighbors(u):
+                alt = d + self.map[v].moves
+                if alt < dist.get(v, float('inf')) and (v in targets or not self.map.is_obstacle(v, source_unit)):
+                    dist[v] = alt
+                    heapq.heappush(queue, (alt, v))
+        return found
+
+    def nearest_sources(self, sources, targets, for_unit=None):
+        """
+        Multi-source version of distances_to: finds which of the sources is the nearest to each target, e.g. the
+        nearest AI unit to each enemy. Obstacles are the ones of for_unit, defaults to the unit on the first source.
+        Returns a dict from target to (cost, source), unreachable targets are left out.
+        """
+        sources = list(sources)
+        targets = set(targets)
+        if for_unit is None and sources:
+            for_unit = self.map[sources[0]].unit
+        dist = {s: 0 for s in sources}
+        origin = {s: s for s in sources}
+        nearest = {}
+        queue = [(0, i, s) for i, s in enumerate(sources)]  # the index breaks ties in favour of the first sources
+        heapq.heapify(queue)
+        while queue and len(nearest) < len(targets):
+            d, i, u = heapq.heappop(queue)
+            if d > dist[u]:
+                continue
+            if u in targets:
+                nearest[u] = (d, origin[u])
+                if origin[u] != u:
+                    continue
+            for v in self.map.neighbors(u):
+                alt = d + self.map[v].moves
+                if alt < dist.get(v, float('inf')) and (v in targets or not self.map.is_obstacle(v, for_unit)):
+                    dist[v] = alt
+                    origin[v] = origin[u]
+                    heapq.heappush(queue, (alt, i, v))
+        return nearest
+
 
 def manhattan_path(source, target):
     yield source
@@ -7,6 +7,7 @@ import pygame
 import logging
 
 import utils
+import resources
 import colors as c
 from basictypes import Point
 
@@ -81,7 +82,7 @@ class UnitSprite(pygame.sprite.Sprite):
             self.image.blit(src_img, utils.center(self.image.get_rect(), src_img.get_rect()))
         else:
             image_size = utils.resize_keep_ratio(src_img.get_size(), img_max_size)
-            resized_image = pygame.transform.smoothscale(src_img, image_size).convert_alpha()
+            resized_image = resources.scale_image(src_img, image_size)
             self.image.blit(resized_image, utils.center(self.image.get_rect(), resized_image.get_rect()))
 
         hp_bar_length = int(self.unit.health / self.unit.health_max * self.rect.w)
@@ -0,0 +1,294 @@
+"""
+Parallel planning of AI turns.
+
+The parts of the game state the AI reads, the terrain grid and the units, are copied into a Snapshot made only of
+tuples, so it can be sent to worker processes. The units of a team are split among the workers of a process pool and
+each one is planned against the snapshot with plan_unit; resolve then assigns destinations and targets to the plans
+in a deterministic order, so that no two units end up on the same tile.
+"""
+
+import atexit
+import heapq
+import logging
+import multiprocessing
+import os
+import time
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import forecast
+import utils
+
+
+TIME_BUDGET = 0.05  #: seconds each unit may spend scoring candidates
+TERRAIN_WEIGHT = 0.5  #: worth of a point of cover of the destination tile, in health points
+MAX_CANDIDATES = 8  #: candidates kept by each plan, for resolve to fall back on
+PARALLEL_MIN_UNITS = 8  #: smaller teams are planned in this process, the pool isn't worth its overhead
+OVERKILL = 0.99  #: a target is left alone once it dies with this probability
+
+Grid = namedtuple('Grid', 'w h moves passable cover')
+Grid.__doc__ = """
+Terrain of a map, one entry per tile in row major order. passable maps each movement class to whether its units can
+enter each tile.
+"""
+
+Piece = namedtuple('Piece', 'coord relation movement movement_class side value threat')
+Piece.__doc__ = """
+A unit as seen by the planner: relation is the one of its team, value is Unit.value, threat is the most damage it's
+expected to deal to an enemy in a battle, see threats.
+"""
+
+Snapshot = namedtuple('Snapshot', 'grid pieces routes')
+Snapshot.__doc__ = """
+routes maps the index of a unit to the path towards its nearest enemy, source excluded, found on the main thread with
+the pathfinder of the map; units without one approach with a search of the whole grid, see approach.
+"""
+
+Plan = namedtuple('Plan', 'unit candidates approach')
+Plan.__doc__ = """
+Options of the unit at index unit of Snapshot.pieces: candidates is a list of (score, tile, target index, kill chance)
+tuples, the best first; approach is the tile to move to when none of them is taken, None to stay still.
+"""
+
+__logger = logging.getLogger(__name__)
+__pool = None
+
+
+def cover(terrain) -> float:
+    """
+    How well a tile protects the unit standing on it: defense plus avoid, scaled to defense points.
+    """
+    return terrain.defense + terrain.avoid / 10
+
+
+def threats(table, units: Sequence) -> np.ndarray:
+    """
+    The highest UnitTable.expected_damage of every unit against its enemies, attacking from its minimum range.
+    """
+    if not units:
+        return np.zeros(0)
+    distances = np.broadcast_to(table.weapons(units)['min_range'][:, None], (len(units), len(units)))
+    damage = table.expected_damage(units, units, distances)
+    relations = np.array([u.team.relation for u in units])
+    enemies = np.abs(relations[:, None] - relations[None, :]) > 1
+    return np.where(enemies, damage, 0).max(axis=1)
+
+
+def snapshot(_map, units: Sequence, routes: Optional[Dict[int, Tuple]] = None) -> Snapshot:
+    """
+    Copies what the planner needs from a map.Map and its units.
+    :param routes: see Snapshot
+    """
+    coords = [(x, y) for y in range(_map.h) for x in range(_map.w)]
+    terrains = [_map[coord] for coord in coords]
+    passable = {}
+    for u in units:
+        if u.MOVEMENT_CLASS not in passable:
+            costs = _map.movement_costs(u)
+            passable[u.MOVEMENT_CLASS] = tuple(costs[coord] != float('inf') for coord in coords)
+    grid = Grid(_map.w, _map.h,
+                tuple(t.moves for t in terrains),
+                passable,
+                tuple(cover(t) for t in terrains))
+    table = _map.units_manager.table
+    values = table.values(units)
+    threat = threats(table, units)
+    pieces = tuple(Piece(u.coord, u.team.relation, u.movement, u.MOVEMENT_CLASS, forecast.side(u),
+                         int(values[i]), float(threat[i]))
+                   for i, u in enumerate(units))
+    return Snapshot(grid, pieces, routes or {})
+
+
+def are_enemies(a: Piece, b: Piece) -> bool:
+    """
+    Same as Team.is_enemy.
+    """
+    return abs(a.relation - b.relation) > 1
+
+
+def distances(snap: Snapshot, index: int,
+              limit: float = float('inf')) -> Tuple[Dict[Tuple[int, int], float], Dict]:
+    """
+    Dijkstra's algorithm from the unit at index, with the obstacles of map.Pathfinder: tiles held by enemies can't be
+    crossed, tiles held by allies can.
+    :param limit: tiles further than this are left out
+    :return: the distance of every reachable tile and the previous tile on its shortest path
+    """
+    grid, pieces, _ = snap
+    piece = pieces[index]
+    occupants = {p.coord: p for p in pieces}
+    passable = grid.passable[piece.movement_class]
+    dist = {piece.coord: 0}
+    prev = {}
+    queue = [(0, piece.coord)]
+    while queue:
+        d, (x, y) = heapq.heappop(queue)
+        if d > dist[(x, y)]:
+            continue
+        for v in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if not (0 <= v[0] < grid.w and 0 <= v[1] < grid.h):
+                continue
+            i = v[1] * grid.w + v[0]
+            alt = d + grid.moves[i]
+            if alt > limit or alt >= dist.get(v, float('inf')):
+                continue
+            occupant = occupants.get(v)
+            if occupant is not None:
+                if are_enemies(piece, occupant):
+                    continue
+            elif not passable[i]:
+                continue
+            dist[v] = alt
+            prev[v] = (x, y)
+            heapq.heappush(queue, (alt, v))
+    return dist, prev
+
+
+def approach(snap: Snapshot, index: int, reachable: Dict) -> Optional[Tuple[int, int]]:
+    """
+    Where a unit that can't attack anybody should go: as far as its movement allows along its route, or else along the
+    shortest path to the nearest enemy.
+    :param reachable: the distances of the tiles the unit can reach this turn, see distances
+    """
+    grid, pieces, routes = snap
+    piece = pieces[index]
+    occupied = {p.coord for p in pieces}
+    if index in routes:
+        # the enemy at the end of the route may be dead in this state, it's still the way to the others
+        tiles = [tile for tile in routes[index] if tile in reachable and tile not in occupied]
+        return tiles[-1] if tiles else None
+    dist, prev = distances(snap, index)
+    best = None
+    for enemy in pieces:
+        if not are_enemies(piece, enemy) or enemy.side.health <= 0:
+            continue
+        x, y = enemy.coord
+        for n in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if n in dist and (best is None or dist[n] < dist[best]):
+                best = n
+    if best is None:
+        return None
+    tile = best
+    while tile != piece.coord and (dist[tile] > piece.movement or tile in occupied):
+        tile = prev[tile]
+    return tile if tile != piece.coord else None
+
+
+def plan_unit(snap: Snapshot, index: int, budget: float = TIME_BUDGET) -> Plan:
+    """
+    Scores every (tile, enemy) pair the unit at index can attack this turn. Scoring stops when the budget runs out:
+    the most threatening enemies are scored first, from the nearest tiles.
+    """
+    deadline = time.perf_counter() + budget
+    grid, pieces, routes = snap
+    piece = pieces[index]
+    dist, _ = distances(snap, index, piece.movement)
+    occupied = {p.coord for p in pieces if p is not piece}
+    tiles = {tile: d for tile, d in dist.items() if d <= piece.movement and tile not in occupied}
+    min_range, max_range = forecast.weapon_range(piece.side)
+
+    pairs = []
+    for j, enemy in enumerate(pieces):
+        if not are_enemies(piece, enemy) or enemy.side.health <= 0:
+            continue
+        x, y = enemy.coord
+        for i in range(x - max_range, x + max_range + 1):
+            for k in range(y - max_range, y + max_range + 1):
+                if (i, k) in tiles and min_range <= utils.distance((i, k), (x, y)) <= max_range:
+                    pairs.append((-enemy.threat, tiles[(i, k)], (i, k), j))
+    pairs.sort()
+
+    candidates = []
+    for n, (_, _, tile, j) in enumerate(pairs):
+        target = pieces[j]
+        f = forecast.forecast(piece.side, target.side, utils.distance(tile, target.coord))
+        score = f.value() + TERRAIN_WEIGHT * grid.cover[tile[1] * grid.w + tile[0]]
+        candidates.append(((-score, target.value, n), (score, tile, j, f.kill_chance)))
+        if time.perf_counter() > deadline:
+            break
+    candidates.sort()
+    candidates = [c for _, c in candidates[:MAX_CANDIDATES]]
+    return Plan(index, candidates, None if candidates else approach(snap, index, dist))
+
+
+def plan_units(snap: Snapshot, indices: Sequence[int], budget: float = TIME_BUDGET) -> List[Plan]:
+    return [plan_unit(snap, i, budget) for i in indices]
+
+
+def pool() -> ProcessPoolExecutor:
+    """
+    The worker pool, started the first time it's needed and kept for the following turns until the game exits.
+    Workers come from a forkserver, or are spawned where there is none: forking the game itself, which runs other
+    threads, could leave them waiting on locks held by those threads.
+    """
+    global __pool
+    if __pool is None:
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        __pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context(method))
+        atexit.register(shutdown)
+    return __pool
+
+
+def shutdown() -> None:
+    """
+    Stops the worker pool, if it was started.
+    """
+    global __pool
+    if __pool is not None:
+        __pool.shutdown(wait=False, cancel_futures=True)
+        __pool = None
+
+
+def plan(snap: Snapshot, indices: Sequence[int], budget: float = TIME_BUDGET) -> List[Plan]:
+    """
+    Plans the units at indices, spreading them over the worker pool when there are at least PARALLEL_MIN_UNITS and
+    more than one CPU.
+    :return: the plans, in the order of indices
+    """
+    global __pool
+    workers = os.cpu_count() or 1
+    if workers > 1 and len(indices) >= PARALLEL_MIN_UNITS:
+        chunks = [indices[i::workers] for i in range(workers) if indices[i::workers]]
+        try:
+            results = list(pool().map(plan_units, [snap] * len(chunks), chunks, [budget] * len(chunks)))
+        except (OSError, BrokenProcessPool) as e:
+            __logger.warning("Planning in process, the worker pool failed: %s", e)
+            __pool = None
+        else:
+            plans = {p.unit: p for chunk in results for p in chunk}
+            return [plans[i] for i in indices]
+    return plan_units(snap, indices, budget)
+
+
+def resolve(snap: Snapshot, plans: List[Plan]) -> List[Tuple[int, Optional[Tuple[int, int]], Optional[int]]]:
+    """
+    Turns the plans into orders without conflicts. Units are served by decreasing best score, ties in the order of
+    plans, each one takes its best candidate whose tile nobody took yet and whose target isn't already expected to die.
+    :return: (unit index, destination or None, target index or None) for each plan, in the order they should be played
+    """
+    def key(p: Plan):
+        return -p.candidates[0][0] if p.candidates else float('inf')
+
+    taken = {snap.pieces[p.unit].coord for p in plans}
+    survival = {}  # target index -> probability of being still alive
+    orders = []
+    for p in sorted(plans, key=key):
+        coord = snap.pieces[p.unit].coord
+        taken.discard(coord)
+        for score, tile, target, kill in p.candidates:
+            if tile in taken or survival.get(target, 1) < 1 - OVERKILL:
+                continue
+            survival[target] = survival.get(target, 1) * (1 - kill)
+            taken.add(tile)
+            orders.append((p.unit, tile, target))
+            break
+        else:
+            tile = p.approach if p.approach is not None and p.approach not in taken else coord
+            taken.add(tile)
+            orders.append((p.unit, None if tile == coord else tile, None))
+    return orders
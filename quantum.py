@@ -13,10 +13,20 @@ from enum import Enum, auto
 
 resource_id = "/subscriptions/b1d7f7f8-743f-458e-b3a0-3e09734d716d/resourceGroups/aq-hackathons/providers/Microsoft.Quantum/Workspaces/aq-hackathon-01"
 
-provider = AzureQuantumProvider(
-    resource_id=resource_id,
-    location= "East US"
-)
+provider = None
+
+
+def get_provider() -> AzureQuantumProvider:
+    """
+    Connects to Azure the first time a circuit is run.
+    """
+    global provider
+    if provider is None:
+        provider = AzureQuantumProvider(
+            resource_id=resource_id,
+            location= "East US"
+        )
+    return provider
 
 
 Coord = Tuple[int, int]
@@ -69,7 +79,7 @@ class Quantum():
 
     def measure(self):  # I think this needs to get multithreaded to avoid conflict with GUI
         # return True
-        backend = provider.get_backend("ionq.simulator")
+        backend = get_provider().get_backend("ionq.simulator")
         job = backend.run(self.qc, shots=10)
         job_monitor(job)
         result = job.result()
@@ -1,18 +1,20 @@
 """
 Resources are cool. Contains a map of Ice Emblem file system and provides access to resources.
 """
-from typing import List, Tuple
+from typing import Callable, Dict, Iterable, List, Tuple, Union
 
 import pygame
 import logging
+import queue
+import threading
 
+import startup
+
+from collections import OrderedDict
 from pathlib import Path
 from xml.etree import ElementTree
 
 
-if not pygame.font.get_init():
-    pygame.font.init()
-
 RESOURCES_PATH = Path(__file__).absolute().parent / 'resources'  #: resources directory
 IMAGE_PATH =   RESOURCES_PATH / 'images'  #: images directory
 SOUNDS_PATH =  RESOURCES_PATH / 'sounds'
@@ -22,36 +24,257 @@ LOCALE_PATH =  RESOURCES_PATH / 'locale'
 MAPS_PATH =    RESOURCES_PATH / 'maps'
 SPRITES_PATH = RESOURCES_PATH / 'sprites'
 DATA_PATH =    RESOURCES_PATH / 'data'
+CACHE_PATH =   RESOURCES_PATH / 'cache'  #: generated files, see atlas
 
 __logger = logging.getLogger(__name__)
 
+SCALE_CACHE_BYTES = 64 * 2 ** 20  #: memory budget of the images kept by scale_image
+__scaled = OrderedDict()  # (id(image), size, smooth) -> (image, scaled image, bytes)
+__scaled_bytes = 0
+
+__atlas = None  # str(path) -> subsurface of an atlas page, filled by atlas.load the first time it's needed
+__atlas_lock = threading.RLock()
+
 
 def __load_log(path):
     __logger.debug('Loading %s', path)
 
 
+RESOURCE_CACHE_BYTES = 128 * 2 ** 20  #: memory budget of the assets kept by ResourceManager
+
+
+def _decode_image(path: Path) -> Tuple[pygame.Surface, int]:
+    image = pygame.image.load(str(path))
+    return image, image.get_width() * image.get_height() * image.get_bytesize()
+
+
+def _convert_sprite(path: Path) -> Tuple[pygame.Surface, int]:
+    # the decoded image is kept as well, so that preloading it is enough to convert it without reading it again
+    image = manager.image(path).convert_alpha()
+    return image, image.get_width() * image.get_height() * image.get_bytesize()
+
+
+def _decode_sound(path: Path) -> Tuple[pygame.mixer.Sound, int]:
+    sound = pygame.mixer.Sound(str(path))
+    frequency, size, channels = pygame.mixer.get_init()
+    return sound, int(sound.get_length() * frequency) * channels * abs(size) // 8
+
+
+def _read_music(path: Path) -> Tuple[None, int]:
+    # SDL_mixer streams music from the file: reading it once is enough to have it in the OS cache
+    with open(path, 'rb') as f:
+        while f.read(2 ** 20):
+            pass
+    return None, 0
+
+
+class ResourceManager(object):
+    """
+    Finds resources through a filename index, keeps decoded assets within a memory budget and decodes the assets
+    that will be needed soon on a background thread.
+
+    Cached assets are shared by every caller, so they must not be modified.
+    """
+    decoders: Dict[str, Callable[[Path], Tuple[object, int]]] = {
+        'image': _decode_image,
+        'sprite': _convert_sprite,
+        'sound': _decode_sound,
+        'music': _read_music,
+    }
+
+    def __init__(self, budget: int = RESOURCE_CACHE_BYTES):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.budget = budget
+        self.indexes: Dict[Path, Dict[str, Path]] = {}  # directory -> file name or stem -> path
+        self.cache: OrderedDict = OrderedDict()  # (kind, path) -> (asset, bytes)
+        self.cache_bytes = 0
+        self.lock = threading.Lock()
+        self.queue: queue.Queue = queue.Queue()
+        self.worker: Union[threading.Thread, None] = None
+
+    def index(self, directory: Path) -> Dict[str, Path]:
+        """
+        Returns a dict mapping the name of every file in directory to its path. The directory is listed only the
+        first time.
+        """
+        try:
+            return self.indexes[directory]
+        except KeyError:
+            pass
+        index = {f.name: f for f in directory.iterdir()} if directory.is_dir() else {}
+        self.indexes[directory] = index
+        return index
+
+    def get(self, kind: str, path: Path):
+        """
+        Returns an asset decoded by the decoder of kind, decoding it only if it isn't cached.
+        """
+        key = (kind, Path(path))
+        with self.lock:
+            try:
+                asset = self.cache[key][0]
+                self.cache.move_to_end(key)
+                return asset
+            except KeyError:
+                pass
+        self.logger.debug('Loading %s', path)
+        asset, nbytes = self.decoders[kind](key[1])
+        with self.lock:
+            if key not in self.cache:
+                self.cache[key] = (asset, nbytes)
+                self.cache_bytes += nbytes
+                while self.cache_bytes > self.budget and len(self.cache) > 1:
+                    self.cache_bytes -= self.cache.popitem(last=False)[1][1]
+        return asset
+
+    def image(self, path: Path) -> pygame.Surface:
+        return self.get('image', path)
+
+    def sound(self, path: Path) -> pygame.mixer.Sound:
+        return self.get('sound', path)
+
+    def preload(self, kind: str, paths: Iterable[Path]) -> None:
+        """
+        Queues assets to be decoded by the background thread, which is started if needed.
+        """
+        for path in paths:
+            self.queue.put((kind, Path(path)))
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self.__work, name='ResourceManager', daemon=True)
+            self.worker.start()
+
+    def __work(self) -> None:
+        while True:
+            try:
+                kind, path = self.queue.get(timeout=1)
+            except queue.Empty:
+                return
+            if kind == 'sound' and not pygame.mixer.get_init():
+                continue
+            try:
+                self.get(kind, path)
+            except (OSError, pygame.error) as e:
+                self.logger.warning("Couldn't preload %s: %s", path, e)
+
+    def preload_map(self, map_path: str) -> None:
+        """
+        Queues the sprites of the units of a map and the music of its teams.
+        """
+        try:
+            root = ElementTree.parse(map_path).getroot()
+        except (OSError, ElementTree.ParseError) as e:
+            self.logger.warning("Couldn't read %s: %s", map_path, e)
+            return
+        sprites, music = set(), set()
+        for group in root.iter('objectgroup'):
+            for obj in group.iter('object'):
+                if obj.attrib.get('type') == 'unit' and 'name' in obj.attrib:
+                    sprites.add(sprite_path(obj.attrib['name']))
+            for prop in group.iter('property'):
+                if prop.attrib.get('name') in ('map_music', 'battle_music'):
+                    music.add(MUSIC_PATH / prop.attrib['value'])
+        self.preload('image', sorted(p for p in sprites if not in_atlas(p)))
+        self.preload('music', sorted(music))
+
+
+manager = ResourceManager()
+
+
+def set_atlas(images):
+    """
+    Makes load_image and load_sprite return the given images instead of loading them from disk.
+    :param images: a dict mapping the path of each image to its surface
+    """
+    global __atlas
+    __atlas = dict(images)
+
+
+def atlas_images() -> Dict[str, pygame.Surface]:
+    """
+    Returns the images of the atlas, loading it the first time, see atlas.load. Before the display mode is set nothing
+    is loaded and images come from disk one by one.
+    """
+    global __atlas
+    with __atlas_lock:
+        if __atlas is None and pygame.display.get_surface():
+            import atlas  # atlas imports this module
+            __atlas = {}
+            with startup.section("atlas"):
+                try:
+                    atlas.load()
+                except (OSError, pygame.error, ValueError) as e:
+                    __logger.warning("Couldn't load the atlas, images will be loaded one by one: %s", e)
+    return __atlas or {}
+
+
+def in_atlas(path) -> bool:
+    return str(path) in atlas_images()
+
+
 def load_image(fname):
+    """
+    Returns an image of IMAGE_PATH. Images packed in the atlas are returned as subsurfaces of an atlas page, the
+    others are cached by the ResourceManager: either way they are shared and must not be modified.
+    """
     path = str(IMAGE_PATH / fname)
-    __load_log(path)
-    return pygame.image.load(path)
+    try:
+        return atlas_images()[path]
+    except KeyError:
+        pass
+    return manager.image(path)
+
+
+def scale_image(image: pygame.Surface, size: Tuple[int, int], smooth: bool = True) -> pygame.Surface:
+    """
+    Returns image scaled to size, keeping the most recently used results within SCALE_CACHE_BYTES.
+
+    The returned surface is shared with other callers, so it must not be modified.
+    :param image: the source image
+    :param size: the size of the scaled image
+    :param smooth: use pygame.transform.smoothscale instead of pygame.transform.scale
+    :return: the scaled image
+    """
+    global __scaled_bytes
+    key = (id(image), tuple(size), smooth)
+    try:
+        scaled = __scaled[key][1]
+        __scaled.move_to_end(key)
+        return scaled
+    except KeyError:
+        pass
+    scaled = pygame.transform.smoothscale(image, size) if smooth else pygame.transform.scale(image, size)
+    # keeping a reference to the source image ensures its id is not reused by another image
+    nbytes = (image.get_width() * image.get_height() + scaled.get_width() * scaled.get_height()) * image.get_bytesize()
+    __scaled[key] = (image, scaled, nbytes)
+    __scaled_bytes += nbytes
+    while __scaled_bytes > SCALE_CACHE_BYTES and len(__scaled) > 1:
+        __scaled_bytes -= __scaled.popitem(last=False)[1][2]
+    return scaled
 
 
 def load_sound(fname):
-    path = str(SOUNDS_PATH / fname)
-    __load_log(path)
-    return pygame.mixer.Sound(path)
+    return manager.sound(SOUNDS_PATH / fname)
 
 
 def load_font(name, size):
+    if not pygame.font.get_init():
+        pygame.font.init()
     path = FONTS_PATH / name
     __load_log(path)
     return pygame.font.Font(str(path), size)
 
 
 def load_sprite(fname):
+    """
+    Returns a sprite converted for fast blitting. Sprites packed in the atlas are already resized to fit the size
+    units are drawn at and are shared, so they must not be modified.
+    """
     path = str(sprite_path(fname))
-    __load_log(path)
-    return pygame.image.load(path)
+    try:
+        return atlas_images()[path]
+    except KeyError:
+        pass
+    return manager.get('sprite', path) if pygame.display.get_surface() else manager.image(path)
 
 
 def load_data(fname):
@@ -90,10 +313,10 @@ def sprite_path(name: str):
     :return: the absolute path to a sprite resource.
     """
     if '.' not in name:
-        for f in SPRITES_PATH.iterdir():
-            if f.name == name + '.png' or f.name == name + '.jpg':
-                name = f.name
-                break
+        for ext in ('.png', '.jpg'):
+            path = manager.index(SPRITES_PATH).get(name + ext)
+            if path is not None:
+                return path
     return SPRITES_PATH / name
 
 
@@ -3,7 +3,7 @@ This module is central in Ice Emblem's engine since it provides the Room class a
 upon Room objects.
 """
 
-from typing import Callable, List, Tuple, Union, Dict
+from typing import Callable, List, Tuple, Union, Dict, FrozenSet, Set
 
 import pygame
 import pygame.locals as p
@@ -16,11 +16,61 @@ import colors as c
 
 import events
 import display
+import resources
+import timers
 import utils
 
 from basictypes import NESW
 
 
+MAX_DAMAGED_AREAS = 64  #: when more areas than this are damaged the whole Room is considered damaged
+measured_rooms = 0  #: number of Room.measure calls in the last layout pass
+
+_handler_names: Dict[int, str] = {}  # event type -> name of the method handling it
+_class_handlers: Dict[type, FrozenSet[str]] = {}  # Room subclass -> names of its handle_ methods
+
+
+def handler_name(event_type: int) -> str:
+    """
+    Returns the name of the method handling an event type, like handle_mousebuttondown.
+    :param event_type: a pygame event type
+    :return: the method name
+    """
+    try:
+        return _handler_names[event_type]
+    except KeyError:
+        name = _handler_names[event_type] = 'handle_' + pygame.event.event_name(event_type).lower()
+        return name
+
+
+def class_handlers(cls: type) -> FrozenSet[str]:
+    """
+    Returns the names of the handle_ methods defined by a Room class. Computed once per class.
+    :param cls: a Room subclass
+    :return: a frozenset of method names
+    """
+    try:
+        return _class_handlers[cls]
+    except KeyError:
+        handlers = _class_handlers[cls] = frozenset(name for name in dir(cls) if name.startswith('handle_') and
+                                                    callable(getattr(cls, name)))
+        return handlers
+
+
+def event_keys(_events: List[pygame.event.Event]) -> Set[Union[int, str]]:
+    """
+    Returns the event types and the names of the methods handling them for a batch of events.
+
+    The result can be matched against Room.interest.
+    :param _events: a list of pygame.event.Event
+    """
+    keys = set()
+    for event in _events:
+        keys.add(event.type)
+        keys.add(handler_name(event.type))
+    return keys
+
+
 class Gravity(Flag):
     """
     Standard constants and tools for placing an object within a potentially larger container.
@@ -41,10 +91,12 @@ class Gravity(Flag):
     BOTTOMRIGHT = BOTTOM | RIGHT
     CENTER_HORIZONTAL = auto()  #: Place object in the horizontal center of its container, not changing its size.
     CENTER_VERTICAL   = auto()  #: Place object in the vertical center of its container, not changing its size.
-    CENTER = CENTER_HORIZONTAL | CENTER_VERTICAL  #: Place the object in the center of its container in both the vertical and horizontal axis, not changing its size.
+    #: Place the object in the center of its container in both the vertical and horizontal axis, not changing its size.
+    CENTER = CENTER_HORIZONTAL | CENTER_VERTICAL
     FILL_HORIZONTAL = auto()  #: Grow the horizontal size of the object if needed so it completely fills its container.
     FILL_VERTICAL = auto()  #: Grow the vertical size of the object if needed so it completely fills its container.
-    FILL = FILL_HORIZONTAL | FILL_VERTICAL  #: Grow the horizontal and vertical size of the object if needed so it completely fills its container.
+    #: Grow the horizontal and vertical size of the object if needed so it completely fills its container.
+    FILL = FILL_HORIZONTAL | FILL_VERTICAL
     VERTICAL = TOP | BOTTOM | CENTER_VERTICAL
     HORIZONTAL = LEFT | RIGHT | CENTER_HORIZONTAL
 
@@ -94,6 +146,12 @@ class MeasureParams(object):
     def __str__(self):
         return "%s, %s" % (self.mode, self.value)
 
+    def __eq__(self, other):
+        return isinstance(other, MeasureParams) and self.mode == other.mode and self.value == other.value
+
+    def __hash__(self):
+        return hash((self.mode, self.value))
+
     def exactly(self) -> 'MeasureParams':
         """
         Make another MeasureParams with mode set to MeasureSpec.EXACTLY.
@@ -171,7 +229,6 @@ class Background(object):
         self.image: Union[pygame.Surface, None] = image
         self.size: Union[BackgroundSize, Tuple[int, int]] = size
         self.transparent = transparent
-        self._bg_image_resized = None
 
     def fill(self, surface: pygame.Surface, area: pygame.Rect) -> None:
         if self.color:
@@ -197,10 +254,7 @@ class Background(object):
         else:
             new_size = (int(self.size[0] / 100 * surface_size[0]), int(self.size[1] / 100 * surface_size[1]))
 
-        if not self._bg_image_resized or new_size != self._bg_image_resized.get_size():
-            self._bg_image_resized = pygame.transform.smoothscale(self.image, new_size)
-
-        return self._bg_image_resized
+        return resources.scale_image(self.image, new_size)
 
 
 class Room(object):
@@ -269,11 +323,19 @@ class Room(object):
         self.layout: Layout = kwargs.get('layout', Layout())
 
         self.rect: pygame.Rect = pygame.Rect((0, 0), (0, 0))
+        self.measure_key: Union[Tuple[MeasureParams, MeasureParams], None] = None  # specs of the last measure
+        self.layout_key: Union[Tuple[int, int, int, int], None] = None  # rect of the last layout_children
+        self.layout_pending: bool = False  # a room of the subtree requested a layout, see layout_request
+        self.blit_rect: Union[pygame.Rect, None] = None  # where this room has been blit on the parent the last time
+        self.damaged: List[pygame.Rect] = []  # areas of self.surface changed since the parent last drew this room
+        self.damaged_all: bool = True
         if self.background.transparent:
             self.surface: pygame.Surface = pygame.Surface(self.rect.size, flags=pygame.SRCALPHA)
         else:
             self.surface: pygame.Surface = pygame.Surface(self.rect.size)
         self.callbacks: Dict[int, List[Callable]] = {}
+        self._interest: Union[FrozenSet[Union[int, str]], None] = None
+        self.timers: Set[timers.Timer] = set()
         self.next: Union['Room', None] = kwargs.get('next', None)
 
         self.children: List['Room'] = []
@@ -328,6 +390,7 @@ class Room(object):
         for child in children:
             self.prepare_child(child)
         self.children.extend(children)
+        self.interest_changed()
         self.layout_request()
         self.invalidate()
 
@@ -345,6 +408,7 @@ class Room(object):
         :raises ValueError when the child is not part of the tree
         """
         self.children.remove(child)
+        self.interest_changed()
         child.parent = None
         child.logger = logging.getLogger(child.__class__.__name__)
         self.layout_request()
@@ -355,8 +419,23 @@ class Room(object):
         """
         Bottom-top traverse of the tree. Every parent is invalidated up until the root.
 
-        The draw method will be called at next frame if the Room is invalid.
+        The draw method will be called at next frame if the Room is invalid. The whole surface is considered damaged.
+        """
+        self.damaged_all = True
+        self.invalidate_area(None)
+
+    def invalidate_area(self, area: Union[pygame.Rect, None]) -> None:
         """
+        Like invalidate, but only area (in local coordinates) is considered damaged.
+
+        Rooms that track damage (see tracks_damage) may redraw and push to the screen just that area.
+        :param area: the damaged area, None to not add any damaged area.
+        """
+        if area is not None:
+            self.damaged.append(pygame.Rect(area))
+            if len(self.damaged) > MAX_DAMAGED_AREAS:
+                self.damaged_all = True
+                self.damaged = []
         self.valid = False
         node = self.parent
         while node and node.valid:
@@ -366,13 +445,15 @@ class Room(object):
 
     def layout_request(self) -> None:
         """
-        Bottom-top traverse of the tree. Every parent is invalidated up until the root.
+        Bottom-top traverse of the tree. This Room is invalidated, its parents up until the root are only marked as
+        pending: they are measured again only if the measured size of this Room changes, see ensure_measured.
 
         The room_layout function will be called on the root Room before next frame.
         """
-        node = self
-        while node and node.layout.valid:
-            node.layout.valid = False
+        self.layout.valid = False
+        node = self.parent
+        while node and not node.layout_pending:
+            node.layout_pending = True
             node = node.parent
         self.logger.debug("Layout requested")
 
@@ -419,9 +500,66 @@ class Room(object):
         The measured size should not exceed max_width and max_height otherwise the parent may clip the child.
         """
         for child in self.children:
-            child.measure(spec_width.at_most(), spec_height.at_most())
+            child.ensure_measured(spec_width.at_most(), spec_height.at_most())
         self.resolve_measure(spec_width, spec_height, self.rect.w, self.rect.h)
 
+    def ensure_measured(self, spec_width: MeasureParams, spec_height: MeasureParams) -> None:
+        """
+        Calls measure unless this subtree has a valid layout and was already measured with the same specs. If some
+        rooms of the subtree requested a layout, only they are measured again as long as their measured size stays
+        the same.
+
+        Parents should call this instead of calling measure directly on their children.
+        """
+        global measured_rooms
+        key = spec_width, spec_height
+        if self.layout.valid and self.measure_key == key and self.measure_pending():
+            return
+        self.measure(spec_width, spec_height)
+        self.measure_key = key
+        measured_rooms += 1
+
+    def measure_pending(self) -> bool:
+        """
+        Measures again, with the specs of their last measure, the children that requested a layout or have pending
+        ones in their subtree.
+        :return: False if the measured size of one of them changed, then this Room has to be measured and laid out
+            again too
+        """
+        if not self.layout_pending:
+            return True
+        unchanged = True
+        for child in self.children:
+            if child.layout_pending or not child.layout.valid:
+                if child.measure_key is None or child.layout_key is None:
+                    unchanged = False
+                    continue
+                size = child.measured_size
+                child.ensure_measured(*child.measure_key)
+                unchanged = unchanged and child.measured_size == size
+        if not unchanged:
+            self.layout.valid = False
+        return unchanged
+
+    def ensure_laid_out(self, rect: pygame.Rect) -> None:
+        """
+        Calls layout_children unless this subtree has a valid layout and was already laid out in the same rect. In
+        that case only the children measured again by ensure_measured are laid out, in the rects of their last layout.
+
+        Parents should call this instead of calling layout_children directly on their children.
+        """
+        key = tuple(rect)
+        if self.layout.valid and self.layout_key == key:
+            if self.layout_pending:
+                self.layout_pending = False
+                for child in self.children:
+                    if child.layout_pending or not child.layout.valid:
+                        child.ensure_laid_out(pygame.Rect(child.layout_key))
+            return
+        self.layout_pending = False
+        self.layout_children(rect)
+        self.layout_key = key
+
     def resolve_measure(self, spec_width: MeasureParams, spec_height: MeasureParams, content_width: int,
                         content_height: int) -> None:
         """
@@ -464,7 +602,7 @@ class Room(object):
         """
         w, h = 0, 0
         for child in self.children:
-            child.layout_children(pygame.Rect(child.layout.position, child.measured_size))
+            child.ensure_laid_out(pygame.Rect(child.layout.position, child.measured_size))
             w = max(w, child.rect.w)
             h = max(h, child.rect.h)
         self.resolve_layout(rect)
@@ -546,15 +684,61 @@ class Room(object):
         self.draw_children()
         self.valid = True
 
+    @property
+    def tracks_damage(self) -> bool:
+        """
+        Whether self.damaged precisely describes what the draw method changes.
+
+        Rooms with their own draw method are assumed to redraw their whole surface, unless they redefine this property.
+        """
+        return type(self).draw is Room.draw
+
+    def take_damage(self) -> List[pygame.Rect]:
+        """
+        Returns the areas of self.surface that changed since the last call and resets them.
+        :return: a list of pygame.Rect in local coordinates.
+        """
+        surface_rect = self.surface.get_rect()
+        if self.damaged_all:
+            damaged = [surface_rect]
+        else:
+            damaged = [area.clip(surface_rect) for area in self.damaged]
+            damaged = [area for i, area in enumerate(damaged) if area.w and area.h and
+                       not any(other.contains(area) for other in damaged[i + 1:])]
+        self.damaged = []
+        self.damaged_all = False
+        return damaged
+
     def draw_children(self) -> None:
         """
         Draw children recursively by calling their draw method if they are visible and invalid.
+
+        The areas changed by the children are added to self.damaged.
         """
         for child in self.children:
             if child.visible:
                 if not child.valid:
                     child.draw()
+                    if not child.tracks_damage:
+                        child.damaged_all = True
                 self.surface.blit(child.surface, child.rect)
+                self.damage_from_child(child)
+
+    def damage_from_child(self, child: 'Room') -> None:
+        """
+        Translates the damage of a child that has just been blit into self.damaged.
+        :param child: the child
+        """
+        if child.blit_rect != child.rect:
+            # the child moved or has been resized: both the previous and the current area changed
+            if child.blit_rect is not None:
+                self.damaged.append(child.blit_rect)
+            self.damaged.append(child.rect.copy())
+            child.take_damage()
+            child.blit_rect = child.rect.copy()
+        else:
+            for area in child.take_damage():
+                self.damaged.append(area.move(child.rect.topleft))
 
     def fill(self, area=None) -> None:
         """
@@ -564,6 +748,10 @@ class Room(object):
         is pretty expensive.
         :param area: if not None restricts the fill to an area.
         """
+        if area is None:
+            self.damaged_all = True
+        else:
+            self.damaged.append(pygame.Rect(area))
         self.surface.set_clip(None)
         self.background.fill(self.surface, area)
         clip_area = self.rect.inflate(-self.padding.we, -self.padding.ns)
@@ -592,9 +780,9 @@ class Room(object):
         Ends life-cycle of this Room. Unregisters all callbacks and removes himself from parent if self.die_when_done is
         true.
         """
-        for event_type in self.callbacks:
-            if event_type >= p.USEREVENT and self.callbacks[event_type]:
-                events.stop_timer(event_type)
+        for timer in self.timers:
+            events.stop_timer(timer)
+        self.timers.clear()
         self.logger.debug("end")
         self.end_children()
         if self.parent:
@@ -603,23 +791,55 @@ class Room(object):
             if self.die_when_done:
                 self.parent.remove_child(self)
 
-    def process_events(self, _events):
+    @property
+    def interest(self) -> FrozenSet[Union[int, str]]:
+        """
+        Event types having registered callbacks and names of the handle_ methods in the whole subtree of this Room.
+
+        Computed lazily, see interest_changed.
+        """
+        if self._interest is None:
+            interest = set(class_handlers(type(self)))
+            interest.update(event_type for event_type, callbacks in self.callbacks.items() if callbacks)
+            for child in self.children:
+                interest.update(child.interest)
+            self._interest = frozenset(interest)
+        return self._interest
+
+    def interest_changed(self) -> None:
+        """
+        Bottom-top traverse of the tree. The interest of this Room and of every parent is computed again when needed.
+        """
+        node = self
+        while node:
+            node._interest = None
+            node = node.parent
+
+    def process_events(self, _events, _keys=None):
         """
         Dispatches an event to registered callbacks or to methods named
         like handle_mousebuttondown.
+
+        Subtrees with neither callbacks nor methods for the events are skipped.
         """
+        if _keys is None:
+            _keys = event_keys(_events)
+        if _keys.isdisjoint(self.interest):
+            return False
         processed = False
         for child in self.children:
-            processed = processed or child.process_events(_events)
+            if not processed and not _keys.isdisjoint(child.interest):
+                processed = child.process_events(_events, _keys)
         if processed:
             return
+        handlers = class_handlers(type(self))
         for event in _events:
             if event.type in self.callbacks:
                 for callback in self.callbacks[event.type]:
                     processed = processed or callback(event)
-            method = getattr(self, 'handle_' + pygame.event.event_name(event.type).lower(), None)
-            if method is not None:
-                processed = processed or method(event)
+            name = handler_name(event.type)
+            if name in handlers:
+                processed = processed or getattr(self, name)(event)
         return processed
 
     def register(self, event_type: int, callback: Callable) -> None:
@@ -631,6 +851,7 @@ class Room(object):
                 self.callbacks[event_type].append(callback)
         else:
             self.callbacks[event_type] = [callback]
+        self.interest_changed()
         self.logger.debug('registered %s -> %s', pygame.event.event_name(event_type), callback)
 
     def unregister(self, event_type: int, callback: Callable = None):
@@ -642,40 +863,46 @@ class Room(object):
                 self.callbacks[event_type].remove(callback)
         elif len(self.callbacks[event_type]) > 0:
             self.callbacks[event_type].pop()
+        self.interest_changed()
         self.logger.debug('unregistered %s -> %s', pygame.event.event_name(event_type), callback)
 
-    def set_timeout(self, time: int, callback: Callable) -> int:
+    def set_timeout(self, time: int, callback: Callable) -> timers.Timer:
         """
         This method is kind of inspired from JS's SetTimeout. It calls callback only once approximately after time
-        milliseconds. When this room ends the timer is cancelled too.
+        milliseconds. When this room ends the timer is cancelled too. The timer is paused while a nested run_room
+        runs another room tree.
         :param time: time in milliseconds
-        :param callback: callback function
-        :return: an int between pygame.USEREVENT and pygame.NUMEVENTS which can be used to stop the timer by calling
-        Room.unregister
+        :param callback: callback function, it gets the timer as argument
+        :return: a timers.Timer which can be used to stop the timer by calling Room.clear_timer
         """
-        event_type = events.new_timer(time)
-
-        def callme(_event: int) -> bool:
-            events.stop_timer(event_type)
-            self.unregister(event_type, callme)
-            return callback(_event)
+        def callme(timer: timers.Timer) -> bool:
+            self.timers.discard(timer)
+            return callback(timer)
 
-        self.register(event_type, callme)
-        return event_type
+        timer = events.new_timer(time, callme)
+        self.timers.add(timer)
+        return timer
 
-    def set_interval(self, time: int, callback: Callable) -> int:
+    def set_interval(self, time: int, callback: Callable) -> timers.Timer:
         """
         This method is kind of inspired from JS's setInterval.
 
-        It calls callback every time milliseconds until this room ends or Room.unregister is called.
+        It calls callback every time milliseconds until this room ends or Room.clear_timer is called.
         :param time: time in milliseconds
-        :param callback: callback function
-        :return: an int between pygame.USEREVENT and pygame.NUMEVENTS which can be used to stop the timer by calling
-        Room.unregister
+        :param callback: callback function, it gets the timer as argument
+        :return: a timers.Timer which can be used to stop the timer by calling Room.clear_timer
+        """
+        timer = events.new_timer(time, callback, repeat=True)
+        self.timers.add(timer)
+        return timer
+
+    def clear_timer(self, timer: timers.Timer) -> None:
+        """
+        Stops a timer started with set_timeout or set_interval.
+        :param timer: the timer returned by set_timeout or set_interval
         """
-        event_type = events.new_timer(time)
-        self.register(event_type, callback)
-        return event_type
+        events.stop_timer(timer)
+        self.timers.discard(timer)
 
     def bind_keys(self, keys, callback):
         """
@@ -785,7 +1012,9 @@ def layout_room(room: Room) -> None:
         spec_height = MeasureParams(MeasureSpec.EXACTLY, display.get_height())
     else:
         spec_height = MeasureParams(MeasureSpec.AT_MOST, display.get_height())
-    room.measure(spec_width, spec_height)
+    global measured_rooms
+    measured_rooms = 0
+    room.ensure_measured(spec_width, spec_height)
 
     rect = pygame.Rect((0, 0), room.measured_size)
 
@@ -806,26 +1035,56 @@ def layout_room(room: Room) -> None:
     elif Gravity.CENTER_VERTICAL in room.layout.gravity:
         rect.centery = display.get_height() // 2
 
-    room.layout_children(rect)
+    room.ensure_laid_out(rect)
+    room.logger.debug("Layout pass: %d rooms measured", measured_rooms)
+
+
+_last_drawn: Union[Room, None] = None  # the root Room drawn in the last frame
 
 
 def draw_room(room: Room, first_draw=False):
     """
     Draws the root Room.
+
+    Only the areas damaged since the previous frame are pushed to the screen. The whole window is updated on the first
+    frame, when a layout pass moved or resized the root Room and when another root Room has been drawn in between.
     :param room: the room to draw.
     :param first_draw: True if it's the first frame.
     """
-    if room.clear_screen:
-        display.window.fill(room.clear_screen)
-    if not room.layout.valid:
+    global _last_drawn
+    full = first_draw or _last_drawn is not room
+    if not room.layout.valid or room.layout_pending:
+        prev_rect = room.rect.copy()
         layout_room(room)
+        # moving children around is tracked as damage, only a new root rect needs the whole window
+        full = full or room.rect != prev_rect
     if first_draw:
         room.fill_recursive()
     if not room.valid:
         room.draw()
-    display.window.blit(room.surface, room.rect)
-    display.draw_fps()
-    display.flip()
+        if not room.tracks_damage:
+            room.damaged_all = True
+
+    if full:
+        if room.clear_screen:
+            display.window.fill(room.clear_screen)
+        display.window.blit(room.surface, room.rect)
+        room.take_damage()
+        display.draw_fps()
+        display.flip()
+    else:
+        rects = [area.move(room.rect.topleft) for area in room.take_damage()]
+        if display.overlay_rect:
+            rects.append(display.overlay_rect)
+        for area in rects:
+            if room.clear_screen:
+                display.window.fill(room.clear_screen, area)
+            src = area.clip(room.rect)
+            display.window.blit(room.surface, src, src.move(-room.rect.x, -room.rect.y))
+        rects.append(display.draw_fps())
+        display.update(rects)
+    room.logger.debug("Dirty ratio: %.3f", display.dirty_ratio)
+    _last_drawn = room
 
 
 def generic_event_handler(_events: List[pygame.event.Event]) -> None:
@@ -847,6 +1106,7 @@ def run_room(room: Room) -> None:
     allowed_events = list(events.get_allowed())
     if room.allowed_events:
         events.set_allowed(room.allowed_events)
+    events.suspend_timers()
     room.root = True
     room.done = False
     room.valid = False
@@ -858,17 +1118,19 @@ def run_room(room: Room) -> None:
     while not room.done:
         if not room.wait_valid:
             room.wait_update()
-        if room.wait and not pygame.event.peek(list(events.get_allowed())):
-            _events = [pygame.event.wait()]
+        if room.wait and not events.pending():
+            _events = [events.wait_event()]
         else:
             _events = pygame.event.get()
         generic_event_handler(_events)
+        events.update_timers()
         room.process_events(_events)
         room.loop(_events, dt)
         draw_room(room)
         dt = display.tick(room.fps)
 
     room.end()
+    events.resume_timers()
     if room.allowed_events:
         events.set_allowed(allowed_events)
     room.root = False
@@ -190,7 +190,7 @@ class ExperienceAnimation(gui.LinearLayout):
         self.bar = gui.LifeBar(max=99, value=_unit.exp_prev, blocks_per_row=100, block_size=(2, 10),
                                life_color=c.YELLOW)
         self.label = gui.Label(_("EXP: {experience}") + "\t" + _("LV: {level}"), f.SMALL, txt_color=c.YELLOW)
-        self.label.format(**_unit.__dict__)
+        self.label.format(**_unit.as_dict())
         self.add_children(self.image, self.bar, self.label)
         self.time = 0
 
@@ -207,7 +207,7 @@ class ExperienceAnimation(gui.LinearLayout):
             self.bar.value += 1
             if self.unit.levelled_up() and self.bar.value % 100 == 0:
                 sounds.play('levelup')
-            self.label.format(**self.unit.__dict__)
+            self.label.format(**self.unit.as_dict())
         else:
             if self.time > 2000:
                 self.done = True
@@ -0,0 +1,67 @@
+"""
+
+"""
+
+
+import threading
+import traceback
+import logging
+
+import gui
+import map
+import state as s
+import colors as c
+import fonts as f
+
+from room import Background, Gravity, Layout, LayoutParams
+
+
+class LoadingScreen(gui.LinearLayout):
+    """
+    Loads a map showing the progress: parsing and decoding run on a worker thread with map.prepare, then the map is
+    built on the main thread by state.load_map. If loading fails error holds the traceback.
+    """
+    def __init__(self, map_path, **kwargs):
+        super().__init__(wait=False, background=Background(color=c.BLACK), spacing=25,
+                         layout=Layout(width=LayoutParams.FILL_PARENT, height=LayoutParams.FILL_PARENT),
+                         default_child_gravity=Gravity.CENTER, **kwargs)
+        self.map_path = map_path
+        self.progress = (0, _("Loading"))  # written by the worker thread
+        self.prepared = None
+        self.error = None
+        self.worker = None
+        self.label = gui.Label(self.progress[1], f.MAIN, txt_color=c.ICE)
+        self.bar = gui.LifeBar(points=50, value=0, blocks_per_row=50, block_size=(8, 16), life_color=c.ICE)
+        self.add_children(self.label, self.bar)
+
+    def begin(self):
+        super().begin()
+        self.worker = threading.Thread(target=self.prepare, name='LoadingScreen', daemon=True)
+        self.worker.start()
+
+    def prepare(self):
+        try:
+            self.prepared = map.prepare(self.map_path, s.map_size(), self.report)
+        except Exception:
+            self.error = traceback.format_exc()
+
+    def report(self, fraction, step):
+        self.progress = (fraction, step)
+
+    def loop(self, _events, dt):
+        super().loop(_events, dt)
+        fraction, step = self.progress
+        self.label.set_text(step)
+        value = round(fraction * self.bar.points)
+        if value != self.bar.value:
+            self.bar.value = value
+        if self.worker.is_alive():
+            return
+        if self.error is None:
+            try:
+                s.load_map(self.map_path, self.prepared)
+            except Exception:
+                self.error = traceback.format_exc()
+        if self.error is not None:
+            logging.error("Error while loading map %s:\n%s", self.map_path, self.error)
+        self.done = True
@@ -1,11 +1,10 @@
-import logging
-import traceback
 import pygame
 
 import room
 import rooms
 import gui
 import resources
+import sounds
 import colors as c
 import fonts as f
 import state as s
@@ -27,18 +26,23 @@ class MapMenu(gui.LinearLayout):
         self.back_btn = gui.Button(_("Go Back"), f.MAIN, callback=self.back, layout=Layout(gravity=Gravity.BOTTOMRIGHT))
         self.add_children(self.choose_label, self.menu, self.back_btn)
 
+    def begin(self):
+        super().begin()
+        # decode what the maps will need while the player is choosing
+        for file, _map_name in resources.list_maps():
+            resources.manager.preload_map(resources.map_path(file))
+        sounds.preload()
+
     def back(self, *_):
         self.done = True
         self.next = rooms.MainMenu()
 
     def chosen(self, menu, choice):
         map_path = resources.map_path(choice)
-        try:
-            s.load_map(map_path)
-        except:
-            msg = _("Error while loading map \"%s\"! Please report this issue.\n\n%s") % (
-            map_path, traceback.format_exc())
-            logging.error(msg)
+        loading = rooms.LoadingScreen(map_path)
+        room.run_room(loading)
+        if loading.error is not None:
+            msg = _("Error while loading map \"%s\"! Please report this issue.\n\n%s") % (map_path, loading.error)
             dialog = gui.Dialog(msg, f.MONOSPACE, layout=Layout(gravity=Gravity.FILL), padding=25)
             room.run_room(dialog)
         else:
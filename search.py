@@ -0,0 +1,218 @@
+"""
+Monte Carlo tree search over the turn of a whole AI team.
+
+A step of the search is what a unit does when its turn comes: move to a tile and attack a target, or just move. The
+tree branches over which unit acts next and over the best few candidates planner.plan_unit finds for it, so it
+explores ordered sequences of steps. Battles are chance nodes: each iteration draws their outcome from the exact
+forecast distribution, and the tree only remembers the steps (open loop search).
+
+The search runs on a State: the terrain grid and the routes of a planner.Snapshot, shared by every state, plus a unit
+table and an occupancy grid which a clone shares with its original until one of the two writes to them.
+"""
+
+import logging
+import math
+import random
+import time
+
+from collections import namedtuple
+from typing import Dict, List, Optional, Set
+
+import forecast
+import planner
+import utils
+
+
+ITERATIONS = 2000  #: default iteration budget of a search
+TIME_BUDGET = 1.0  #: default time budget of a search, in seconds
+BRANCHING = 3  #: candidates of planner.plan_unit tried for each unit
+EXPLORATION = 1.4 * forecast.KILL_VALUE  #: UCT exploration constant, rewards are in health points
+
+Step = namedtuple('Step', 'unit tile target')
+Step.__doc__ = """The unit at index unit moves to tile, None to stay still, then attacks target if not None."""
+
+Stats = namedtuple('Stats', 'iterations nodes seconds')
+
+__logger = logging.getLogger(__name__)
+
+
+def nodes_per_second(stats: Stats) -> float:
+    return stats.nodes / stats.seconds if stats.seconds > 0 else float('inf')
+
+
+class State(object):
+    """
+    Copy-on-write game state.
+    """
+    __slots__ = ('grid', 'routes', 'pieces', 'occupancy', 'acted', 'shared')
+
+    def __init__(self, grid: planner.Grid, routes: Dict, pieces: List[planner.Piece], occupancy: Dict, acted: Set[int]):
+        self.grid = grid
+        self.routes = routes  #: see planner.Snapshot, shared like grid
+        self.pieces = pieces  #: planner.Piece of every unit, dead ones have coord None
+        self.occupancy = occupancy  #: coord -> index of the unit standing there
+        self.acted = acted  #: indices of the units that can't act any more this turn
+        self.shared = False  #: pieces, occupancy and acted are shared with a clone
+
+    @classmethod
+    def from_snapshot(cls, snap: planner.Snapshot, acted=()) -> 'State':
+        return cls(snap.grid, snap.routes, list(snap.pieces), {p.coord: i for i, p in enumerate(snap.pieces)},
+                   set(acted))
+
+    def clone(self) -> 'State':
+        clone = State(self.grid, self.routes, self.pieces, self.occupancy, self.acted)
+        self.shared = clone.shared = True
+        return clone
+
+    def write(self) -> None:
+        """
+        Must be called before changing pieces, occupancy or acted.
+        """
+        if self.shared:
+            self.pieces = list(self.pieces)
+            self.occupancy = dict(self.occupancy)
+            self.acted = set(self.acted)
+            self.shared = False
+
+    def snapshot(self) -> planner.Snapshot:
+        return planner.Snapshot(self.grid, tuple(self.pieces), self.routes)
+
+    def alive(self, index: int) -> bool:
+        return self.pieces[index].coord is not None
+
+    def steps(self, relation: int) -> List[Step]:
+        """
+        The steps the units of the team with relation that still have to act can take.
+        """
+        snap = self.snapshot()
+        steps = []
+        for i, piece in enumerate(self.pieces):
+            if i in self.acted or piece.relation != relation or not self.alive(i):
+                continue
+            plan = planner.plan_unit(snap, i)
+            steps += [Step(i, tile, target) for score, tile, target, kill in plan.candidates[:BRANCHING]]
+            steps.append(Step(i, plan.approach, None))
+        return steps
+
+    def battle(self, a: int, d: int, rng: Optional[random.Random]) -> None:
+        """
+        Draws the outcome of the battle between the units at indices a and d.
+        :param rng: None to take the most likely outcome instead
+        """
+        attacker, defender = self.pieces[a], self.pieces[d]
+        f = forecast.forecast(attacker.side, defender.side, utils.distance(attacker.coord, defender.coord))
+        if rng is None:
+            outcome = max(f.outcomes, key=f.outcomes.get)
+        else:
+            x = rng.random()
+            for outcome, p in f.outcomes.items():
+                x -= p
+                if x < 0:
+                    break
+        for i, health, uses in ((a, outcome[0], outcome[2]), (d, outcome[1], outcome[3])):
+            piece = self.pieces[i]
+            side = piece.side._replace(health=health)
+            if side.weapon is not None:
+                side = side._replace(weapon=side.weapon._replace(uses=uses))
+            if health <= 0:
+                del self.occupancy[piece.coord]
+                piece = piece._replace(coord=None)
+            self.pieces[i] = piece._replace(side=side)
+
+    def apply(self, step: Step, rng: Optional[random.Random]) -> None:
+        """
+        Plays a step. Parts of it that went stale in this state, because of a different battle outcome, are skipped.
+        :param rng: draws the outcome of the battle, see battle
+        """
+        self.write()
+        self.acted.add(step.unit)
+        if not self.alive(step.unit):
+            return
+        piece = self.pieces[step.unit]
+        if step.tile is not None and step.tile not in self.occupancy:
+            del self.occupancy[piece.coord]
+            self.occupancy[step.tile] = step.unit
+            piece = self.pieces[step.unit] = piece._replace(coord=step.tile)
+        if step.target is not None and self.alive(step.target):
+            min_range, max_range = forecast.weapon_range(piece.side)
+            if min_range <= utils.distance(piece.coord, self.pieces[step.target].coord) <= max_range:
+                self.battle(step.unit, step.target, rng)
+
+    def value(self, relation: int) -> float:
+        """
+        How good the state is for the team with relation: health and KILL_VALUE for every living unit of the team,
+        minus the same for its enemies.
+        """
+        total = 0
+        for piece in self.pieces:
+            if piece.relation == relation:
+                sign = 1
+            elif abs(piece.relation - relation) > 1:
+                sign = -1
+            else:
+                continue
+            if piece.coord is not None:
+                total += sign * (piece.side.health + forecast.KILL_VALUE)
+        return total
+
+
+class Node(object):
+    __slots__ = ('step', 'parent', 'children', 'untried', 'visits', 'total')
+
+    def __init__(self, step: Optional[Step], parent: Optional['Node'], untried: List[Step]):
+        self.step = step
+        self.parent = parent
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        self.total = 0.0
+
+    def select(self) -> 'Node':
+        """
+        The child with the highest upper confidence bound.
+        """
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda c: c.total / c.visits + EXPLORATION * math.sqrt(log_visits / c.visits))
+
+
+def search(state: State, relation: int, iterations: int = ITERATIONS, time_budget: float = TIME_BUDGET,
+           rng: Optional[random.Random] = None):
+    """
+    Searches the best sequence of steps for the team with relation, until either budget runs out. At least one
+    iteration is always run, so the line holds a step whenever some unit of the team can still act.
+    :return: the most visited sequence of steps and the Stats of the search
+    """
+    rng = rng or random.Random()
+    start = time.perf_counter()
+    deadline = start + time_budget
+    root = Node(None, None, state.steps(relation))
+    nodes = 1
+    i = 0
+    while i == 0 or (i < iterations and time.perf_counter() < deadline):
+        i += 1
+        node, s = root, state.clone()
+        while not node.untried and node.children:
+            node = node.select()
+            s.apply(node.step, rng)
+        if node.untried:
+            step = node.untried.pop(rng.randrange(len(node.untried)))
+            s.apply(step, rng)
+            child = Node(step, node, s.steps(relation))
+            node.children.append(child)
+            node = child
+            nodes += 1
+        reward = s.value(relation)
+        while node is not None:
+            node.visits += 1
+            node.total += reward
+            node = node.parent
+
+    line = []
+    node = root
+    while node.children:
+        node = max(node.children, key=lambda c: c.visits)
+        line.append(node.step)
+    stats = Stats(i, nodes, time.perf_counter() - start)
+    __logger.info("%d iterations, %d nodes in %.2fs: %.0f nodes/s", stats.iterations, stats.nodes, stats.seconds,
+                  nodes_per_second(stats))
+    return line, stats
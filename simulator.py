@@ -0,0 +1,143 @@
+"""
+Vectorized Monte Carlo battle simulator, for balancing units.yml and weapons.yml.
+
+Plays many battles between every attacker and every defender of two stat grids at once, with the rules of
+Unit.attack and BattleAnimation: hit and critical rolls, triple damage on critical, weapon wear and the extra attack
+of the faster unit. Stats are given as dicts of NumPy arrays with the keys of STATS, see stats_of.
+"""
+
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+import forecast
+
+
+STATS = ('health', 'strength', 'skill', 'speed', 'luck', 'defence',
+         'might', 'hit', 'crit', 'uses', 'min_range', 'max_range')  #: weapon stats are ignored when uses is 0
+MAX_ROUNDS = 4  #: longest attack_order: two attacks each
+ROLLS = 2  #: random numbers drawn by each attack: hit and critical
+
+
+def stats_of(units: Iterable) -> Dict[str, np.ndarray]:
+    """
+    Returns the stats of units as arrays, e.g. to simulate the units of units.yml.
+    """
+    sides = [forecast.side(u) for u in units]
+    stats = {name: np.array([getattr(s, name) for s in sides]) for name in forecast.Side._fields if name != 'weapon'}
+    no_weapon = forecast.Weapon(0, 0, 0, 0, 1, 1)
+    for name in forecast.Weapon._fields:
+        stats[name] = np.array([getattr(s.weapon or no_weapon, name) for s in sides])
+    return stats
+
+
+class Result(object):
+    """
+    Outcome of len(attackers) x len(defenders) matchups.
+    """
+    def __init__(self, attacker_health: np.ndarray, defender_health: np.ndarray, max_health: int):
+        samples = attacker_health.shape[2]
+        self.win_rate = (defender_health == 0).mean(axis=2)  #: how often the defender dies
+        self.loss_rate = (attacker_health == 0).mean(axis=2)  #: how often the attacker dies
+        self.defender_health = defender_health  #: final health of the defender of each matchup, in each sample
+        self.attacker_health = attacker_health
+        self.samples = samples
+        self.max_health = max_health
+
+    @staticmethod
+    def histogram(values: np.ndarray, bins: int) -> np.ndarray:
+        """
+        Counts the values along the last axis: returns an array shaped values.shape[:-1] + (bins,).
+        """
+        pairs = int(np.prod(values.shape[:-1]))
+        index = np.arange(pairs).reshape(values.shape[:-1] + (1,)) * bins + values
+        return np.bincount(index.ravel(), minlength=pairs * bins).reshape(values.shape[:-1] + (bins,))
+
+    def damage_histograms(self, initial_attacker: np.ndarray, initial_defender: np.ndarray):
+        """
+        Histograms of the damage dealt and taken by the attackers.
+        :param initial_attacker: health of the attackers at the beginning of the battles
+        :param initial_defender: health of the defenders at the beginning of the battles
+        :return: two len(attackers) x len(defenders) x (max health + 1) arrays of counts
+        """
+        dealt = initial_defender[None, :, None] - self.defender_health
+        taken = initial_attacker[:, None, None] - self.attacker_health
+        bins = self.max_health + 1
+        return self.histogram(dealt, bins), self.histogram(taken, bins)
+
+
+def attack_params(a: Dict[str, np.ndarray], d: Dict[str, np.ndarray], a_index, d_index, armed: np.ndarray):
+    """
+    Hit and critical thresholds and damage of the attacks of a on d, like Unit.attack.
+    :param a_index: index expression broadcasting a's arrays to the matchup shape
+    :param d_index: the same for d
+    :param armed: whether the attacking unit has a working weapon, in the matchup shape
+    """
+    skill, luck = a['skill'][a_index], a['luck'][a_index]
+    hit = skill * 2 + luck / 2 + np.where(armed, a['hit'][a_index], 0)
+    damage = a['strength'][a_index] + np.where(armed, a['might'][a_index], 0) - d['defence'][d_index]
+    crit = skill // 2 + np.where(armed, a['crit'][a_index], 0) - d['luck'][d_index]
+    return hit, crit, damage
+
+
+def simulate(attackers: Dict[str, np.ndarray], defenders: Dict[str, np.ndarray], distance: int = 1,
+             samples: int = 1000, rng: Optional[np.random.Generator] = None,
+             rolls: Optional[np.ndarray] = None) -> Result:
+    """
+    Plays samples battles for every attacker against every defender.
+    :param attackers: dict of len(attackers) arrays with the keys of STATS
+    :param defenders: dict of len(defenders) arrays with the keys of STATS
+    :param distance: the distance the battles are fought at
+    :param samples: battles per matchup
+    :param rng: source of the rolls, a new default generator if None
+    :param rolls: instead of rng: integers in [0, 100) shaped (MAX_ROUNDS, ROLLS, attackers, defenders, samples), the
+        hit and critical rolls of each round
+    :return: the Result
+    """
+    n, m = len(attackers['health']), len(defenders['health'])
+    shape = (n, m, samples)
+    ai, di = (slice(None), None, None), (None, slice(None), None)
+    if rolls is None:
+        rng = rng or np.random.default_rng()
+        rolls = rng.integers(0, 100, size=(MAX_ROUNDS, ROLLS) + shape)
+
+    # number_of_attacks and attack_order for every matchup
+    a_speed, d_speed = attackers['speed'][:, None], defenders['speed'][None, :]
+    a_attacks = 1 + (a_speed > d_speed)
+    d_attacks = 1 + (d_speed > a_speed)
+    a_in_range = (attackers['min_range'] <= distance) & (distance <= attackers['max_range'])
+    d_in_range = (defenders['min_range'] <= distance) & (distance <= defenders['max_range'])
+    a_attacks = np.where(a_in_range[:, None], a_attacks, 0)
+    d_attacks = np.where(d_in_range[None, :], d_attacks, 0)
+    orders = np.full((3, 3, MAX_ROUNDS), -1)
+    for i in range(3):
+        for j in range(3):
+            order = forecast.attack_order(i, j)
+            orders[i, j, :len(order)] = order
+    turns = orders[a_attacks, d_attacks]  # n x m x MAX_ROUNDS, -1 after the last round
+
+    health = [np.broadcast_to(attackers['health'][ai], shape).copy(),
+              np.broadcast_to(defenders['health'][di], shape).copy()]
+    uses = [np.broadcast_to(attackers['uses'][ai], shape).copy(),
+            np.broadcast_to(defenders['uses'][di], shape).copy()]
+    sides = [(attackers, defenders, ai, di), (defenders, attackers, di, ai)]
+
+    for r in range(MAX_ROUNDS):
+        turn = turns[:, :, r, None]
+        fighting = (health[0] > 0) & (health[1] > 0) & (turn >= 0)
+        for t in (0, 1):
+            acting = fighting & (turn == t)
+            if not acting.any():
+                continue
+            a, d, a_index, d_index = sides[t]
+            armed = uses[t] > 0
+            hit, crit, damage = attack_params(a, d, a_index, d_index, armed)
+            hits = acting & (rolls[r, 0] < hit) & (damage > 0)
+            damage = np.where(rolls[r, 1] < crit, damage * 3, damage)
+            target = health[1 - t]
+            health[1 - t] = np.where(hits, np.maximum(target - damage, 0), target)
+            uses[t] = np.where(hits & armed, uses[t] - 1, uses[t])
+
+    max_health = int(max(attackers['health'].max(), defenders['health'].max()))
+    return Result(health[0], health[1], max_health)
+
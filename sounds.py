@@ -4,13 +4,11 @@ import logging
 import random
 
 
-if not pygame.mixer.get_init():
-    pygame.mixer.init()
-
-
 __logger = logging.getLogger('Sounds')
 extensions = ['.ogg', '.wav']
-sounds = {}
+sounds = {}  # name -> path or list of paths, decoded on first use by resources.manager
+volumes = {}  # path -> volume read from the config file next to the sound
+decoded = {}  # path -> pygame.mixer.Sound, kept here so that stop reaches the playing sound even if evicted
 
 
 def parse_cfg(fpath):
@@ -20,43 +18,80 @@ def parse_cfg(fpath):
             for line in f:
                 k, v = line.split('=')
                 if k == 'volume' and 0 <= float(v) <= 1.0:
-                    sounds[fpath.stem].set_volume(float(v))
+                    volumes[fpath.with_suffix('')] = float(v)
     except FileNotFoundError:
         pass
 
 
-for f in resources.list_sounds():
-    if f.is_file() and f.suffix in extensions:
-        sounds[f.stem] = pygame.mixer.Sound(str(f))
-        parse_cfg(f.with_suffix('.cfg'))
-    elif f.is_dir():
-        sounds[f.name] = []
-        for fd in f.iterdir():
-            if fd.suffix in extensions:
-                sounds[f.name].append(pygame.mixer.Sound(str(fd)))
-                parse_cfg(fd.with_suffix('.cfg'))
+def init():
+    """
+    Initializes the mixer and indexes the sound files, the first time it's called.
+    """
+    if not pygame.mixer.get_init():
+        pygame.mixer.init()
+    if sounds:
+        return
+    for f in resources.list_sounds():
+        if f.is_file() and f.suffix in extensions:
+            sounds[f.stem] = f
+            parse_cfg(f.with_suffix('.cfg'))
+        elif f.is_dir():
+            sounds[f.name] = []
+            for fd in f.iterdir():
+                if fd.suffix in extensions:
+                    sounds[f.name].append(fd)
+                    parse_cfg(fd.with_suffix('.cfg'))
+    __logger.debug("Sounds indexed!")
+
+
+def load(path):
+    try:
+        return decoded[path]
+    except KeyError:
+        pass
+    sound = decoded[path] = resources.manager.sound(path)
+    volume = volumes.get(path.with_suffix(''))
+    if volume is not None:
+        sound.set_volume(volume)
+    return sound
+
+
+def paths():
+    """
+    Returns the paths of every sound.
+    """
+    init()
+    for v in sounds.values():
+        yield from (v if isinstance(v, list) else [v])
+
+
+def preload():
+    """
+    Decodes every sound on the resource manager's background thread.
+    """
+    resources.manager.preload('sound', paths())
 
-__logger.debug("Sounds initialized!")
 
 def play(sound, *args):
+    init()
     try:
-        sounds[sound].play(*args)
-    except AttributeError:
-        random.choice(sounds[sound]).play(*args)
+        get(sound).play(*args)
     except KeyError:
         __logger.error("Could not play sound %s: file not found.", sound)
 
 def stop(sound):
+    init()
     try:
-        sounds[sound].stop()
-    except AttributeError:
-        for s in sounds[sound]:
-            s.stop()
+        if isinstance(sounds[sound], list):
+            for path in sounds[sound]:
+                load(path).stop()
+        else:
+            load(sounds[sound]).stop()
     except KeyError:
         __logger.error("Could not stop sound %s.", sound)
 
 def get(sound):
-    if isinstance(sounds[sound], pygame.mixer.Sound):
-        return sounds[sound]
-    return random.choice(sounds[sound])
-
+    init()
+    if isinstance(sounds[sound], list):
+        return load(random.choice(sounds[sound]))
+    return load(sounds[sound])
@@ -0,0 +1,110 @@
+"""
+Startup profiler, enabled by main.py --profile-startup.
+
+Times the first import of every module and the initialization steps wrapped in section, then prints them with
+report. When it is not enabled section and mark do nothing.
+"""
+
+import importlib.abc
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+
+enabled = False
+_start = time.perf_counter()
+_imports: Dict[str, List[float]] = {}  # module name -> [cumulative seconds, self seconds]
+_sections: List[Tuple[str, float]] = []  # (name, seconds) in order of completion
+_marks: List[Tuple[str, float]] = []  # (name, seconds since start)
+_stack: List[float] = []  # children time of the modules being imported
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader):
+        self.loader = loader
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        _stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = _stack.pop()
+            if _stack:
+                _stack[-1] += elapsed
+            _imports[module.__name__] = [elapsed, elapsed - children]
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class _TimedFinder(importlib.abc.MetaPathFinder):
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+def enable() -> None:
+    """
+    Starts timing imports. Modules imported before are not reported.
+    """
+    global enabled, _start
+    if not enabled:
+        enabled = True
+        _start = time.perf_counter()
+        sys.meta_path.insert(0, _TimedFinder())
+
+
+@contextmanager
+def section(name: str):
+    """
+    Times the enclosed initialization step.
+    """
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _sections.append((name, time.perf_counter() - start))
+
+
+def mark(name: str) -> None:
+    """
+    Records the time elapsed since the profiler was enabled, e.g. when the first frame is shown.
+    """
+    if enabled:
+        _marks.append((name, time.perf_counter() - _start))
+
+
+def report(limit: int = 30, file=sys.stderr) -> None:
+    """
+    Prints the slowest imports, the initialization steps and the marks.
+    :param limit: number of imports to print
+    """
+    if not enabled:
+        return
+    print("Startup profile (ms)", file=file)
+    print("%10s %10s  %s" % ("cumulative", "self", "module"), file=file)
+    slowest = sorted(_imports.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+    for name, (cumulative, own) in slowest:
+        print("%10.1f %10.1f  %s" % (cumulative * 1000, own * 1000, name), file=file)
+    print("%10.1f %10s  all %d imports" % (sum(own for _, own in _imports.values()) * 1000, "",
+                                           len(_imports)), file=file)
+    for name, seconds in _sections:
+        print("%10.1f %10s  init: %s" % (seconds * 1000, "", name), file=file)
+    for name, seconds in _marks:
+        print("%10.1f %10s  at: %s" % (seconds * 1000, "", name), file=file)
@@ -2,7 +2,7 @@
 
 """
 
-from typing import Union
+from typing import Tuple, Union
 
 import display
 import map
@@ -14,10 +14,18 @@ units_manager: Union[None, unit.UnitsManager] = None
 winner: Union[None, unit.Team] = None
 
 
-def load_map(map_path):
+def map_size() -> Tuple[int, int]:
+    """
+    Size of the map room, the sidebar takes the rest of the window.
+    """
+    size = display.get_size()
+    return size[0]-250, size[1]
+
+
+def load_map(map_path, prepared: Union[None, map.PreparedMap] = None):
     global loaded_map, units_manager, winner
 
-    size = display.get_size()
+    w, h = map_size()
     winner = None
-    loaded_map = map.Map(map_path, w=size[0]-250, h=size[1])
+    loaded_map = map.Map(map_path, prepared, w=w, h=h)
     units_manager = loaded_map.units_manager
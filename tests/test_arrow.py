@@ -0,0 +1,86 @@
+import pygame
+
+import state  # importing the map package before state is a circular import
+
+from map.arrow import Arrow
+
+
+class TileMap(object):
+    """
+    The parts of map.TileMap an Arrow uses.
+    """
+    def __init__(self):
+        self.zoom = 1
+        self.zoom_tile_size = (8, 8)
+
+    def pixel_at(self, x, y, _):
+        return x * 8, y * 8
+
+
+def make_arrow():
+    cost = {(1, 0): 1, (2, 0): 2, (2, 1): 3, (3, 1): 1, (1, 1): 2}
+    group = pygame.sprite.Group()
+    arrow = Arrow(TileMap(), pygame.Surface((32, 32)), group, cost=cost.get)
+    return arrow, group
+
+
+def check(arrow, group):
+    assert arrow.drawn == arrow.path
+    assert len(group) == len(arrow.path)
+    for index, part in enumerate(arrow.parts):
+        assert part.image is arrow.part_at(index)
+    assert arrow.cost == sum(arrow.cost_of(coord) for coord in arrow.path)
+
+
+def test_path_grows_and_shrinks():
+    arrow, group = make_arrow()
+    arrow.set_path([], (0, 0))
+    assert arrow.take_changed() == set()
+
+    arrow.add_or_remove_coord((1, 0))
+    check(arrow, group)
+    assert arrow.take_changed() == {(1, 0)}
+    assert arrow.cost == 1
+
+    # the old head turns into a body part
+    arrow.add_or_remove_coord((2, 0))
+    check(arrow, group)
+    assert arrow.take_changed() == {(1, 0), (2, 0)}
+    assert arrow.cost == 3
+
+    arrow.add_or_remove_coord((2, 1))
+    arrow.add_or_remove_coord((3, 1))
+    check(arrow, group)
+    assert arrow.take_changed() == {(2, 0), (2, 1), (3, 1)}
+    assert arrow.cost == 7
+
+    # going back to a cell of the path drops the tail and the new head is repainted
+    arrow.add_or_remove_coord((2, 0))
+    check(arrow, group)
+    assert arrow.take_changed() == {(2, 0), (2, 1), (3, 1)}
+    assert arrow.cost == 3
+
+    arrow.add_or_remove_coord((0, 0))
+    check(arrow, group)
+    assert arrow.take_changed() == {(1, 0), (2, 0)}
+    assert arrow.cost == 0
+
+
+def test_new_source_and_zoom():
+    arrow, group = make_arrow()
+    arrow.set_path([(1, 0), (2, 0)], (0, 0))
+    arrow.take_changed()
+
+    # the same cells from another source are all drawn again
+    arrow.set_path([(1, 0), (2, 0)], (1, 1))
+    check(arrow, group)
+    assert arrow.take_changed() == {(1, 0), (2, 0)}
+    assert arrow.cost == 3
+
+    arrow.tilemap.zoom = 2
+    arrow.tilemap.zoom_tile_size = (16, 16)
+    arrow.update()
+    check(arrow, group)
+    assert arrow.take_changed() == {(1, 0), (2, 0)}
+    assert all(part.image.get_size() == (16, 16) for part in arrow.parts)
+    assert arrow.cost == 3
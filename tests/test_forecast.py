@@ -0,0 +1,35 @@
+import random
+
+import forecast
+
+
+def sample(a, d, distance, n, rng):
+    """
+    Defender health distribution by playing the battle n times with the rules of Unit.attack.
+    """
+    counts = {}
+    for _ in range(n):
+        health = [a.health, d.health]
+        uses = [a.weapon.uses if a.weapon else -1, d.weapon.uses if d.weapon else -1]
+        for turn in forecast.attack_order(*forecast.number_of_attacks(a, d, distance)):
+            if health[0] <= 0 or health[1] <= 0:
+                break
+            hit, crit, damage = forecast.attack_odds((a, d)[turn], (a, d)[1 - turn], uses[turn] > 0)
+            hit, crit = rng.randrange(0, 100) < hit * 100, rng.randrange(0, 100) < crit * 100
+            if hit and damage > 0:
+                health[1 - turn] = max(0, health[1 - turn] - (damage * 3 if crit else damage))
+                uses[turn] -= uses[turn] > 0
+        counts[health[1]] = counts.get(health[1], 0) + 1 / n
+    return counts
+
+
+def test_forecast_matches_sampling():
+    sword = forecast.Weapon(might=5, hit=70, crit=10, uses=2, min_range=1, max_range=1)
+    a = forecast.Side(health=20, strength=8, skill=6, speed=9, luck=4, defence=3, weapon=sword)
+    d = forecast.Side(health=18, strength=7, skill=5, speed=5, luck=3, defence=4, weapon=None)
+    f = forecast.forecast(a, d, 1)
+    assert abs(sum(f.outcomes.values()) - 1) < 1e-9
+    sampled = sample(a, d, 1, 20000, random.Random(0))
+    assert set(sampled) <= set(f.defender_health)
+    for health, p in f.defender_health.items():
+        assert abs(sampled.get(health, 0) - p) < 0.02, health
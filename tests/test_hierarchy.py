@@ -0,0 +1,88 @@
+import heapq
+import random
+
+import state  # importing the map package before state is a circular import
+import utils
+
+from map.hierarchy import Hierarchy
+
+
+class Tile(object):
+    def __init__(self, moves, wall):
+        self.moves = moves
+        self.wall = wall
+
+
+class Grid(object):
+    """
+    The parts of map.Map a Hierarchy uses: random terrain costs, a fifth of the tiles are walls.
+    """
+    def __init__(self, w, h, seed):
+        rng = random.Random(seed)
+        self.w, self.h = w, h
+        self.terrains = {(x, y): Tile(rng.choice((1, 1, 1, 2, 3)), rng.random() < 0.2)
+                         for y in range(h) for x in range(w)}
+
+    def __getitem__(self, coord):
+        return self.terrains[coord]
+
+    def neighbors(self, coord):
+        x, y = coord
+        return [(i, j) for i, j in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1))
+                if 0 <= i < self.w and 0 <= j < self.h]
+
+    def is_obstacle(self, coord, for_unit=None):
+        return self.terrains[coord].wall
+
+
+def shortest_cost(grid, source, target):
+    """
+    Dijkstra's algorithm, the target is reached stepping on it like in Hierarchy.shortest_path.
+    """
+    dist = {source: 0}
+    queue = [(0, source)]
+    while queue:
+        d, u = heapq.heappop(queue)
+        if u == target:
+            return d
+        if d > dist[u]:
+            continue
+        for v in grid.neighbors(u):
+            alt = d + grid[v].moves
+            if (v == target or not grid.is_obstacle(v)) and alt < dist.get(v, float('inf')):
+                dist[v] = alt
+                heapq.heappush(queue, (alt, v))
+    return None
+
+
+def check_queries(grid, hierarchy, rng, queries=40):
+    free = [coord for coord, tile in grid.terrains.items() if not tile.wall]
+    for _ in range(queries):
+        source, target = rng.sample(free, 2)
+        path = hierarchy.shortest_path(source, target)
+        best = shortest_cost(grid, source, target)
+        if best is None:
+            assert path == []
+            continue
+        assert path and path[-1] == target
+        for a, b in zip([source] + path, path):
+            assert utils.distance(a, b) == 1
+        assert not any(grid.is_obstacle(coord) for coord in path[:-1])
+        assert sum(grid[coord].moves for coord in path) <= 1.15 * best
+
+
+def test_paths_are_nearly_shortest():
+    for seed in range(3):
+        grid = Grid(64, 64, seed)
+        check_queries(grid, Hierarchy(grid, None), random.Random(seed))
+
+
+def test_paths_follow_invalidated_tiles():
+    grid = Grid(64, 64, 7)
+    hierarchy = Hierarchy(grid, None)
+    rng = random.Random(7)
+    check_queries(grid, hierarchy, rng, queries=10)
+    for coord in rng.sample(sorted(grid.terrains), 300):
+        grid.terrains[coord].wall = not grid.terrains[coord].wall
+        hierarchy.invalidate(coord)
+    check_queries(grid, hierarchy, rng)
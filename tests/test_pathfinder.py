@@ -0,0 +1,58 @@
+import pytest
+
+import state as s
+import ai
+import display
+import map as m
+import resources
+
+
+@pytest.fixture(scope='module')
+def loaded_map():
+    display.initialize()
+    path = resources.map_path('default.tmx')
+    s.load_map(path, m.prepare(path, s.map_size(), lambda *args: None))
+    return s.loaded_map
+
+
+def path_cost(_map, source, target):
+    """
+    Cost of the shortest path from source to an enemy at target: the path stops next to it, then steps on it.
+    """
+    path = _map.path.shortest_path(source, target)
+    assert target in _map.neighbors(path[-1] if path else source)
+    return sum(_map[coord].moves for coord in path) + _map[target].moves
+
+
+def test_distances_to_matches_shortest_path(loaded_map):
+    units = s.units_manager.units
+    for unit in units:
+        enemies = [e.coord for e in units if s.units_manager.are_enemies(unit, e)]
+        distances = loaded_map.path.distances_to(unit.coord, enemies)
+        assert sorted(coord for cost, coord in distances) == sorted(enemies)
+        assert [cost for cost, coord in distances] == sorted(cost for cost, coord in distances)
+        for cost, coord in distances:
+            assert cost == path_cost(loaded_map, unit.coord, coord)
+
+
+def test_nearest_sources_matches_shortest_path(loaded_map):
+    units = s.units_manager.units
+    team = units[-1].team
+    ours = [u.coord for u in team.units]
+    enemies = [e.coord for e in s.units_manager.get_enemies(team)]
+    nearest = loaded_map.path.nearest_sources(ours, enemies)
+    assert sorted(nearest) == sorted(enemies)
+    for enemy, (cost, source) in nearest.items():
+        assert source in ours
+        assert cost == path_cost(loaded_map, source, enemy)
+        assert cost == min(path_cost(loaded_map, coord, enemy) for coord in ours)
+
+
+def test_planning_order_puts_the_nearest_units_first(loaded_map):
+    units = s.units_manager.units
+    team = next(t for t in s.units_manager.teams if isinstance(t, ai.AI))
+    enemies = [e.coord for e in s.units_manager.get_enemies(team)]
+    order = team.planning_order(units, team.nearest_enemies())
+    assert len(order) == len(team.units) and {units[i] for i in order} == set(team.units)
+    costs = [loaded_map.path.distances_to(units[i].coord, enemies)[0][0] for i in order]
+    assert costs == sorted(costs)
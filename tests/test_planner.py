@@ -0,0 +1,25 @@
+import forecast
+import planner
+
+
+def corridor(routes):
+    """
+    A soldier at the left end of a 40x5 field, its enemy at the right end, out of reach.
+    """
+    w, h = 40, 5
+    grid = planner.Grid(w, h, (1,) * (w * h), {'earth': (True,) * (w * h)}, (0,) * (w * h))
+    side = forecast.Side(20, 6, 6, 5, 3, 2, forecast.Weapon(5, 90, 0, 40, 1, 1))
+    pieces = (planner.Piece((0, 2), 0, 4, 'earth', side, 10, 5.0),
+              planner.Piece((39, 2), 3, 4, 'earth', side, 10, 5.0))
+    return planner.Snapshot(grid, pieces, routes)
+
+
+def test_approach_along_the_shortest_path():
+    plan = planner.plan_unit(corridor({}), 0)
+    assert plan.candidates == [] and plan.approach == (4, 2)
+
+
+def test_approach_along_the_route():
+    route = ((0, 1), (0, 0), (1, 0), (2, 0), (3, 0)) + tuple((x, 0) for x in range(4, 39))
+    plan = planner.plan_unit(corridor({0: route}), 0)
+    assert plan.approach == (2, 0)
@@ -0,0 +1,52 @@
+import pytest
+
+import display
+import fonts as f
+import gui
+import room
+
+
+class Layout(gui.LinearLayout):
+    def __init__(self, laid_out, **kwargs):
+        super().__init__(**kwargs)
+        self.laid_out = laid_out
+
+    def layout_children(self, rect):
+        self.laid_out.append(self)
+        super().layout_children(rect)
+
+
+@pytest.fixture
+def tree():
+    display.initialize()
+    laid_out = []
+    outer, inner = Layout(laid_out), Layout(laid_out)
+    fixed = gui.Label("abc", f.SMALL, layout=room.Layout(width=300, height=40))
+    wrap = gui.Label("abc", f.SMALL)
+    inner.add_child(fixed)
+    inner.add_child(wrap)
+    outer.add_child(inner)
+    outer.add_child(gui.Label("sibling", f.SMALL))
+    outer.root = True
+    room.draw_room(outer, first_draw=True)
+    laid_out.clear()
+    return outer, inner, fixed, wrap, laid_out
+
+
+def test_same_size_relayout_stops_at_the_child(tree):
+    outer, inner, fixed, wrap, laid_out = tree
+    fixed.set_text("a longer text")
+    fixed.layout_request()
+    room.draw_room(outer)
+    assert room.measured_rooms == 1
+    assert laid_out == []
+    assert fixed.layout.valid and not outer.layout_pending
+
+
+def test_new_size_relayouts_the_parent(tree):
+    outer, inner, fixed, wrap, laid_out = tree
+    width = wrap.rect.w
+    wrap.set_text("a much longer text")
+    room.draw_room(outer)
+    assert wrap.rect.w > width
+    assert laid_out == [inner]  # inner keeps its size, outer is left alone
@@ -0,0 +1,37 @@
+import random
+
+import forecast
+import planner
+import search
+
+
+def skirmish(w=8, h=8):
+    """
+    Two soldiers against two on an open field.
+    """
+    grid = planner.Grid(w, h, (1,) * (w * h), {'earth': (True,) * (w * h)}, (0,) * (w * h))
+    sword = forecast.Weapon(5, 90, 0, 40, 1, 1)
+    side = forecast.Side(20, 6, 6, 5, 3, 2, sword)
+    coords = [(1, 1), (1, 3), (4, 1), (4, 3)]
+    pieces = tuple(planner.Piece(coord, 0 if i < 2 else 3, 4, 'earth', side, 10, 5.0) for i, coord in enumerate(coords))
+    return planner.Snapshot(grid, pieces, {})
+
+
+def test_search_finds_a_step():
+    state = search.State.from_snapshot(skirmish())
+    line, stats = search.search(state, 0, iterations=200, time_budget=5, rng=random.Random(0))
+    assert line and line[0].unit in (0, 1)
+    assert stats.iterations == 200
+
+
+def test_search_without_budget_runs_one_iteration():
+    state = search.State.from_snapshot(skirmish())
+    line, stats = search.search(state, 0, time_budget=0, rng=random.Random(0))
+    assert stats.iterations == 1
+    assert len(line) == 1 and line[0].unit in (0, 1)
+
+
+def test_search_without_iterations_runs_one():
+    state = search.State.from_snapshot(skirmish())
+    line, stats = search.search(state, 0, iterations=0)
+    assert stats.iterations == 1 and line
@@ -0,0 +1,44 @@
+import contextlib
+import io
+import random
+
+import numpy as np
+
+import state  # importing unit before state is a circular import
+import forecast
+import item
+import simulator
+import unit
+
+
+def test_simulate_matches_unit_attack():
+    """
+    Plays random battles with Unit.attack and with simulate, feeding both the same random numbers, and checks that
+    they end the same way.
+    """
+    battles, seed = 200, 0
+    random.seed(seed)
+    for b in range(battles):
+        a, d = unit.RandomUnitFactory.make_unit(), unit.RandomUnitFactory.make_unit()
+        a.coord, d.coord = (0, 0), (1, 0)
+        for u in (a, d):
+            if random.random() < 0.8:
+                weapon = item.Sword('Test', 0, random.randint(0, 10), 1, random.randint(40, 100),
+                                    random.randint(0, 30), {'min': 1, 'max': 1}, random.randint(1, 3), 0, 0, None)
+                u.wrank['Sword'] = 0
+                u.give_weapon(weapon)
+        stats = simulator.stats_of([a]), simulator.stats_of([d])
+
+        battle_seed = seed * battles + b
+        random.seed(battle_seed)
+        rolls = np.array([random.randrange(0, 100) for _ in range(simulator.MAX_ROUNDS * simulator.ROLLS)])
+        rolls = rolls.reshape((simulator.MAX_ROUNDS, simulator.ROLLS, 1, 1, 1))
+        result = simulator.simulate(*stats, distance=1, samples=1, rolls=rolls)
+
+        random.seed(battle_seed)
+        with contextlib.redirect_stdout(io.StringIO()):  # Unit.attack prints every blow
+            for turn in forecast.attack_order(*a.number_of_attacks(d)):
+                if a.health <= 0 or d.health <= 0:
+                    break
+                (a, d)[turn].attack((a, d)[1 - turn])
+        assert (a.health, d.health) == (result.attacker_health[0, 0, 0], result.defender_health[0, 0, 0]), b
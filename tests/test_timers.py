@@ -0,0 +1,34 @@
+import events
+import timers
+
+
+def test_suspended_timers_do_not_fire():
+    fired = []
+    outer = events.new_timer(10, fired.append)
+    events.suspend_timers()
+    inner = events.new_timer(10, fired.append)
+    events.wheel.advance(100)
+    assert fired == [inner]
+    events.resume_timers()
+    events.wheel.advance(100)
+    assert fired == [inner, outer]
+
+
+def test_stop_suspended_timer():
+    fired = []
+    outer = events.new_timer(10, fired.append)
+    events.suspend_timers()
+    events.stop_timer(outer)
+    events.resume_timers()
+    assert not outer.active and len(events.wheel) == 0
+    events.wheel.advance(100)
+    assert fired == []
+
+
+def test_stop_cascaded_timer():
+    wheel = timers.TimerWheel()
+    timer = wheel.schedule(100000, print)
+    wheel.advance(50000)  # cascaded down to a lower wheel
+    assert timer in wheel and timer not in timers.TimerWheel()
+    wheel.cancel(timer)
+    assert timer not in wheel and not timer.active and len(wheel) == 0
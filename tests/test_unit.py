@@ -0,0 +1,44 @@
+import random
+import types
+
+import numpy as np
+
+import state  # importing unit before state is a circular import
+import item
+import planner
+import unit
+import utils
+
+
+def armed_units(n, seed):
+    random.seed(seed)
+    units = [unit.RandomUnitFactory.make_unit() for _ in range(n)]
+    for u in units:
+        u.coord = (random.randrange(6), random.randrange(6))
+        if random.random() < 0.8:
+            min_range = random.randint(1, 2)
+            weapon = item.Sword('Test', 0, random.randint(0, 10), 1, random.randint(40, 100), random.randint(0, 30),
+                                {'min': min_range, 'max': random.randint(min_range, 3)}, 5, 0, 0, None)
+            u.wrank['Sword'] = 0
+            u.give_weapon(weapon)
+    return units
+
+
+def test_number_of_attacks_matches_unit():
+    units = armed_units(12, seed=0)
+    distances = np.array([[utils.distance(a.coord, d.coord) for d in units] for a in units])
+    a_attacks, d_attacks = unit.table.number_of_attacks(units, units, distances)
+    for i, a in enumerate(units):
+        for j, d in enumerate(units):
+            assert (a_attacks[i, j], d_attacks[i, j]) == a.number_of_attacks(d), (a, d)
+
+
+def test_threats_ignore_allies():
+    units = armed_units(6, seed=1)
+    for i, u in enumerate(units):
+        u.team = types.SimpleNamespace(relation=0 if i < 3 else 3)
+    threat = planner.threats(unit.table, units)
+    for i, u in enumerate(units):
+        enemies = units[3:] if i < 3 else units[:3]
+        distances = np.full((1, 3), u.get_weapon_range()[0])
+        assert threat[i] == unit.table.expected_damage([u], enemies, distances).max()
@@ -0,0 +1,157 @@
+"""
+Hierarchical timer wheel used to implement Room.set_timeout and Room.set_interval without pygame's timers.
+
+Timers are kept in LEVELS wheels of SLOTS slots each. The first wheel has a slot for each of the next SLOTS ticks,
+every other wheel has a slot for SLOTS times the range of a slot of the previous one. When the first wheel wraps
+around, the timers in the current slot of the next wheel are cascaded down. Adding, cancelling and expiring a timer
+are O(1), cascading is amortized O(1) per timer.
+"""
+
+import logging
+from typing import Callable, Dict, List, Union
+
+
+TICK = 10  #: resolution of the wheel in milliseconds
+BITS = 6
+SLOTS = 1 << BITS
+MASK = SLOTS - 1
+LEVELS = 4
+MAX_TICKS = (1 << (BITS * LEVELS)) - 1  #: timers further in the future are clamped to this number of ticks
+
+
+class Timer(object):
+    """
+    A timer scheduled on a :class:`TimerWheel`. Use TimerWheel.cancel to stop it.
+    """
+    __slots__ = ('expires', 'interval', 'callback', 'slot', 'wheel')
+
+    def __init__(self, expires: int, interval: Union[int, None], callback: Callable):
+        self.expires: int = expires  #: tick at which the callback gets called
+        self.interval: Union[int, None] = interval  #: None for one-shot timers, period in ticks otherwise
+        self.callback: Callable = callback
+        self.slot: Union[Dict['Timer', None], None] = None  #: the slot containing this timer
+        self.wheel: Union['TimerWheel', None] = None  #: the wheel the timer is scheduled on
+
+    @property
+    def active(self) -> bool:
+        """
+        True if the timer is scheduled.
+        """
+        return self.slot is not None
+
+    def __repr__(self) -> str:
+        return "<Timer expires: %s interval: %s active: %s>" % (self.expires, self.interval, self.active)
+
+
+class TimerWheel(object):
+    """
+    Keeps timers and calls their callback when the time they were scheduled for has been reached by advance.
+    """
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.wheels: List[List[Dict[Timer, None]]] = [[{} for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self.jiffies: int = 0  #: the next tick to process
+        self.remainder: int = 0  #: milliseconds elapsed since the last processed tick
+        self.count: int = 0  #: number of scheduled timers
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, timer: Timer) -> bool:
+        """
+        True if timer is scheduled on this wheel.
+        """
+        return timer.wheel is self
+
+    def schedule(self, time: int, callback: Callable, repeat: bool = False) -> Timer:
+        """
+        Schedules a new timer.
+        :param time: milliseconds after which callback is called
+        :param callback: function called with the Timer as only argument
+        :param repeat: if True callback is called every time milliseconds until the timer is cancelled
+        :return: the new Timer
+        """
+        ticks = max(1, -(-time // TICK))
+        timer = Timer(self.jiffies + ticks, ticks if repeat else None, callback)
+        self._add(timer)
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        """
+        Stops a timer. Cancelling an expired or already cancelled timer does nothing.
+        """
+        if timer.slot is not None:
+            del timer.slot[timer]
+            timer.slot = None
+            timer.wheel = None
+            self.count -= 1
+
+    def _add(self, timer: Timer) -> None:
+        delta = min(timer.expires - self.jiffies, MAX_TICKS)
+        if delta < 0:
+            # already expired: run it as soon as possible
+            level, index = 0, self.jiffies & MASK
+        else:
+            expires = self.jiffies + delta
+            level = 0
+            while delta >= 1 << (BITS * (level + 1)):
+                level += 1
+            index = (expires >> (BITS * level)) & MASK
+        timer.slot = self.wheels[level][index]
+        timer.slot[timer] = None
+        timer.wheel = self
+        self.count += 1
+
+    def _cascade(self, level: int, index: int) -> None:
+        slot = self.wheels[level][index]
+        timers = list(slot)
+        slot.clear()
+        for timer in timers:
+            timer.slot = None
+            self.count -= 1
+            self._add(timer)
+
+    def _tick(self) -> None:
+        index = self.jiffies & MASK
+        level = 1
+        while index == 0 and level < LEVELS:
+            index = (self.jiffies >> (BITS * level)) & MASK
+            self._cascade(level, index)
+            level += 1
+        slot = self.wheels[0][self.jiffies & MASK]
+        while slot:
+            timer = next(iter(slot))
+            self.cancel(timer)
+            if timer.interval is not None:
+                timer.expires = self.jiffies + timer.interval
+                self._add(timer)
+            timer.callback(timer)
+        self.jiffies += 1
+
+    def advance(self, dt: int) -> None:
+        """
+        Makes time go forward, calling the callbacks of every expired timer.
+        :param dt: elapsed milliseconds
+        """
+        self.remainder += dt
+        ticks, self.remainder = divmod(self.remainder, TICK)
+        if self.count == 0:
+            self.jiffies += ticks
+            return
+        for _ in range(ticks):
+            self._tick()
+
+    def next_expiry(self) -> Union[int, None]:
+        """
+        Returns how many milliseconds can pass before advance has something to do.
+
+        The result is exact for timers in the first wheel, otherwise it is the time until the next cascade.
+        :return: milliseconds or None if there are no timers.
+        """
+        if self.count == 0:
+            return None
+        index = self.jiffies & MASK
+        for ticks in range(SLOTS - index):
+            if self.wheels[0][index + ticks]:
+                break
+        return max(0, (ticks + 1) * TICK - self.remainder)
@@ -101,12 +101,12 @@ class Tileset(object):
         self.properties = {}
 
     @classmethod
-    def fromxml(cls, tag, pwd, firstgid=None):
+    def fromxml(cls, tag, pwd, firstgid=None, convert=True):
         if 'source' in tag.attrib:
             firstgid = int(tag.attrib['firstgid'])
             with open(os.path.join(pwd, tag.attrib['source'])) as f:
                 tileset = ElementTree.fromstring(f.read())
-            return cls.fromxml(tileset, pwd, firstgid)
+            return cls.fromxml(tileset, pwd, firstgid, convert)
 
         name = tag.attrib['name']
         if firstgid is None:
@@ -121,14 +121,16 @@ class Tileset(object):
             if c.tag == "image":
                 # create a tileset
                 filename = os.path.join(pwd, c.attrib['source'])
-                tileset.add_image(filename)
+                tileset.add_image(filename, convert)
             elif c.tag == 'tile':
                 gid = tileset.firstgid + int(c.attrib['id'])
                 tileset.get_tile(gid).loadxml(c)
         return tileset
 
-    def add_image(self, file):
-        image = pygame.image.load(file).convert_alpha()
+    def add_image(self, file, convert=True):
+        image = pygame.image.load(file)
+        if convert:
+            image = image.convert_alpha()
         if not image:
             sys.exit("Error creating new Tileset: file %s not found" % file)
         id = self.firstgid
@@ -743,6 +745,7 @@ class TileMap(object):
         self.view_x, self.view_y = origin   # viewport offset
         self.viewport = Rect(origin, size)
         self.zoom = 1
+        self.grid_lines = (None, None, None)  # (size, horizontal line, vertical line)
         self.set_focus(self.view_w // 2, self.view_h // 2)
 
     def set_zoom(self, zoom, fx, fy):
@@ -764,17 +767,50 @@ class TileMap(object):
         for layer in self.layers:
             if layer.visible:
                 layer.draw(screen)
-        horizontal_line = pygame.Surface((self.zoom_px_width, 2))
-        horizontal_line.set_alpha(100)
-        vertical_line = pygame.Surface((2, self.zoom_px_height))
-        vertical_line.set_alpha(100)
+        self.draw_grid(screen, self.childs_ox, self.childs_oy)
+
+    def draw_area(self, screen, area):
+        '''Draw only the screen-space Rect area of the viewport to the Surface.
+
+        The view of every layer is temporarily restricted to area, so only the
+        cells falling in it are visited.
+        '''
+        area = area.clip(screen.get_rect())
+        if not area.w or not area.h:
+            return
+        sub = screen.subsurface(area)
+        x, y = self.viewport.x + area.x, self.viewport.y + area.y
+        for layer in self.layers:
+            if layer.visible:
+                view = layer.view_x, layer.view_y, layer.view_w, layer.view_h
+                layer.view_x, layer.view_y, layer.view_w, layer.view_h = x, y, area.w, area.h
+                layer.position = (x, y)
+                layer.draw(sub)
+                layer.view_x, layer.view_y, layer.view_w, layer.view_h = view
+                layer.position = view[:2]
+        self.draw_grid(sub, self.childs_ox + area.x, self.childs_oy + area.y)
+
+    def draw_grid(self, screen, ox, oy):
+        key = self.zoom_px_width, self.zoom_px_height
+        if self.grid_lines[0] != key:
+            horizontal_line = pygame.Surface((self.zoom_px_width, 2))
+            horizontal_line.set_alpha(100)
+            vertical_line = pygame.Surface((2, self.zoom_px_height))
+            vertical_line.set_alpha(100)
+            self.grid_lines = key, horizontal_line, vertical_line
+        _, horizontal_line, vertical_line = self.grid_lines
+        w, h = screen.get_size()
         for i in range(1, self.width):
-             screen.blit(vertical_line, (-self.childs_ox + i * self.zoom_tile_width - 1, -self.childs_oy))
+            x = -ox + i * self.zoom_tile_width - 1
+            if -2 < x < w:
+                screen.blit(vertical_line, (x, -oy))
         for j in range(1, self.height):
-             screen.blit(horizontal_line, (-self.childs_ox, -self.childs_oy + j * self.zoom_tile_height - 1))
+            y = -oy + j * self.zoom_tile_height - 1
+            if -2 < y < h:
+                screen.blit(horizontal_line, (-ox, y))
 
     @classmethod
-    def load(cls, filename, viewport, origin=(0, 0)):
+    def load(cls, filename, viewport, origin=(0, 0), convert=True):
         with open(filename) as f:
             map = ElementTree.fromstring(f.read())
 
@@ -790,7 +826,7 @@ class TileMap(object):
         tilemap.px_size = Point((tilemap.px_width, tilemap.px_height))
 
         for tag in map.findall('tileset'):
-            tilemap.tilesets.add(Tileset.fromxml(tag, os.path.dirname(filename)))
+            tilemap.tilesets.add(Tileset.fromxml(tag, os.path.dirname(filename), convert=convert))
 
         for tag in map.findall('layer'):
             layer = Layer.fromxml(tag, tilemap)
@@ -802,6 +838,23 @@ class TileMap(object):
 
         return tilemap
 
+    def convert(self):
+        '''Convert the tileset images of a map loaded with convert=False for
+        fast blitting. Must be called from the main thread once the display
+        mode is set.
+        '''
+        converted = {}  # id of the tileset image -> (tileset image, converted image)
+        for tile in self.tilesets.values():
+            parent = tile.surface.get_parent()
+            if parent is None:
+                tile.surface = tile.surface.convert_alpha()
+            else:
+                if id(parent) not in converted:
+                    converted[id(parent)] = parent, parent.convert_alpha()
+                rect = Rect(tile.surface.get_offset(), tile.surface.get_size())
+                tile.surface = converted[id(parent)][1].subsurface(rect)
+            tile.scaled, tile.zoom = tile.surface, 1
+
     def set_focus(self, fx, fy):
         '''Determine the viewport based on a desired focus pixel in the
         Layer space (fx, fy) and honoring any bounding restrictions of
@@ -930,8 +983,8 @@ class TileMap(object):
             return self.pixel_to_screen(sx, sy)
         return Point((sx, sy))
 
-def load(filename, viewport, origin=(0, 0)):
-    return TileMap.load(filename, viewport, origin)
+def load(filename, viewport, origin=(0, 0), convert=True):
+    return TileMap.load(filename, viewport, origin, convert)
 
 if __name__ == '__main__':
     pygame.init()
@@ -22,19 +22,22 @@
 import pygame
 import random
 import logging
-from quantum import Quantum
+import numpy as np
 
 import utils
 import resources
 import string
 
-from typing import Tuple, List, Dict, Optional
+from typing import Tuple, List, Dict, Optional, TYPE_CHECKING
 from gettext import gettext as _
 from abc import ABC, abstractmethod
 
 #NEW
 import state as s
 
+if TYPE_CHECKING:
+    from quantum import Quantum  # imports qiskit, which is slow
+
 Coord = Tuple[int, int]
 
 
@@ -169,34 +172,199 @@ class WindAffinity(ElementalAffinity):
     DESCRIPTION = _("")
 
 
+STATS = ('health', 'health_max', 'health_prev', 'level', 'level_prev', 'experience', 'exp_prev', 'strength', 'skill',
+         'speed', 'luck', 'defence', 'resistance', 'movement', 'constitution', 'aid')  #: columns of UnitTable
+
+
+class UnitTable(object):
+    """
+    Stores the stats of many units in NumPy columns, one row per unit, so that they can be compared all at once.
+
+    Unit reads and writes its stats through its row. Rows of units moved to another table are reused.
+    """
+    def __init__(self, capacity: int = 32):
+        self.columns: Dict[str, np.ndarray] = {name: np.zeros(capacity, dtype=np.int64) for name in STATS}
+        self.units: List[Optional['Unit']] = []  # row -> unit
+        self.free: List[int] = []  # released rows
+
+    def __len__(self) -> int:
+        return len(self.units) - len(self.free)
+
+    def add(self, unit: 'Unit') -> int:
+        """
+        Allocates a row for unit, zeroed.
+        :return: the row
+        """
+        if self.free:
+            row = self.free.pop()
+            self.units[row] = unit
+        else:
+            row = len(self.units)
+            self.units.append(unit)
+            capacity = len(self.columns['health'])
+            if row >= capacity:
+                for name, column in self.columns.items():
+                    self.columns[name] = np.concatenate((column, np.zeros(capacity, dtype=column.dtype)))
+        for column in self.columns.values():
+            column[row] = 0
+        return row
+
+    def release(self, row: int) -> None:
+        self.units[row] = None
+        self.free.append(row)
+
+    def rows(self, units: List['Unit']) -> np.ndarray:
+        """
+        Returns the rows of units, which must be in this table.
+        """
+        assert all(u.table is self for u in units)
+        return np.fromiter((u.row for u in units), dtype=np.intp, count=len(units))
+
+    def column(self, name: str, rows: np.ndarray) -> np.ndarray:
+        return self.columns[name][rows]
+
+    def weapons(self, units: List['Unit']) -> Dict[str, np.ndarray]:
+        """
+        Returns the stats of the active weapons of units as arrays: might, hit, crit, uses, min_range and max_range.
+        Unarmed units, or units whose weapon is broken, get zeros and a range of 1.
+        """
+        arrays = {name: np.zeros(len(units), dtype=np.int64) for name in ('might', 'hit', 'crit', 'uses')}
+        arrays['min_range'] = np.ones(len(units), dtype=np.int64)
+        arrays['max_range'] = np.ones(len(units), dtype=np.int64)
+        for i, u in enumerate(units):
+            w = u.weapon
+            if w is not None:
+                arrays['min_range'][i], arrays['max_range'][i] = w.min_range, w.max_range
+                if w.uses != 0:
+                    arrays['might'][i], arrays['hit'][i], arrays['crit'][i] = w.might, w.hit, w.crit
+                    arrays['uses'][i] = w.uses
+        arrays['armed'] = np.array([u.weapon is not None and u.weapon.uses != 0 for u in units], dtype=bool)
+        return arrays
+
+    def values(self, units: List['Unit']) -> np.ndarray:
+        """
+        Vectorized Unit.value.
+        """
+        rows = self.rows(units)
+        c = self.columns
+        return (c['health'][rows] + c['strength'][rows] + c['skill'][rows] + c['speed'][rows] + c['luck'][rows]
+                + c['defence'][rows])
+
+    def combat(self, attackers: List['Unit'], defenders: List['Unit']) -> Dict[str, np.ndarray]:
+        """
+        Computes what Unit.attack would use for every attacker against every defender.
+        :return: len(attackers) x len(defenders) arrays: damage, hit (percent, may be fractional) and crit (percent)
+        """
+        a, d = self.rows(attackers), self.rows(defenders)
+        c = self.columns
+        w = self.weapons(attackers)
+        skill, luck = c['skill'][a][:, None], c['luck'][a][:, None]
+        damage = (c['strength'][a] + w['might'])[:, None] - c['defence'][d][None, :]
+        hit = skill * 2 + w['hit'][:, None] + luck / 2  # weapon hit is 0 when unarmed
+        crit = skill // 2 + w['crit'][:, None] - c['luck'][d][None, :]
+        shape = (len(attackers), len(defenders))
+        return {'damage': damage, 'hit': np.broadcast_to(hit, shape), 'crit': crit}
+
+    def number_of_attacks(self, attackers: List['Unit'], defenders: List['Unit'],
+                          distances: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized Unit.number_of_attacks.
+        :param distances: len(attackers) x len(defenders) array of the distances the battles are fought at
+        :return: two len(attackers) x len(defenders) arrays: attacks of the attackers and of the defenders
+        """
+        a, d = self.rows(attackers), self.rows(defenders)
+        a_speed, d_speed = self.columns['speed'][a][:, None], self.columns['speed'][d][None, :]
+        a_attacks = 1 + (a_speed > d_speed)
+        d_attacks = 1 + (d_speed > a_speed)
+        aw, dw = self.weapons(attackers), self.weapons(defenders)
+        a_attacks = np.where((aw['min_range'][:, None] <= distances) & (distances <= aw['max_range'][:, None]),
+                             a_attacks, 0)
+        d_attacks = np.where((dw['min_range'][None, :] <= distances) & (distances <= dw['max_range'][None, :]),
+                             d_attacks, 0)
+        return a_attacks, d_attacks
+
+    def expected_damage(self, attackers: List['Unit'], defenders: List['Unit'], distances: np.ndarray) -> np.ndarray:
+        """
+        Expected damage every attacker deals to every defender in a battle, ignoring deaths and weapon breaks:
+        a cheap threat estimate.
+        """
+        combat = self.combat(attackers, defenders)
+        attacks, _ = self.number_of_attacks(attackers, defenders, distances)
+        hit = np.clip(np.ceil(combat['hit']), 0, 100) / 100
+        crit = np.clip(combat['crit'], 0, 100) / 100
+        damage = np.maximum(combat['damage'], 0)
+        return attacks * hit * damage * (1 + 2 * crit)
+
+
+table = UnitTable()  #: default table of new units, UnitsManager moves the units of a map to their own table
+
+
+def _stat(name: str) -> property:
+    def fget(self):
+        return int(self.table.columns[name][self.row])
+
+    def fset(self, value):
+        self.table.columns[name][self.row] = value
+
+    return property(fget, fset)
+
+
 class Unit(object):
     """
     This class is a unit with stats
+
+    Numeric stats (see STATS) live in a row of a UnitTable.
     """
+    __slots__ = ('name', 'affinity', 'condition', 'wrank', 'items', 'played', 'team', 'coord', 'modified', 'entangled',
+                 '_true_image', '_image', 'table', 'row')
+
     entangled_image = None
     isEntangled = False
 
+    MOVEMENT_CLASS = 'earth'  #: units of the same class share the grids of map.Map.movement_costs
     ALLOWED_TERRAINS = ['earth']
 
+    #: attributes available to format strings, see as_dict
+    fields = STATS + ('name', 'affinity', 'wrank', 'items', 'played', 'coord')
+
+    health       = _stat('health')        # current health
+    health_max   = _stat('health_max')    # maximum health
+    health_prev  = _stat('health_prev')   # HP before an attack
+    level        = _stat('level')         # level
+    level_prev   = _stat('level_prev')
+    experience   = _stat('experience')    # experience
+    exp_prev     = _stat('exp_prev')
+    strength     = _stat('strength')      # strength determines the damage inflicted to the enemy
+    skill        = _stat('skill')         # skill chance of hitting the enemy
+    speed        = _stat('speed')         # speed chance to avoid enemy's attack
+    luck         = _stat('luck')          # luck influences many things
+    defence      = _stat('defence')       # defence reduces physical damages
+    resistance   = _stat('resistance')    # resistance reduces magical damages
+    movement     = _stat('movement')      # movement determines how far the unit can move in a turn
+    constitution = _stat('constitution')  # constitution, or physical size. affects rescues.
+    aid          = _stat('aid')           # max rescuing constitution. units with lower con can be rescued.
+
     def __init__(self, name, health, level, experience, strength, skill, speed, luck, defence, resistance, movement,
                  constitution, aid, affinity, wrank, health_max=None):
+        self.table        = table
+        self.row          = table.add(self)
         self.name         = str(name)          # name of the Unit
-        self.health       = int(health)        # current health
-        self.health_max   = health_max if health_max else self.health  # maximum health
-        self.health_prev  = health             # HP before an attack
-        self.level        = int(level)         # level
+        self.health       = int(health)
+        self.health_max   = health_max if health_max else self.health
+        self.health_prev  = health
+        self.level        = int(level)
         self.level_prev   = self.level
-        self.experience   = int(experience)    # experience
+        self.experience   = int(experience)
         self.exp_prev     = experience
-        self.strength     = int(strength)      # strength determines the damage inflicted to the enemy
-        self.skill        = int(skill)         # skill chance of hitting the enemy
-        self.speed        = int(speed)         # speed chance to avoid enemy's attack
-        self.luck         = int(luck)          # luck influences many things
-        self.defence      = int(defence)       # defence reduces physical damages
-        self.resistance   = int(resistance)    # resistance reduces magical damages
-        self.movement     = int(movement)      # movement determines how far the unit can move in a turn
-        self.constitution = int(constitution)  # constitution, or physical size. affects rescues.
-        self.aid          = int(aid)           # max rescuing constitution. units with lower con can be rescued.
+        self.strength     = int(strength)
+        self.skill        = int(skill)
+        self.speed        = int(speed)
+        self.luck         = int(luck)
+        self.defence      = int(defence)
+        self.resistance   = int(resistance)
+        self.movement     = int(movement)
+        self.constitution = int(constitution)
+        self.aid          = int(aid)
         self.affinity     = affinity           # elemental affinity. determines compatibility with other units.
         self.condition    = NormalHealthCondition(self)
         self.wrank        = wrank              # weapons' levels.
@@ -207,17 +375,57 @@ class Unit(object):
         self.modified     = True
 
         #NEW
-        self.entangled: Quantum    = None # what other ally the unit is entangled with
+        self.entangled: 'Quantum'  = None # what other ally the unit is entangled with
 
 
-        try:
-            self.trueImage = resources.load_sprite(self.name).convert_alpha()
-            new_size = utils.resize_keep_ratio(self.trueImage.get_size(), (200, 200))
-            self.trueImage = pygame.transform.smoothscale(self.trueImage, new_size)
-        except FileNotFoundError:
-            logging.warning("Couldn't load %s! Loading default image", self.name)
-            self.trueImage = resources.load_sprite('no_image.png').convert_alpha()
-        self.image = self.trueImage
+        self._true_image = None  # loaded on first use, so that units can be built off the main thread
+        self._image = None
+
+    def move_to_table(self, new_table: UnitTable) -> None:
+        """
+        Moves the stats of the unit to a row of another table.
+        """
+        if new_table is self.table:
+            return
+        row = new_table.add(self)
+        for name, column in self.table.columns.items():
+            new_table.columns[name][row] = column[self.row]
+        self.table.release(self.row)
+        self.table, self.row = new_table, row
+
+    def as_dict(self) -> Dict[str, object]:
+        """
+        Returns the fields of the unit, e.g. for str.format_map.
+        """
+        return {name: getattr(self, name) for name in self.fields}
+
+    @property
+    def trueImage(self) -> pygame.Surface:
+        """
+        The portrait of the unit.
+        """
+        if self._true_image is None:
+            try:
+                image = resources.load_sprite(self.name)
+                new_size = utils.resize_keep_ratio(image.get_size(), (200, 200))
+                if new_size != image.get_size():  # atlas sprites are already resized
+                    image = pygame.transform.smoothscale(image, new_size)
+            except FileNotFoundError:
+                logging.warning("Couldn't load %s! Loading default image", self.name)
+                image = resources.load_sprite('no_image.png')
+            self._true_image = image
+        return self._true_image
+
+    @property
+    def image(self) -> pygame.Surface:
+        """
+        The image the unit is drawn with, the portrait unless replaced.
+        """
+        return self.trueImage if self._image is None else self._image
+
+    @image.setter
+    def image(self, image: pygame.Surface) -> None:
+        self._image = image
 
     def __repr__(self):
         return "<Unit %s at %s>" % (self.name, self.coord)
@@ -230,7 +438,7 @@ class Unit(object):
             elif self is self.entangled.child:
                 tmp_str = f"Entangled with {repr(self.entangled.parent)}"
 
-        return ('Unit: "{name}"\nHP: {health}/{health_max}\nLV: {level}\tEXP: {experience}\nStr: {strength}\tSkill: {skill}\nSpd: {speed}\tLuck: {luck}\nDef: {defence}\tRes: {resistance}\nMove: {movement}\tCon: {constitution}\nAid: {aid}\tAffin: {affinity}\nWeapon: {items.active}\n'+tmp_str).format_map(self.__dict__)
+        return ('Unit: "{name}"\nHP: {health}/{health_max}\nLV: {level}\tEXP: {experience}\nStr: {strength}\tSkill: {skill}\nSpd: {speed}\tLuck: {luck}\nDef: {defence}\tRes: {resistance}\nMove: {movement}\tCon: {constitution}\nAid: {aid}\tAffin: {affinity}\nWeapon: {items.active}\n'+tmp_str).format_map(self.as_dict())
 
     @property
     def weapon(self):
@@ -341,13 +549,16 @@ class Unit(object):
     def entangle(self, event) -> None:
         self.entangled = event
 
-        try: #todo: move this to a static variable of some sort
-            self.image = resources.load_sprite("Entangled").convert_alpha()
-            new_size = utils.resize_keep_ratio(self.image.get_size(), (200, 200))
-            self.image = pygame.transform.smoothscale(self.image, new_size)
-        except FileNotFoundError:
-            logging.warning("ENTANGLEMENT SPRITE ERROR: Couldn't load %s! Loading default image", resources.sprite_path("Entangled"))
-            self.image = resources.load_sprite('no_image.png').convert_alpha()
+        if Unit.entangled_image is None:
+            # loaded once and shared by every entangled unit
+            try:
+                image = resources.load_sprite("Entangled")
+                new_size = utils.resize_keep_ratio(image.get_size(), (200, 200))
+                Unit.entangled_image = image if new_size == image.get_size() else resources.scale_image(image, new_size)
+            except FileNotFoundError:
+                logging.warning("ENTANGLEMENT SPRITE ERROR: Couldn't load %s! Loading default image", resources.sprite_path("Entangled"))
+                Unit.entangled_image = resources.load_sprite('no_image.png')
+        self.image = Unit.entangled_image
         self.modified = True
         Unit.isEntangled = True
         s.loaded_map.sprites_layer.update()
@@ -445,11 +656,15 @@ class Unit(object):
 
 
 class Flying(Unit):
-    pass
+    __slots__ = ()
+    MOVEMENT_CLASS = 'fly'
+    ALLOWED_TERRAINS = ['earth', 'fly']
 
 
 class Water(Unit):
-    pass
+    __slots__ = ()
+    MOVEMENT_CLASS = 'water'
+    ALLOWED_TERRAINS = ['earth', 'water']
 
 
 class UnitFactory(ABC):
@@ -581,6 +796,9 @@ class UnitsManager(object):
         self.teams: List[Team] = teams
         self.active_team: Team = self.teams[0]
         self.units: List[Unit] = [u for t in teams for u in t.units]
+        self.table = UnitTable(len(self.units))  # only the units of this match, for batch evaluations
+        for u in self.units:
+            u.move_to_table(self.table)
 
     def switch_turn(self) -> Team:
         self.active_team.end_turn()
@@ -23,7 +23,6 @@
 
 import pygame
 import sys
-import yaml
 
 from pathlib import Path
 
@@ -40,16 +39,6 @@ def timeit(f):
 
     return timed
 
-def parse_yaml(path, module):
-    objects = {}
-    with open(path, 'r') as f:
-        data = yaml.safe_load(f)
-        for u in data:
-            u_class = module.__dict__[list(u.keys())[0]]
-            kwargs = list(u.values())[0]
-            objects[kwargs['name']] = u_class(**kwargs)
-    return objects
-
 def distance(p0, p1):
     return abs(p0[0] - p1[0]) + abs(p0[1] - p1[1])
 